@@ -69,9 +69,10 @@ def reset():
 
 
 def migrate():
-    "Run manage.py syncdb and manage.py migrate"
+    "Run manage.py syncdb and manage.py migrate, and create cache tables"
     manage('syncdb --noinput')
     manage('migrate')
+    manage('createcachetable calais_cache')
 
 
 def manage(cmd):
@@ -82,20 +83,30 @@ def manage(cmd):
     local('%s %s' % (env.manage, cmd))
 
 
-def load_congress():
+def load_congress(*args):
     """
-    Load current members of Congress
+    Load current members of Congress. Options pass through,
+    e.g. fab load_congress:--historical,--limit=500
     """
-    from pq.apps.people import load
-    
-    load.congress()
+    manage(' '.join(('load_congress',) + args))
 
 
-def load_tumblr():
+def load_photos(*args):
     """
-    Load quotes from Tumblr.
+    Sync photos for members of Congress.
+    """
+    manage(' '.join(('load_photos',) + args))
+
+
+def render_thumbnails(*args):
     """
-    from pq.apps.quotes.load import tumblr_ingest
+    Render thumbnails for new photos and changed crops.
+    """
+    manage(' '.join(('render_thumbnails',) + args))
 
-    tumblr_ingest()
 
+def load_tumblr(*args):
+    """
+    Load quotes from Tumblr.
+    """
+    manage(' '.join(('load_tumblr',) + args))
@@ -6,5 +6,7 @@ if __name__ == "__main__":
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pq.settings")
 
     from django.core.management import execute_from_command_line
+    from pq.utils import instrumentation
 
-    execute_from_command_line(sys.argv)
+    with instrumentation.command(sys.argv):
+        execute_from_command_line(sys.argv)
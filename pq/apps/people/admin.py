@@ -5,7 +5,12 @@ from .models import Person
 class PersonAdmin(admin.ModelAdmin):
 	"Admin for people. Deliberately basic."
 
+	list_display = ('display_name', 'party', 'slug')
+	list_filter = ('party',)
+	ordering = ('sort_name',)
+	search_fields = ('display_name', 'sort_name')
+
 	#prepopulated_fields = {'slug': Person.NAME_FIELDS}
 
 
-admin.site.register(Person, PersonAdmin)
\ No newline at end of file
+admin.site.register(Person, PersonAdmin)
@@ -2,11 +2,17 @@
 Various loader scripts for people.
 """
 import logging
+from itertools import islice
 
-import requests
-import yaml
+from django.db import connection, transaction
+from django.utils import timezone
 
+from pq.utils import batched, sources
+from pq.utils.checkpoints import Checkpoint
+from pq.utils.instrumentation import traced
+from pq.utils.slugs import assign_slugs
 from .models import Person
+from .signals import people_changed
 
 GENDER_MAP = {
     'f': 'female',
@@ -17,10 +23,17 @@ GENDER_MAP = {
     'male': 'male',
 }
 
+CURRENT_URL = "https://raw.githubusercontent.com/unitedstates/congress-legislators/master/legislators-current.yaml"
+HISTORICAL_URL = "https://raw.githubusercontent.com/unitedstates/congress-legislators/master/legislators-historical.yaml"
+
+# kept in sync by load_members, see member_fields
+MEMBER_FIELDS = ('public', 'nickname', 'display', 'gender', 'party')
+
 log = logging.getLogger(__name__)
 
 
-def congress(public=True):
+@traced('congress')
+def congress(public=True, source=CURRENT_URL, skip_unchanged=False):
     """
     Load current members of Congress using theunitedstates.io/congress-legislators
 
@@ -33,39 +46,246 @@ def congress(public=True):
 
     Uniqueness is based on Person.links['bioguide']
     This only applies to current and former members of congress.
+
+    `source` can be a URL or a local file path. The file is cached and
+    revalidated with conditional requests; pass skip_unchanged=True
+    to do nothing when it hasn't changed since the last load.
+
+    Returns a dict of created/updated/unchanged counts,
+    or None if the load was skipped.
+    """
+    source = sources.fetch(source)
+    if skip_unchanged and not source.changed:
+        log.info('%s unchanged since last load, skipping', source.location)
+        return
+
+    members = sources.load_yaml(source)
+    counts = load_members(members, public=public)
+    source.mark_loaded()
+
+    return counts
+
+
+@traced('congress historical')
+def congress_historical(public=True, source=HISTORICAL_URL, batch_size=500, resume=True):
     """
-    url = "https://raw.githubusercontent.com/unitedstates/congress-legislators/master/legislators-current.yaml"
-    req = requests.get(url)
-
-    members = yaml.load(req.content)
-
-    for member in members:
-
-        # mise en place
-        name = dict((k, v) for k, v in member['name'].items() if k in Person.NAME_FIELDS)
-        term = member['terms'][-1] # most recent term
-        ids = member['id']
-        
-        # get or create a person, based on name fields
-        try:
-            person = Person.objects.get(links__contains={'bioguide': ids['bioguide']})
-            created = False
-        except Person.DoesNotExist:
-            params = name.copy()
-            params['links'] = ids
-            person = Person.objects.create(**params)
-            created = True
-
-        log_created(person, created)
-
-        # update attributes
-        person.public = public
-        person.nickname = member['name'].get('nickname')
-        person.display = member['name'].get('official_full')
-        person.gender = GENDER_MAP[member['bio']['gender'].lower()]
-        person.party = term['party'].lower()
-
-        person.save()
+    Load former members of Congress from legislators-historical.yaml
+
+    The file is streamed one member at a time and written in batches
+    of `batch_size`, so memory stays flat however big it gets.
+    Progress is checkpointed after each batch; with resume=True,
+    an interrupted load of the same file picks up where it stopped.
+
+    Returns a dict of created/updated/unchanged counts for this run.
+    """
+    return load_streamed(source, Checkpoint('congress-historical'),
+        public=public, batch_size=batch_size, resume=resume)
+
+
+def load_streamed(source, checkpoint, public=True, batch_size=500, resume=True,
+                  since=None, limit=None, dry_run=False, progress=None):
+    """
+    Stream members from a congress-legislators file into the database,
+    `batch_size` at a time, saving the position in `checkpoint` after
+    each batch. With resume=True, a run over the same file continues
+    from the last saved position.
+
+    `since`, a date, skips members with no term ending on or after it.
+    It's saved with the position, so a checkpoint is only resumed by a
+    run with the same `since`, and a filtered run doesn't mark the file
+    loaded. `limit` reads at most that many members this run; the
+    checkpoint is kept, so the next run carries on. With dry_run,
+    nothing is written and counts are what would have changed. A
+    Progress, if given, is updated after each batch.
+
+    Returns a dict of created/updated/unchanged counts for this run.
+    """
+    source = sources.fetch(source)
+    state = checkpoint.load()
+    since_key = since.isoformat() if since is not None else None
+
+    position = 0
+    if resume and (state.get('digest'), state.get('since')) == (source.digest, since_key):
+        position = state['position']
+        log.info('Resuming %s at member %i', source.location, position)
+
+    if progress is not None:
+        remaining = sources.count_items(source) - position
+        progress.total = remaining if limit is None else min(limit, remaining)
+
+    members = islice(sources.iter_yaml_list(source), position, None)
+    if limit is not None:
+        members = islice(members, limit)
+
+    totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+    read = 0
+
+    for batch in batched(members, batch_size):
+        read += len(batch)
+        position += len(batch)
+        selected = [m for m in batch if since is None or served_since(m, since)]
+
+        counts = load_members(selected, public=public, dry_run=dry_run)
+        for k, v in counts.items():
+            totals[k] += v
+
+        if not dry_run:
+            checkpoint.save({'digest': source.digest, 'since': since_key,
+                             'position': position})
+        if progress is not None:
+            if since is not None:
+                counts = dict(counts, skipped=len(batch) - len(selected))
+            progress.update(len(batch), **counts)
+
+    if not dry_run and (limit is None or read < limit):
+        checkpoint.clear()
+        # a filtered run skipped members, so the file isn't fully loaded
+        if since is None:
+            source.mark_loaded()
+
+    return totals
+
+
+def served_since(member, since):
+    "Whether a member has a term ending on or after a date"
+    since = since.isoformat()
+    return any(term.get('end', '') >= since for term in member.get('terms', []))
+
+
+class DryRun(Exception):
+    "Raised inside a transaction to roll it back"
+
+
+def load_members(members, public=True, dry_run=False):
+    """
+    Batched, set-based load of congress-legislators members.
+
+    Existing people are fetched in one query and mapped by bioguide ID,
+    diffed against the incoming members in memory, and only changed
+    rows are written, in one UPDATE. New people go in with one
+    bulk_create. A bioguide ID repeated within the batch is only
+    loaded the first time. Everything happens inside a single
+    transaction, which is rolled back with dry_run=True, so counts
+    show what would have changed.
+
+    Neither bulk_create nor queryset updates send post_save, so
+    people_changed is sent for new and changed people afterwards.
+    """
+    members = list(members)
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+    existing = Person.objects.external_id_map('bioguide',
+        (m['id']['bioguide'] for m in members))
+    created, updated, seen = [], [], set()
+    now = timezone.now()
+
+    try:
+        with transaction.atomic():
+            for member in members:
+                bioguide = member['id']['bioguide']
+                if bioguide in seen:
+                    log.warning('Skipping repeated member %s', bioguide)
+                    continue
+                seen.add(bioguide)
+
+                fields = member_fields(member, public)
+                person = existing.get(bioguide)
+
+                if person is None:
+                    created.append(new_member(member, fields))
+                    continue
+
+                changed = dict((k, v) for k, v in fields.items()
+                    if getattr(person, k) != v)
+
+                if changed:
+                    for k, v in changed.items():
+                        setattr(person, k, v)
+                    person.render_names()
+                    person.modified = now
+                    updated.append(person)
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+
+            update_members(updated)
+            assign_slugs(created, 'name')
+            Person.objects.bulk_create(created)
+            counts['created'] = len(created)
+
+            if dry_run:
+                raise DryRun
+    except DryRun:
+        return counts
+
+    # bulk_create doesn't set pks, so look them up by slug
+    if created:
+        pks = dict(Person.objects.filter(slug__in=[p.slug for p in created])
+            .values_list('slug', 'pk'))
+        for person in created:
+            person.pk = pks[person.slug]
+            log_created(person, True)
+
+    if created or updated:
+        people_changed.send(sender=Person, people=created + updated)
+
+    log.info('Loaded %(created)i new, %(updated)i updated, '
+             '%(unchanged)i unchanged members', counts)
+
+    return counts
+
+
+def update_members(people):
+    """
+    Write synced fields, rendered names and modified for a list of
+    people in one statement, like names.update_names.
+    """
+    if not people:
+        return
+
+    columns = MEMBER_FIELDS + ('display_name', 'sort_name', 'modified')
+    rows = u", ".join([u"(%s)" % u", ".join([u"%s"] * (len(columns) + 1))] * len(people))
+    params = []
+    for person in people:
+        params.append(person.pk)
+        params.extend(getattr(person, column) for column in columns)
+
+    sql = (u"UPDATE {table} SET {assignments} "
+           u"FROM (VALUES {rows}) AS v (id, {columns}) "
+           u"WHERE {table}.id = v.id").format(table=Person._meta.db_table,
+        assignments=u", ".join(u"{0} = v.{0}".format(column) for column in columns),
+        rows=rows, columns=u", ".join(columns))
+
+    connection.cursor().execute(sql, params)
+
+
+def member_fields(member, public=True):
+    """
+    Attributes kept in sync for a member, normalized the way
+    Person.save would store them.
+    """
+    term = member['terms'][-1] # most recent term
+    gender = member.get('bio', {}).get('gender') or u""
+    return {
+        'public': public,
+        'nickname': (member['name'].get('nickname') or u"").strip(),
+        'display': (member['name'].get('official_full') or u"").strip(),
+        'gender': GENDER_MAP.get(gender.lower(), u""),
+        'party': (term.get('party') or u"").lower(),
+    }
+
+
+def new_member(member, fields):
+    """
+    Build an unsaved Person for a member.
+    """
+    name = dict((k, v) for k, v in member['name'].items() if k in Person.NAME_FIELDS)
+    person = Person(links=member['id'], **name)
+    for k, v in fields.items():
+        setattr(person, k, v)
+
+    person._clean_name_fields()
+    person.render_names()
+    return person
 
 
 def log_created(obj, created):
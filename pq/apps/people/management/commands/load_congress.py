@@ -0,0 +1,31 @@
+from optparse import make_option
+
+from pq.apps.people import load
+from pq.utils.checkpoints import Checkpoint
+from pq.utils.commands import LoaderCommand
+
+
+class Command(LoaderCommand):
+    help = "Load current (or, with --historical, former) members of Congress."
+    label = 'members'
+    batch_size = 500
+
+    option_list = LoaderCommand.option_list + (
+        make_option('--historical', action='store_true', default=False,
+            help="Load former members, from legislators-historical.yaml"),
+        make_option('--source',
+            help="URL or path of a congress-legislators YAML file"),
+        make_option('--private', action='store_true', default=False,
+            help="Load people as not public"),
+    )
+
+    def load(self, progress, **options):
+        if options['historical']:
+            source, checkpoint = load.HISTORICAL_URL, Checkpoint('congress-historical')
+        else:
+            source, checkpoint = load.CURRENT_URL, Checkpoint('congress-current')
+
+        load.load_streamed(options['source'] or source, checkpoint,
+            public=not options['private'], batch_size=options['batch_size'],
+            since=options['since'], limit=options['limit'],
+            dry_run=options['dry_run'], progress=progress)
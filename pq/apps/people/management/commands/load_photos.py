@@ -0,0 +1,23 @@
+from optparse import make_option
+
+from pq.apps.people import photos
+from pq.utils.commands import LoaderCommand, workers_option
+
+
+class Command(LoaderCommand):
+    help = "Sync photos for members of Congress from theunitedstates.io."
+    label = 'people'
+    batch_size = 100
+
+    option_list = LoaderCommand.option_list + (
+        workers_option(photos.WORKERS),
+        make_option('--no-update', action='store_false', dest='update', default=True,
+            help="Skip people who already have a photo"),
+        make_option('--no-render', action='store_false', dest='render', default=True,
+            help="Don't generate thumbnails"),
+    )
+
+    def load(self, progress, **options):
+        photos.sync_all(batch_size=options['batch_size'], workers=options['workers'],
+            update=options['update'], since=options['since'], limit=options['limit'],
+            dry_run=options['dry_run'], render=options['render'], progress=progress)
@@ -0,0 +1,18 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from pq.apps.people import names
+
+
+class Command(BaseCommand):
+    help = "Backfill rendered display and sort names for people."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=500,
+            help="People read and updated per query"),
+    )
+
+    def handle(self, *args, **options):
+        updated = names.backfill(options['batch_size'])
+        self.stdout.write('Updated names for %i people' % updated)
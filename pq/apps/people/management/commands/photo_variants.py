@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from pq.apps.people.thumbnails import variant_report
+
+
+class Command(BaseCommand):
+    help = "Report stored bytes for each photo size and variant."
+
+    def handle(self, *args, **options):
+        report = variant_report()
+        originals = dict((name, total) for name, count, total in report).get('original')
+
+        self.stdout.write('%-16s %8s %14s %12s %8s' % (
+            'rendition', 'photos', 'total bytes', 'mean bytes', 'of orig'))
+
+        for name, count, total in report:
+            share = '%.1f%%' % (100.0 * total / originals) if originals else '-'
+            self.stdout.write('%-16s %8i %14i %12i %8s' % (
+                name, count, total, total / count, share))
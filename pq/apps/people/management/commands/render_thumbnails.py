@@ -0,0 +1,18 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from pq.apps.people import thumbnails
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails for photos whose thumbnails are missing or stale, like after a crop change."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int',
+            help="Worker processes, one per CPU by default"),
+    )
+
+    def handle(self, *args, **options):
+        count = thumbnails.generate(processes=options['processes'])
+        self.stdout.write('Rendered thumbnails for %i photos' % count)
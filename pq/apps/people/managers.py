@@ -1,15 +1,38 @@
 from django.db.models.query import QuerySet
 from django_hstore.hstore import HStoreManager
 from django_hstore.query import HStoreQuerySet
-from model_utils.managers import create_pass_through_manager_for_queryset_class
+from model_utils.managers import PassThroughManagerMixin
 from nameparser import HumanName
 
+# external ID kinds with an expression index on links,
+# see migrations/0006_person_links_indexes.py
+INDEXED_IDS = ('bioguide', 'thomas', 'govtrack', 'lis')
+
 
 class PersonQuerySet(HStoreQuerySet):
 
     def public(self):
         return self.filter(public=True)
 
+    def with_external_id(self, kind):
+        "People with an external ID of one kind, like 'bioguide'"
+        return self.filter(links__contains=[kind])
+
+    def by_external_ids(self, kind, ids):
+        """
+        People with any of a list of external IDs of one kind, in one
+        query: by_external_ids('bioguide', ['M000355', 'R000570']).
+        Kinds in INDEXED_IDS use an index; others still work, but scan.
+        """
+        from .models import Person
+        return self.extra(
+            where=["%s.links -> %%s = ANY(%%s)" % Person._meta.db_table],
+            params=[kind, [unicode(i) for i in ids]])
+
+    def external_id_map(self, kind, ids):
+        "Map external IDs of one kind to people, like {'M000355': <Person>}"
+        return dict((p.links[kind], p) for p in self.by_external_ids(kind, ids))
+
     def filter(self, *args, **kwargs):
         """
         Override default filter method to parse out `name` argument
@@ -26,4 +49,8 @@ class PersonQuerySet(HStoreQuerySet):
         return super(PersonQuerySet, self).filter(*args, **kwargs)
 
 
-PersonManager = create_pass_through_manager_for_queryset_class(HStoreManager, PersonQuerySet)
\ No newline at end of file
+class HStorePassThroughManager(PassThroughManagerMixin, HStoreManager):
+    "An HStoreManager that also has the queryset's methods"
+
+
+PersonManager = HStorePassThroughManager.for_queryset_class(PersonQuerySet)
\ No newline at end of file
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Person.links and Photo.thumbnails are hstore
+        db.execute("CREATE EXTENSION IF NOT EXISTS hstore")
+
+        # Adding model 'Person'
+        db.create_table(u'people_person', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('created', self.gf('model_utils.fields.AutoCreatedField')(default=datetime.datetime.now)),
+            ('modified', self.gf('model_utils.fields.AutoLastModifiedField')(default=datetime.datetime.now)),
+            ('public', self.gf('django.db.models.fields.BooleanField')(default=False)),
+            ('first', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('middle', self.gf('django.db.models.fields.CharField')(max_length=100, blank=True)),
+            ('last', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('suffix', self.gf('django.db.models.fields.CharField')(max_length=10, blank=True)),
+            ('nickname', self.gf('django.db.models.fields.CharField')(max_length=100, blank=True)),
+            ('slug', self.gf('django.db.models.fields.SlugField')(unique=True, max_length=50)),
+            ('title', self.gf('django.db.models.fields.CharField')(max_length=255, blank=True)),
+            ('display', self.gf('django.db.models.fields.CharField')(max_length=255, blank=True)),
+            ('gender', self.gf('django.db.models.fields.CharField')(max_length=10, blank=True)),
+            ('party', self.gf('django.db.models.fields.CharField')(max_length=50, blank=True)),
+            ('bio', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('links', self.gf(u'django_hstore.fields.DictionaryField')(null=True, blank=True)),
+        ))
+        db.send_create_signal(u'people', ['Person'])
+
+        # Adding model 'Photo'
+        db.create_table(u'people_photo', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('image', self.gf(u'sorl.thumbnail.fields.ImageField')(max_length=100, null=True, blank=True)),
+            ('crop_horz', self.gf('django.db.models.fields.CharField')(default='50%', max_length=10)),
+            ('crop_vert', self.gf('django.db.models.fields.CharField')(default='50%', max_length=10)),
+            ('person', self.gf('django.db.models.fields.related.OneToOneField')(related_name='photo', unique=True, to=orm['people.Person'])),
+        ))
+        db.send_create_signal(u'people', ['Photo'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'Person'
+        db.delete_table(u'people_person')
+
+        # Deleting model 'Photo'
+        db.delete_table(u'people_photo')
+
+
+    models = {
+        u'people.person': {
+            'Meta': {'ordering': "('last', 'first')", 'object_name': 'Person'},
+            'bio': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'display': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'first': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'gender': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'links': (u'django_hstore.fields.DictionaryField', [], {'null': 'True', 'blank': 'True'}),
+            'middle': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'nickname': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'party': ('django.db.models.fields.CharField', [], {'max_length': '50', 'blank': 'True'}),
+            'public': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '50'}),
+            'suffix': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'})
+        },
+        u'people.photo': {
+            'Meta': {'object_name': 'Photo'},
+            'crop_horz': ('django.db.models.fields.CharField', [], {'default': "'50%'", 'max_length': '10'}),
+            'crop_vert': ('django.db.models.fields.CharField', [], {'default': "'50%'", 'max_length': '10'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': (u'sorl.thumbnail.fields.ImageField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'person': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'photo'", 'unique': 'True', 'to': u"orm['people.Person']"})
+        }
+    }
+
+    complete_apps = ['people']
\ No newline at end of file
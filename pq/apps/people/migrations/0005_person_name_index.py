@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding index on 'Person', fields ['last', 'first', u'id']
+        db.create_index(u'people_person', ['last', 'first', u'id'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'Person', fields ['last', 'first', u'id']
+        db.delete_index(u'people_person', ['last', 'first', u'id'])
+
+
+    models = {
+        u'people.person': {
+            'Meta': {'ordering': "('last', 'first')", 'object_name': 'Person', 'index_together': "[('last', 'first', 'id')]"},
+            'bio': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'display': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'first': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'gender': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'links': (u'django_hstore.fields.DictionaryField', [], {'null': 'True', 'blank': 'True'}),
+            'middle': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'nickname': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'party': ('django.db.models.fields.CharField', [], {'max_length': '50', 'blank': 'True'}),
+            'public': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '50'}),
+            'suffix': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'})
+        },
+        u'people.photo': {
+            'Meta': {'object_name': 'Photo'},
+            'checksum': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '40', 'blank': 'True'}),
+            'crop_horz': ('django.db.models.fields.CharField', [], {'default': "'50%'", 'max_length': '10'}),
+            'crop_vert': ('django.db.models.fields.CharField', [], {'default': "'50%'", 'max_length': '10'}),
+            'etag': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'image': (u'sorl.thumbnail.fields.ImageField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'last_modified': ('django.db.models.fields.CharField', [], {'max_length': '50', 'blank': 'True'}),
+            'person': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'photo'", 'unique': 'True', 'to': u"orm['people.Person']"}),
+            'source_url': ('django.db.models.fields.URLField', [], {'max_length': '500', 'blank': 'True'}),
+            'thumbnails': (u'django_hstore.fields.DictionaryField', [], {'null': 'True', 'blank': 'True'})
+        }
+    }
+
+    complete_apps = ['people']
\ No newline at end of file
@@ -1,7 +1,7 @@
-import requests
-from django.core.files.base import ContentFile
+import unicodedata
+
+from django.conf import settings
 from django.db import models
-from django.utils.text import slugify
 
 from django_hstore import hstore
 from model_utils import Choices
@@ -9,6 +9,7 @@ from model_utils.models import TimeStampedModel
 from nameparser import HumanName
 from sorl.thumbnail import ImageField, get_thumbnail
 
+from pq.utils.slugs import unique_slug
 from .managers import PersonManager
 from .parties import PARTIES
 
@@ -47,11 +48,85 @@ class PhotoBase(models.Model):
     crop_vert = models.CharField("Crop Vertical", max_length=10, 
         choices=CROP_VERT_CHOICES, default='50%')
 
+    # precomputed thumbnail URLs, keyed by name in settings.PHOTO_SIZES
+    thumbnails = hstore.DictionaryField(blank=True, null=True, editable=False)
+
     class Meta:
         abstract = True
 
+    def __init__(self, *args, **kwargs):
+        super(PhotoBase, self).__init__(*args, **kwargs)
+        self._rendered_from = self.render_key()
+
+    def save(self, *args, **kwargs):
+        "Thumbnails go stale when the image or crop changes."
+        if self.render_key() != self._rendered_from:
+            self.thumbnails = {}
+        super(PhotoBase, self).save(*args, **kwargs)
+        self._rendered_from = self.render_key()
+
+    def render_key(self):
+        "What thumbnails depend on, read without loading deferred fields"
+        image = self.__dict__.get('image')
+        return (getattr(image, 'name', image),
+            self.__dict__.get('crop_horz'), self.__dict__.get('crop_vert'))
+
     def thumbnail(self):
-        return self.resize('75x75').url
+        return self.thumbnail_url('thumbnail')
+
+    def thumbnail_url(self, size='thumbnail'):
+        """
+        URL for a named size from settings.PHOTO_SIZES, or a variant
+        key like w300.webp. Uses precomputed URLs, rendering only
+        if they're missing.
+        """
+        url = (self.thumbnails or {}).get(size)
+        if url is None and self.image:
+            geometry, options = self.renditions()[size]
+            url = self.resize(geometry, **options).url
+        return url
+
+    def srcset(self, format='jpeg'):
+        """
+        A srcset attribute value for one format's variants, like
+        "/media/cache/a.webp 150w, /media/cache/b.webp 300w",
+        or an empty string without an image.
+        """
+        if not self.image:
+            return u''
+        return u", ".join(u"%s %iw" % (self.thumbnail_url(variant_key(width, format)), width)
+            for width in settings.PHOTO_WIDTHS)
+
+    def render_thumbnails(self):
+        """
+        Render every size and variant, returning a dict of URLs.
+        Raises IOError if the image is missing or unreadable.
+        """
+        urls = {}
+        for name, (geometry, options) in self.renditions().items():
+            thumb = self.resize(geometry, **options)
+
+            # sorl logs images it can't read, and returns a thumbnail it never made
+            if not thumb.exists():
+                raise IOError('Could not render %s from %s' % (name, self.image.name))
+            urls[name] = thumb.url
+
+        return urls
+
+    @staticmethod
+    def renditions():
+        """
+        Everything rendered for a photo: fixed, cropped sizes from
+        settings.PHOTO_SIZES plus uncropped variants at each of
+        settings.PHOTO_WIDTHS in each of settings.PHOTO_FORMATS.
+        """
+        result = dict(settings.PHOTO_SIZES)
+        for width in settings.PHOTO_WIDTHS:
+            for format in settings.PHOTO_FORMATS:
+                options = dict(settings.PHOTO_FORMAT_OPTIONS.get(format, {}),
+                    format=format, crop=False, upscale=False)
+                result[variant_key(width, format)] = (str(width), options)
+        return result
     
     @property
     def crop(self):
@@ -62,11 +137,15 @@ class PhotoBase(models.Model):
         return get_thumbnail(self.image, size, **options)
 
     def admin_thumbnail(self):
-        img = self.resize('75x75')
-        return u'<img src="{0}" height="75" width="75">'.format(img.url)
+        return u'<img src="{0}" height="75" width="75">'.format(self.thumbnail())
     admin_thumbnail.allow_tags = True
 
 
+def variant_key(width, format):
+    "Key for a responsive variant in PhotoBase.thumbnails, like w300.webp"
+    return 'w%i.%s' % (width, format.lower())
+
+
 class Person(TimeStampedModel):
     """
     People in the news who get quoted saying things.
@@ -102,6 +181,10 @@ class Person(TimeStampedModel):
                   "Can be a template, for example: "
                   "Sen. {first} {last}")
 
+    # rendered on save, so listings can read and sort in SQL
+    display_name = models.CharField(max_length=255, blank=True, editable=False)
+    sort_name = models.CharField(max_length=255, blank=True, editable=False)
+
     # metadata
     gender = models.CharField(max_length=10, blank=True, choices=GENDERS)
     party = models.CharField(max_length=50, blank=True, choices=PARTIES)
@@ -116,11 +199,17 @@ class Person(TimeStampedModel):
     objects = PersonManager()
 
     class Meta:
-        ordering = ('last', 'first')
+        ordering = ('sort_name',)
+        index_together = [('sort_name', 'id')]
         verbose_name_plural = "people"
 
     def __unicode__(self):
-        return self.get_display_name()
+        return self.display_name or self.get_display_name()
+
+    def __init__(self, *args, **kwargs):
+        super(Person, self).__init__(*args, **kwargs)
+        # party as saved, so quote rollups can follow changes
+        self._saved_party = self.__dict__.get('party')
 
     # name parsing
     def _get_name(self):
@@ -155,6 +244,30 @@ class Person(TimeStampedModel):
 
         return self.name
 
+    def get_sort_name(self):
+        """
+        Last, first, middle and suffix, lowercased without accents,
+        so "Ryan, Paul D." sorts the same in SQL as by eye.
+        """
+        parts = [self.last, self.first, self.middle, self.suffix]
+        name = unicodedata.normalize('NFKD', u" ".join(filter(bool, parts)))
+        return u"".join(c for c in name if not unicodedata.combining(c)).lower()
+
+    def render_names(self):
+        """
+        Set display_name and sort_name from name fields, returning
+        them as a dict, for queryset updates. A broken display
+        template is shown as-is.
+        """
+        try:
+            self.display_name = self.get_display_name()
+        except (KeyError, IndexError, ValueError):
+            self.display_name = self.display
+
+        self.display_name = self.display_name[:255]
+        self.sort_name = self.get_sort_name()[:255]
+        return {'display_name': self.display_name, 'sort_name': self.sort_name}
+
     def get_name_dict(self):
         """
         Get name fields only, as a dict (includes nickname)
@@ -167,29 +280,39 @@ class Person(TimeStampedModel):
         """
         return [getattr(self, f) for f in self.NAME_FIELDS]
 
-    def get_thumbnail(self):
-        pass
+    def get_photo(self):
+        "This person's photo, or None"
+        try:
+            return self.photo
+        except Photo.DoesNotExist:
+            return None
+
+    def get_thumbnail(self, size='thumbnail'):
+        "Precomputed thumbnail URL, or None without a photo"
+        photo = self.get_photo()
+        if photo and photo.image:
+            return photo.thumbnail_url(size)
 
     def admin_thumbnail(self):
-        pass
+        url = self.get_thumbnail()
+        if url:
+            return u'<img src="{0}" height="75" width="75">'.format(url)
+        return u''
+    admin_thumbnail.allow_tags = True
+    admin_thumbnail.short_description = 'Photo'
 
     def save(self, *args, **kwargs):
-        "Make sure we slugify before saving."
+        "Make sure we slugify and render names before saving."
         self._clean_name_fields()
+        self.render_names()
         if not self.slug:
             self.slug = self.slugify()
         super(Person, self).save(*args, **kwargs)
+        self._saved_party = self.party
 
-    def slugify(self, n=0):
+    def slugify(self):
         "Make a slug, ensuring no dupes."
-        slug = slugify(self.name)
-        if n:
-            slug = "%s-%i" % (slug, n)
-        try:
-            Person.objects.get(slug__iexact=slug)
-            return self.slugify(n + 1)
-        except Person.DoesNotExist:
-            return slug
+        return unique_slug(Person, self.name)
 
     def get_photo_from_usio(self, replace=False):
         """
@@ -200,26 +323,12 @@ class Person(TimeStampedModel):
         already-attached photo. Pass replace=True
         to replace an existing photo.
         """
-        bioguide = self.links.get('bioguide')
-        if not bioguide:
-            return
-
-        # bail out here if we have a photo and aren't replacing
-        if hasattr(self, 'photo') and not replace:
-            return self.photo
-
-        url = "https://raw.githubusercontent.com/unitedstates/images/" \
-              "gh-pages/congress/original/{0}.jpg".format(bioguide)
-
-        name = "{0}.jpg".format(bioguide)
+        from .photos import sync_photo
 
-        img = requests.get(url)
-        file = ContentFile(img.content)
-
-        photo = Photo(person=self)
-        photo.image.save(name, file, save=True)
+        if not (self.links or {}).get('bioguide'):
+            return
 
-        return photo
+        return sync_photo(self, replace=replace)
 
 
 class Photo(PhotoBase, models.Model):
@@ -228,6 +337,17 @@ class Photo(PhotoBase, models.Model):
     """
     person = models.OneToOneField(Person, related_name='photo')
 
+    # where the image came from, for conditional requests
+    source_url = models.URLField(max_length=500, blank=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=50, blank=True)
+
+    # sha1 of the image bytes, which also names the stored file
+    checksum = models.CharField(max_length=40, blank=True, db_index=True)
+
     def __unicode__(self):
         return self.image.name
 
+
+# connect signal handlers
+from . import signals
@@ -0,0 +1,59 @@
+"""
+Bulk backfill of Person.display_name and sort_name, which are
+otherwise rendered on save.
+"""
+import logging
+
+from django.db import connection, transaction
+
+from .models import Person
+
+log = logging.getLogger(__name__)
+
+NAME_COLUMNS = ('pk', 'display') + Person.NAME_FIELDS + (
+    'nickname', 'display_name', 'sort_name')
+
+
+def backfill(batch_size=500):
+    """
+    Re-render names for every person, writing only rows that
+    changed, with one UPDATE per batch. Returns the number updated.
+    """
+    updated, last_pk = 0, 0
+    while True:
+        people = list(Person.objects.filter(pk__gt=last_pk)
+            .order_by('pk').only(*NAME_COLUMNS)[:batch_size])
+        if not people:
+            break
+
+        last_pk = people[-1].pk
+        changed = []
+        for person in people:
+            saved = (person.display_name, person.sort_name)
+            person.render_names()
+            if (person.display_name, person.sort_name) != saved:
+                changed.append(person)
+
+        update_names(changed)
+        updated += len(changed)
+        log.info('Rendered names through person %i, %i updated', last_pk, updated)
+
+    return updated
+
+
+def update_names(people):
+    "Write rendered names for a list of people in one statement"
+    if not people:
+        return
+
+    rows = u", ".join([u"(%s, %s, %s)"] * len(people))
+    params = []
+    for person in people:
+        params.extend([person.pk, person.display_name, person.sort_name])
+
+    sql = (u"UPDATE {table} SET display_name = v.display_name, sort_name = v.sort_name "
+           u"FROM (VALUES {rows}) AS v (id, display_name, sort_name) "
+           u"WHERE {table}.id = v.id").format(table=Person._meta.db_table, rows=rows)
+
+    with transaction.atomic():
+        connection.cursor().execute(sql, params)
@@ -0,0 +1,379 @@
+"""
+Bulk photo ingestion from theunitedstates.io.
+
+Photos are fetched on a bounded thread pool sharing one pooled
+requests session, and revalidated with conditional requests,
+so rerunning a sync only downloads images that changed.
+Database writes stay on the calling thread.
+
+Downloads are streamed to temporary files in chunks, and images are
+stored by the sha1 of their bytes, so the same image is never stored
+twice and replacing a photo with identical bytes changes nothing.
+"""
+import datetime
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections import Counter, deque
+from multiprocessing.pool import ThreadPool
+
+import requests
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.timezone import utc
+
+from pq.utils.checkpoints import Checkpoint
+from pq.utils.instrumentation import traced
+
+from . import thumbnails
+from .models import Person, Photo
+
+PHOTO_URL = "https://raw.githubusercontent.com/unitedstates/images/" \
+            "gh-pages/congress/original/{0}.jpg"
+
+TIMEOUT = 30
+WORKERS = 8
+CHUNK_SIZE = 64 * 1024
+
+# fetches queued or unsaved per worker during a sync
+IN_FLIGHT = 2
+
+log = logging.getLogger(__name__)
+
+
+class PhotoResult(object):
+    """
+    The outcome of fetching one person's photo.
+
+    status is one of created, updated, unchanged, skipped, missing or error.
+    """
+    def __init__(self, person, status=None, seconds=0.0, error=None):
+        self.person = person
+        self.status = status
+        self.seconds = seconds
+        self.error = error
+        self.response = None
+        self.path = None
+        self.checksum = None
+
+    def __repr__(self):
+        return '<PhotoResult: %s %s %.3fs>' % (
+            self.person.links.get('bioguide'), self.status, self.seconds)
+
+
+def get_session(pool_size=WORKERS):
+    """
+    A requests session with a connection pool big enough for every worker.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+@traced('photo sync')
+def sync_photos(people=None, workers=WORKERS, update=True, timeout=TIMEOUT, render=True,
+                session=None, pool=None):
+    """
+    Fetch photos for people with bioguide IDs, `workers` at a time.
+    Callers syncing in batches can pass a `session` and a thread `pool`
+    of `workers` threads to share between them, keeping connections
+    open from one batch to the next.
+
+    With update=True, people who already have a photo are revalidated
+    with If-None-Match/If-Modified-Since and only replaced if the image
+    changed. With update=False, they're skipped without a request.
+
+    New and changed photos get their thumbnails rendered on a process
+    pool at the end, unless render=False.
+
+    Returns a list of PhotoResults, with per-image timings and errors.
+    """
+    if people is None:
+        people = Person.objects.with_external_id('bioguide').select_related('photo')
+
+    if session is None:
+        session = get_session(workers)
+    jobs, results = [], []
+
+    for person in people:
+        photo = get_photo(person)
+        if photo and not update:
+            results.append(PhotoResult(person, 'skipped'))
+        else:
+            jobs.append((person, conditional_headers(photo)))
+
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPool(workers)
+
+    pending = deque()
+    try:
+        fetch = lambda job: fetch_photo(session, job[0], job[1], timeout)
+
+        # imap_unordered would queue every job up front, so downloads
+        # could outrun saving. Keep IN_FLIGHT jobs per worker queued
+        # and save them in order, so no more than that wait on disk.
+        for job in jobs:
+            pending.append(pool.apply_async(fetch, (job,)))
+            if len(pending) >= workers * IN_FLIGHT:
+                results.append(save_result(pending.popleft().get()))
+
+        while pending:
+            results.append(save_result(pending.popleft().get()))
+    finally:
+        if own_pool:
+            pool.close()
+
+        # if saving failed, nothing will save what's still in flight
+        for async_result in pending:
+            discard(async_result.get())
+
+    log_results(results)
+
+    if render:
+        thumbnails.generate(r.person.photo.pk for r in results
+            if r.status in ('created', 'updated'))
+
+    return results
+
+
+def save_result(result):
+    "Save a fetched photo, if there's a new download"
+    if result.path:
+        save_photo(result, render=False)
+    return result
+
+
+def sync_all(batch_size=100, workers=WORKERS, update=True, since=None, limit=None,
+             dry_run=False, resume=True, render=True, progress=None):
+    """
+    Sync photos for everyone with a bioguide ID, in pk order,
+    `batch_size` people at a time. The last pk is checkpointed after
+    each batch, so with resume=True an interrupted sync carries on.
+
+    `since`, a date, only syncs people whose records were created or
+    updated on or after it, by the loaders as well as by hand. It's
+    checkpointed too, so only a run with the same `since` resumes.
+    `limit` syncs at most that many people this run. With dry_run, no
+    requests are made; counts are people to fetch and to skip. A
+    Progress, if given, is updated after each batch.
+
+    New and changed photos get their thumbnails rendered once, at the
+    end, unless render=False. If a sync is interrupted, they're left
+    stale, and thumbnails.generate() renders them.
+
+    Returns a Counter of result statuses.
+    """
+    checkpoint = Checkpoint('photo-sync')
+    state = checkpoint.load() if resume else {}
+    since_key = since.isoformat() if since is not None else None
+    last_pk = state.get('pk', 0) if state.get('since') == since_key else 0
+
+    people = Person.objects.with_external_id('bioguide').order_by('pk')
+    if since is not None:
+        people = people.filter(modified__gte=datetime.datetime.combine(
+            since, datetime.time()).replace(tzinfo=utc))
+
+    remaining = people.filter(pk__gt=last_pk)
+    if progress is not None:
+        total = remaining.count()
+        progress.total = total if limit is None else min(limit, total)
+
+    if dry_run:
+        total = remaining.count() if limit is None else min(limit, remaining.count())
+        skipped = 0 if update else min(total, remaining.filter(photo__isnull=False).count())
+        totals = Counter(fetch=total - skipped, skipped=skipped)
+        if progress is not None:
+            progress.update(total, **totals)
+        return totals
+
+    # one session and thread pool for every batch, so connections stay open
+    session, pool = get_session(workers), ThreadPool(workers)
+    totals, done, changed = Counter(), 0, []
+    try:
+        while limit is None or done < limit:
+            size = batch_size if limit is None else min(batch_size, limit - done)
+            batch = list(people.filter(pk__gt=last_pk).select_related('photo')[:size])
+            if not batch:
+                checkpoint.clear()
+                break
+
+            results = sync_photos(batch, workers, update, render=False,
+                session=session, pool=pool)
+            changed.extend(r.person.photo.pk for r in results
+                if r.status in ('created', 'updated'))
+            statuses = Counter(r.status for r in results)
+            totals.update(statuses)
+
+            last_pk, done = batch[-1].pk, done + len(batch)
+            checkpoint.save({'pk': last_pk, 'since': since_key})
+            if progress is not None:
+                progress.update(len(batch), **statuses)
+    finally:
+        pool.close()
+
+    # one pool for the whole run, not one per batch
+    if render:
+        thumbnails.generate(changed)
+
+    return totals
+
+
+def sync_photo(person, replace=False, session=None, timeout=TIMEOUT):
+    """
+    Fetch one person's photo. Unless replace=True, an existing photo
+    is returned without a request.
+    """
+    photo = get_photo(person)
+    if photo and not replace:
+        return photo
+
+    result = fetch_photo(session or requests, person, conditional_headers(photo), timeout)
+    if result.path:
+        save_photo(result)
+
+    return get_photo(person)
+
+
+def fetch_photo(session, person, headers=None, timeout=TIMEOUT):
+    """
+    Download a person's photo to a temporary file. Safe to call from
+    worker threads: no database access happens here.
+    """
+    result = PhotoResult(person)
+    url = PHOTO_URL.format(person.links['bioguide'])
+    start = time.time()
+
+    try:
+        resp = session.get(url, headers=headers or {}, timeout=timeout, stream=True)
+        try:
+            if resp.status_code == 304:
+                result.status = 'unchanged'
+            elif resp.status_code == 404:
+                result.status = 'missing'
+            else:
+                resp.raise_for_status()
+                result.response = resp
+                result.path, result.checksum = download(resp)
+        finally:
+            resp.close()
+    except (requests.RequestException, IOError) as e:
+        result.status = 'error'
+        result.error = e
+
+    result.seconds = time.time() - start
+    return result
+
+
+def download(resp):
+    """
+    Stream a response to a temporary file, returning its path and sha1.
+    The file is removed if the download fails partway.
+    """
+    sha = hashlib.sha1()
+    f = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
+    try:
+        with f:
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                sha.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(f.name)
+        raise
+
+    return f.name, sha.hexdigest()
+
+
+def discard(result):
+    "Remove a download that won't be saved"
+    if result.path:
+        os.remove(result.path)
+        result.response = result.path = None
+
+
+def save_photo(result, render=True):
+    """
+    Attach a downloaded image to its person, replacing any existing photo.
+    If the bytes match the current photo, only the cache headers change.
+
+    A new or changed image gets its thumbnails rendered unless
+    render=False. The download is removed afterwards, whether or not
+    saving worked.
+    """
+    person, resp = result.person, result.response
+    try:
+        photo = get_photo(person)
+
+        if photo and photo.checksum == result.checksum:
+            result.status = 'unchanged'
+        elif photo:
+            result.status = 'updated'
+        else:
+            result.status = 'created'
+            photo = Photo(person=person)
+
+        photo.source_url = resp.url
+        photo.etag = resp.headers.get('etag', '')
+        photo.last_modified = resp.headers.get('last-modified', '')
+
+        if result.status != 'unchanged':
+            photo.image.name = store_image(result.path, result.checksum)
+            photo.checksum = result.checksum
+        photo.save()
+    finally:
+        discard(result)
+
+    if render and result.status != 'unchanged':
+        thumbnails.generate([photo.pk])
+
+    person.photo = photo
+    return photo
+
+
+def store_image(path, checksum, ext='jpg'):
+    """
+    Store an image file under its checksum, unless it's already stored.
+    Returns the storage name.
+    """
+    name = 'photos/{0}/{1}.{2}'.format(checksum[:2], checksum, ext)
+    if not default_storage.exists(name):
+        with open(path, 'rb') as f:
+            name = default_storage.save(name, File(f))
+
+    return name
+
+
+def get_photo(person):
+    "A person's photo, or None"
+    return person.get_photo()
+
+
+def conditional_headers(photo):
+    "Headers to revalidate an existing photo"
+    headers = {}
+    if photo and photo.etag:
+        headers['If-None-Match'] = photo.etag
+    if photo and photo.last_modified:
+        headers['If-Modified-Since'] = photo.last_modified
+    return headers
+
+
+def log_results(results):
+    """
+    Log a summary of a sync, and every failure.
+    """
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+        if result.status == 'error':
+            log.warning('Photo failed for %s: %s', result.person, result.error)
+
+    fetched = [r.seconds for r in results if r.seconds]
+    if fetched:
+        log.info('Photos: %s; mean fetch %.3fs, slowest %.3fs',
+            ', '.join('%i %s' % (v, k) for k, v in sorted(counts.items())),
+            sum(fetched) / len(fetched), max(fetched))
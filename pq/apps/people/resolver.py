@@ -0,0 +1,168 @@
+"""
+Resolve names to people in memory, for ingest.
+"""
+import re
+import weakref
+from collections import defaultdict
+
+from nameparser import HumanName
+
+from pq.utils.slugs import assign_slugs
+from .models import Person
+
+PUNCTUATION = re.compile(r'[.,"]+')
+WHITESPACE = re.compile(r'\s+')
+
+# live resolvers, kept current by signal handlers
+resolvers = weakref.WeakSet()
+
+
+def name_key(name):
+    "Normalize a name for lookup"
+    name = PUNCTUATION.sub(u' ', name or u'')
+    return WHITESPACE.sub(u' ', name).strip().lower()
+
+
+class PersonResolver(object):
+    """
+    An in-memory index of people, keyed by normalized name forms,
+    nicknames, display names and external IDs from links.
+
+    The index is loaded with one query. Resolving a name after that
+    costs nothing, and misses can be created in one batch.
+    While a resolver is alive, saved and deleted people are
+    added to and removed from its index.
+    """
+    def __init__(self, queryset=None):
+        self.queryset = queryset if queryset is not None else Person.objects.all()
+        self.index = {}
+        self.keys = defaultdict(set)
+        self.load()
+        resolvers.add(self)
+
+    def __repr__(self):
+        return '<PersonResolver: %i people>' % len(self.keys)
+
+    def load(self):
+        "Build the index, with one query"
+        self.index.clear()
+        self.keys.clear()
+        for person in self.queryset.order_by('pk').only(*self.fields()):
+            self.add(person)
+
+    @staticmethod
+    def fields():
+        return ('pk', 'display', 'nickname', 'links') + Person.NAME_FIELDS
+
+    @staticmethod
+    def person_keys(person):
+        "Everything a person might be called, normalized"
+        first, middle, last, suffix, nickname = (getattr(person, f) or u''
+            for f in Person.NAME_FIELDS + ('nickname',))
+
+        names = [
+            (first, last),
+            (first, middle, last),
+            (first, last, suffix),
+            (first, middle, last, suffix),
+        ]
+        if nickname:
+            names += [(nickname, last), (nickname, last, suffix)]
+
+        keys = set(name_key(u' '.join(filter(bool, parts))) for parts in names)
+
+        if person.display:
+            try:
+                keys.add(name_key(person.display.format(**person.get_name_dict())))
+            except (KeyError, IndexError, ValueError):
+                keys.add(name_key(person.display))
+
+        for kind, value in (person.links or {}).items():
+            keys.add(id_key(kind, value))
+
+        keys.discard(u'')
+        return keys
+
+    def add(self, person):
+        "Add or refresh a person in the index"
+        self.remove(person.pk)
+        for key in self.person_keys(person):
+            # first in wins for namesakes, so results are stable
+            self.index.setdefault(key, person.pk)
+            self.keys[person.pk].add(key)
+
+    def remove(self, pk):
+        "Drop a person from the index"
+        for key in self.keys.pop(pk, ()):
+            if self.index.get(key) == pk:
+                del self.index[key]
+
+    def resolve(self, name):
+        """
+        Get a person's pk for a name, or None.
+        Unparseable variations fall back to HumanName.
+        """
+        pk = self.index.get(name_key(name))
+        if pk is None:
+            parsed = HumanName(name)
+            pk = self.index.get(name_key(u'%s %s' % (parsed.first, parsed.last)))
+
+        return pk
+
+    def resolve_id(self, kind, value):
+        "Get a person's pk by external ID, like resolve_id('bioguide', 'M000355')"
+        return self.index.get(id_key(kind, value))
+
+    def resolve_many(self, names, create=True):
+        """
+        Map names to people's pks. With create=True, people are
+        created for names that don't resolve, in one batch: one
+        person per normalized name, under its first spelling, so
+        "Harry Reid" and "harry  reid" don't become two people.
+        """
+        names = list(names)
+        result = dict((name, self.resolve(name)) for name in set(names))
+
+        spellings = {}
+        for name in names:
+            if result[name] is None:
+                spellings.setdefault(name_key(name), name)
+
+        if create and spellings:
+            created = self.create_many(spellings.values())
+            for name, pk in result.items():
+                if pk is None:
+                    result[name] = created[spellings[name_key(name)]]
+
+        return result
+
+    def create_many(self, names):
+        """
+        Create people for names in one insert, returning a dict of name to pk.
+        """
+        people = []
+        for name in names:
+            person = Person(name=name)
+            person._clean_name_fields()
+            person.render_names()
+            people.append(person)
+
+        assign_slugs(people, 'name')
+        Person.objects.bulk_create(people)
+
+        # bulk_create doesn't set pks, so look them up by slug
+        pks = dict(Person.objects.filter(slug__in=[p.slug for p in people])
+            .values_list('slug', 'pk'))
+
+        result = {}
+        for name, person in zip(names, people):
+            person.pk = pks[person.slug]
+            self.add(person)
+            result[name] = person.pk
+
+        return result
+
+
+def id_key(kind, value):
+    "Index key for an external ID"
+    return u'%s:%s' % (kind, value)
@@ -0,0 +1,27 @@
+"""
+Plain-dict representations of people, for JSON.
+"""
+
+
+def serialize_person(person):
+    """
+    A person, with precomputed thumbnail URLs only, so serializing
+    never does image work. Select photo along with people.
+    """
+    photo = person.get_photo()
+    thumbnails = (photo.thumbnails or {}) if photo else {}
+
+    return {
+        'id': person.pk,
+        'slug': person.slug,
+        'name': person.display_name,
+        'first': person.first,
+        'middle': person.middle,
+        'last': person.last,
+        'suffix': person.suffix,
+        'title': person.title,
+        'party': person.party,
+        'gender': person.gender,
+        'thumbnail': thumbnails.get('thumbnail'),
+        'modified': person.modified,
+    }
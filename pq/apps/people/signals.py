@@ -0,0 +1,44 @@
+"""
+Signal handlers for people, connected when models are loaded.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import Person
+
+# sent with photo_id when precomputed thumbnails are stored,
+# since that's a queryset update and post_save doesn't fire
+thumbnails_rendered = Signal(providing_args=['photo_id'])
+
+# sent with a list of people created or changed in bulk by loaders,
+# since bulk_create and queryset updates don't send post_save either
+people_changed = Signal(providing_args=['people'])
+
+
+@receiver(post_save, sender=Person)
+def update_resolvers(sender, instance, **kwargs):
+    "Keep live PersonResolvers current"
+    from .resolver import resolvers
+
+    for resolver in list(resolvers):
+        resolver.add(instance)
+
+
+@receiver(people_changed, sender=Person)
+def update_resolvers_in_bulk(sender, people, **kwargs):
+    "Keep live PersonResolvers current after bulk loads"
+    from .resolver import resolvers
+
+    for resolver in list(resolvers):
+        for person in people:
+            resolver.add(person)
+
+
+@receiver(post_delete, sender=Person)
+def remove_from_resolvers(sender, instance, **kwargs):
+    "Drop deleted people from live PersonResolvers"
+    from .resolver import resolvers
+
+    for resolver in list(resolvers):
+        resolver.remove(instance.pk)
+
@@ -1,10 +1,26 @@
-import requests
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
 import yaml
+from PIL import Image
 
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.test import TestCase
+from django.test.utils import override_settings
 
-from .models import Person
-from pq.apps.people import load
+from .models import Person, Photo, variant_key
+from pq.apps.people import load, names, photos, thumbnails
+from pq.apps.people.resolver import PersonResolver
+from pq.utils import replay, sources
+from pq.utils.checkpoints import Checkpoint
+from pq.utils.progress import Progress
+from pq.utils.slugs import allocate_slugs
 
 
 PEOPLE = [
@@ -12,6 +28,28 @@ PEOPLE = [
     'Hillary Clinton', 'John Boehner', 'Paul Ryan'
 ]
 
+# a trimmed-down slice of legislators-current.yaml
+MEMBERS = [
+    {
+        'id': {'bioguide': 'M000355', 'govtrack': '300072'},
+        'name': {'first': 'Mitch', 'last': 'McConnell', 'official_full': 'Mitch McConnell'},
+        'bio': {'gender': 'M'},
+        'terms': [{'type': 'sen', 'state': 'KY', 'party': 'Republican'}],
+    },
+    {
+        'id': {'bioguide': 'R000570', 'govtrack': '400351'},
+        'name': {'first': 'Paul', 'middle': 'D.', 'last': 'Ryan', 'official_full': 'Paul Ryan'},
+        'bio': {'gender': 'M'},
+        'terms': [{'type': 'rep', 'state': 'WI', 'party': 'Republican'}],
+    },
+    {
+        'id': {'bioguide': 'R000571', 'govtrack': '412217'},
+        'name': {'first': 'Paul', 'middle': 'D.', 'last': 'Ryan'},
+        'bio': {'gender': 'M'},
+        'terms': [{'type': 'rep', 'state': 'XX', 'party': 'Democrat'}],
+    },
+]
+
 class PeopleTest(TestCase):
     """
     Test that people are created correctly.
@@ -45,19 +83,71 @@ class PeopleTest(TestCase):
         self.assertEqual('Sen. Mitch McConnell', mitch.get_display_name())
 
 
+class NameColumnTest(TestCase):
+    """
+    Tests for display_name and sort_name, rendered on save.
+    """
+
+    def test_rendered(self):
+        "Ensure names are rendered on save and sort in SQL"
+        mitch = Person.objects.create(name='Mitch McConnell', display='Sen. {first} {last}')
+        Person.objects.create(name=u'Luis Guti\xe9rrez')
+        Person.objects.create(name='Luis Gutierrez Jr.')
+
+        self.assertEqual(Person.objects.get(pk=mitch.pk).display_name, 'Sen. Mitch McConnell')
+        self.assertEqual(unicode(mitch), 'Sen. Mitch McConnell')
+        self.assertEqual(list(Person.objects.values_list('sort_name', flat=True)),
+            [u'gutierrez luis', u'gutierrez luis jr.', u'mcconnell mitch'])
+
+        # broken templates are shown as-is
+        mitch.display = 'Sen. {frist}'
+        mitch.save()
+        self.assertEqual(mitch.display_name, 'Sen. {frist}')
+
+    def test_loaders(self):
+        "Ensure bulk loads and updates render names"
+        load.load_members(MEMBERS)
+        mitch = Person.objects.get(last='McConnell')
+        self.assertEqual(mitch.display_name, 'Mitch McConnell')
+
+        members = [dict(MEMBERS[0], name=dict(MEMBERS[0]['name'], official_full='Sen. Mitch'))]
+        load.load_members(members)
+        self.assertEqual(Person.objects.get(pk=mitch.pk).display_name, 'Sen. Mitch')
+
+    def test_backfill(self):
+        "Ensure the backfill fixes only stale rows"
+        for name in PEOPLE:
+            Person.objects.create(name=name)
+        Person.objects.filter(last='Obama').update(display_name='', sort_name='')
+
+        self.assertEqual(names.backfill(batch_size=2), 1)
+        self.assertEqual(Person.objects.get(last='Obama').sort_name, 'obama barack')
+        self.assertEqual(names.backfill(), 0)
+
+
 class PeopleLoadingTest(TestCase):
     """
-    Tests for people loaders
+    Tests for people loaders, against replayed fixture responses
     """
-    
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.settings_override = override_settings(SOURCE_CACHE_DIR=self.tmp,
+            MEDIA_ROOT=os.path.join(self.tmp, 'media'))
+        self.settings_override.enable()
+
+        self.replay = replay.offline()
+        self.replay.__enter__()
+
+    def tearDown(self):
+        self.replay.__exit__()
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp)
+
     def test_load_congress(self):
         """
         Ensure that we're loading congress correctly
         """
-        url = "https://raw.githubusercontent.com/unitedstates/congress-legislators/master/legislators-current.yaml"
-        req = requests.get(url)
-
-        members = yaml.load(req.content)
+        members = sources.load_yaml(load.CURRENT_URL)
 
         # do the actual loading
         load.congress()
@@ -68,19 +158,448 @@ class PeopleLoadingTest(TestCase):
         """
         Ensure we're checking for uniqueness.
         """
-        url = "https://raw.githubusercontent.com/unitedstates/congress-legislators/master/legislators-current.yaml"
-        req = requests.get(url)
-
-        members = yaml.load(req.content)
+        members = sources.load_yaml(load.CURRENT_URL)
 
         # do the actual loading
         load.congress()
 
-        # now do it again
+        # now do it again, revalidating with a 304
         load.congress()
 
         self.assertEqual(len(members), Person.objects.count())
+        self.assertEqual(self.replay.counts()['legislators-current.yaml'], 3)
+
+    def test_load_photos(self):
+        "Ensure photos sync for loaded members"
+        load.congress()
+        results = photos.sync_photos(render=False)
+
+        self.assertEqual(Photo.objects.count(), Person.objects.count())
+        self.assertEqual(self.replay.counts()['photo.jpg'], len(results))
+
+
+class MemberLoadingTest(TestCase):
+    """
+    Tests for the batched member loader, without the network.
+    """
+
+    def test_counts(self):
+        "Ensure created/updated/unchanged counts are reported."
+        counts = load.load_members(MEMBERS)
+        self.assertEqual(counts['created'], len(MEMBERS))
+        self.assertEqual(Person.objects.count(), len(MEMBERS))
+
+        counts = load.load_members(MEMBERS)
+        self.assertEqual(counts, {'created': 0, 'updated': 0, 'unchanged': len(MEMBERS)})
+
+        # every row changed is still one UPDATE, with the lookup,
+        # a savepoint and the storylines to invalidate
+        with self.assertNumQueries(5):
+            counts = load.load_members(MEMBERS, public=False)
+        self.assertEqual(counts['updated'], len(MEMBERS))
+        self.assertFalse(Person.objects.filter(public=True).exists())
+
+    def test_repeated_ids(self):
+        "Ensure a member repeated within a batch is loaded once."
+        counts = load.load_members([MEMBERS[0], MEMBERS[0]])
+        self.assertEqual(counts, {'created': 1, 'updated': 0, 'unchanged': 0})
+
+        changed = dict(MEMBERS[0], name=dict(MEMBERS[0]['name'], nickname='Mitchell'))
+        counts = load.load_members([changed, changed])
+        self.assertEqual(counts, {'created': 0, 'updated': 1, 'unchanged': 0})
+        self.assertEqual(Person.objects.get().nickname, 'Mitchell')
+
+    def test_changes_tracked(self):
+        "Ensure updates move modified and reach live resolvers."
+        load.load_members(MEMBERS)
+        mitch = Person.objects.get(last='McConnell')
+        resolver = PersonResolver()
+
+        members = [dict(MEMBERS[0], name=dict(MEMBERS[0]['name'], nickname='Mitchell'))]
+        load.load_members(members)
+        self.assertGreater(Person.objects.get(pk=mitch.pk).modified, mitch.modified)
+        self.assertEqual(resolver.resolve('Mitchell McConnell'), mitch.pk)
+
+        load.load_members([dict(MEMBERS[0], id={'bioguide': 'P000197'},
+            name={'first': 'Nancy', 'last': 'Pelosi'})])
+        self.assertEqual(resolver.resolve('Nancy Pelosi'), Person.objects.get(last='Pelosi').pk)
+
+    def test_unique_slugs(self):
+        "Ensure namesakes in one batch get distinct slugs."
+        load.load_members(MEMBERS)
+        slugs = Person.objects.filter(last='Ryan').values_list('slug', flat=True)
+        self.assertEqual(sorted(slugs), ['paul-d-ryan', 'paul-d-ryan-1'])
+
+
+class ExternalIdTest(TestCase):
+    """
+    Tests for batch lookups by IDs in Person.links
+    """
+
+    def setUp(self):
+        load.load_members(MEMBERS)
+
+    def test_batch(self):
+        "Ensure a list of IDs resolves in one query"
+        with self.assertNumQueries(1):
+            people = Person.objects.external_id_map('govtrack',
+                ['300072', '412217', 'nope'])
+
+        self.assertEqual(sorted(people), ['300072', '412217'])
+        self.assertEqual(people['300072'].last, 'McConnell')
+        self.assertEqual(Person.objects.by_external_ids('bioguide', []).count(), 0)
+        self.assertEqual(Person.objects.with_external_id('bioguide').count(), len(MEMBERS))
+
+    def test_api(self):
+        "Ensure the people API filters by external IDs"
+        response = self.client.get('/api/people/', {'bioguide': 'M000355,R000570'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+
+
+class SlugTest(TestCase):
+    """
+    Test slug allocation for namesakes.
+    """
+    def test_namesakes(self):
+        "Ensure namesakes get sequential slugs."
+        for i in range(3):
+            Person.objects.create(name='John Smith')
+
+        slugs = Person.objects.values_list('slug', flat=True)
+        self.assertEqual(sorted(slugs), ['john-smith', 'john-smith-1', 'john-smith-2'])
+
+        # one query, however many namesakes exist
+        person = Person(name='John Smith')
+        with self.assertNumQueries(1):
+            self.assertEqual(person.slugify(), 'john-smith-3')
+
+    def test_batch(self):
+        "Ensure a batch of slugs doesn't collide with itself."
+        Person.objects.create(name='John Smith')
+        slugs = allocate_slugs(Person, ['John Smith', 'John Smith', 'Jane Doe'])
+        self.assertEqual(slugs, ['john-smith-1', 'john-smith-2', 'jane-doe'])
+
+    def test_empty(self):
+        "Ensure values with nothing to slug don't match every slug."
+        Person.objects.create(name='John Smith')
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(Person, [u'???', u'\u2014'])
+        self.assertEqual(slugs, ['person', 'person-1'])
+
+
+class SourceCacheTest(TestCase):
+    """
+    Test the loader source cache against a local file.
+    """
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'legislators.yaml')
+        with open(self.path, 'w') as f:
+            yaml.safe_dump(MEMBERS, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_local_source(self):
+        "Ensure local files load, and unchanged files are skipped."
+        with override_settings(SOURCE_CACHE_DIR=os.path.join(self.tmp, 'cache')):
+            counts = load.congress(source=self.path, skip_unchanged=True)
+            self.assertEqual(counts['created'], len(MEMBERS))
+
+            self.assertIsNone(load.congress(source=self.path, skip_unchanged=True))
+            self.assertEqual(sources.load_yaml(self.path), MEMBERS)
+
+    def test_stream(self):
+        "Ensure streamed members match a full parse."
+        with override_settings(SOURCE_CACHE_DIR=os.path.join(self.tmp, 'cache')):
+            self.assertEqual(list(sources.iter_yaml_list(self.path)), MEMBERS)
+
+    def test_historical_resume(self):
+        "Ensure an interrupted historical load resumes from its checkpoint."
+        with override_settings(SOURCE_CACHE_DIR=os.path.join(self.tmp, 'cache'),
+                               CHECKPOINT_DIR=os.path.join(self.tmp, 'checkpoints')):
+            source = sources.fetch(self.path)
+            Checkpoint('congress-historical').save({'digest': source.digest, 'position': 2})
+
+            counts = load.congress_historical(source=self.path, batch_size=1)
+            self.assertEqual(counts['created'], 1)
+            self.assertEqual(Checkpoint('congress-historical').load(), {})
+
+            counts = load.congress_historical(source=self.path, batch_size=1)
+            self.assertEqual(counts['created'], len(MEMBERS) - 1)
+            self.assertEqual(counts['unchanged'], 1)
+
+    def test_streamed_limits(self):
+        "Ensure dry runs write nothing, and limited loads continue on the next run."
+        with override_settings(SOURCE_CACHE_DIR=os.path.join(self.tmp, 'cache'),
+                               CHECKPOINT_DIR=os.path.join(self.tmp, 'checkpoints')):
+            checkpoint = Checkpoint('congress-test')
+
+            counts = load.load_streamed(self.path, checkpoint, dry_run=True)
+            self.assertEqual(counts['created'], len(MEMBERS))
+            self.assertEqual(Person.objects.count(), 0)
+            self.assertEqual(checkpoint.load(), {})
+
+            # no term in MEMBERS has an end date
+            progress = Progress('members', stream=StringIO())
+            load.load_streamed(self.path, checkpoint, since=datetime.date(2000, 1, 1),
+                progress=progress)
+            self.assertEqual(progress.counts['skipped'], len(MEMBERS))
+            self.assertEqual(Person.objects.count(), 0)
+
+            counts = load.load_streamed(self.path, checkpoint, batch_size=1, limit=2)
+            self.assertEqual(counts['created'], 2)
+            self.assertEqual(checkpoint.load()['position'], 2)
+
+            counts = load.load_streamed(self.path, checkpoint, batch_size=1)
+            self.assertEqual(counts['created'], len(MEMBERS) - 2)
+            self.assertEqual(checkpoint.load(), {})
+
+    def test_streamed_since(self):
+        "Ensure filtered and unfiltered loads don't share a checkpoint."
+        with override_settings(SOURCE_CACHE_DIR=os.path.join(self.tmp, 'cache'),
+                               CHECKPOINT_DIR=os.path.join(self.tmp, 'checkpoints')):
+            checkpoint = Checkpoint('congress-test')
+            since = datetime.date(2000, 1, 1)
+
+            # a finished filtered run doesn't count as a full load
+            load.load_streamed(self.path, checkpoint, since=since)
+            self.assertTrue(sources.fetch(self.path).changed)
+
+            load.load_streamed(self.path, checkpoint, since=since, batch_size=1, limit=2)
+            self.assertEqual(checkpoint.load()['since'], '2000-01-01')
+
+            # an unfiltered run starts over
+            counts = load.load_streamed(self.path, checkpoint, batch_size=1)
+            self.assertEqual(counts['created'], len(MEMBERS))
+            self.assertFalse(sources.fetch(self.path).changed)
+
+
+class ResolverTest(TestCase):
+    """
+    Test resolving names to people in memory.
+    """
+    def setUp(self):
+        load.load_members(MEMBERS)
+        self.resolver = PersonResolver()
+
+    def test_resolve(self):
+        "Ensure name forms and IDs resolve without queries."
+        mitch = Person.objects.get(last='McConnell')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.resolve('Mitch McConnell'), mitch.pk)
+            self.assertEqual(self.resolver.resolve('mitch  mcconnell'), mitch.pk)
+            self.assertEqual(self.resolver.resolve_id('bioguide', 'M000355'), mitch.pk)
+            self.assertIsNone(self.resolver.resolve('Nancy Pelosi'))
+
+    def test_create_misses(self):
+        "Ensure misses are created in a batch and indexed."
+        result = self.resolver.resolve_many(['Nancy Pelosi', 'Harry Reid',
+            'harry  reid', 'Mitch McConnell'])
+        self.assertEqual(Person.objects.count(), len(MEMBERS) + 2)
+        self.assertEqual(result['Nancy Pelosi'], Person.objects.get(last='Pelosi').pk)
+        self.assertEqual(self.resolver.resolve('Harry Reid'), result['Harry Reid'])
+        self.assertEqual(result['harry  reid'], result['Harry Reid'])
+
+    def test_signals(self):
+        "Ensure saved and deleted people update the index."
+        person = Person.objects.create(name='Nancy Pelosi')
+        self.assertEqual(self.resolver.resolve('Nancy Pelosi'), person.pk)
+
+        person.delete()
+        self.assertIsNone(self.resolver.resolve('Nancy Pelosi'))
+
+
+class FakeResponse(object):
+    "Just enough of a requests response"
+    def __init__(self, url, status_code=200, content=b'', headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class BrokenResponse(FakeResponse):
+    "Drops the connection partway through the body"
+    def iter_content(self, chunk_size=1):
+        yield self.content[:4]
+        raise IOError('Connection reset by peer')
+
+
+class FakeSession(object):
+    "Serves the same image for everyone, honoring If-None-Match"
+    def __init__(self, etag='"v1"'):
+        self.requests = 0
+        self.etag = etag
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requests += 1
+        if (headers or {}).get('If-None-Match') == self.etag:
+            return FakeResponse(url, 304)
+        return FakeResponse(url, content=b'not really a jpeg', headers={'etag': self.etag})
+
+
+class PhotoSyncTest(TestCase):
+    """
+    Test bulk photo syncs against a fake session.
+    """
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.tmp)
+        self.settings_override.enable()
+
+        self.session = FakeSession()
+        self.get_session = photos.get_session
+        photos.get_session = lambda pool_size: self.session
+
+        load.load_members(MEMBERS)
+
+    def tearDown(self):
+        photos.get_session = self.get_session
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp)
+
+    def test_sync(self):
+        "Ensure photos are created once, then revalidated."
+        results = photos.sync_photos(workers=2, render=False)
+        self.assertEqual([r.status for r in results], ['created'] * len(MEMBERS))
+
+        results = photos.sync_photos(workers=2, render=False)
+        self.assertEqual([r.status for r in results], ['unchanged'] * len(MEMBERS))
+
+        results = photos.sync_photos(update=False, render=False)
+        self.assertEqual([r.status for r in results], ['skipped'] * len(MEMBERS))
+        self.assertEqual(self.session.requests, len(MEMBERS) * 2)
+
+    def test_content_addressed(self):
+        "Ensure identical images are stored once, and re-fetching them is a no-op."
+        photos.sync_photos(workers=2, render=False)
+        names = set(Photo.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+
+        # new etag, same bytes
+        self.session.etag = '"v2"'
+        results = photos.sync_photos(workers=2, render=False)
+        self.assertEqual([r.status for r in results], ['unchanged'] * len(MEMBERS))
+        self.assertEqual(set(Photo.objects.values_list('image', flat=True)), names)
+        self.assertEqual(sum(len(files) for root, dirs, files in os.walk(self.tmp)), 1)
+
+    def test_sync_all(self):
+        "Ensure batched syncs share a session, render once, and don't resume a filtered checkpoint."
+        sessions, rendered, generate = [], [], thumbnails.generate
+        photos.get_session = lambda pool_size: sessions.append(pool_size) or self.session
+        thumbnails.generate = lambda photo_ids: rendered.append(list(photo_ids))
+        try:
+            with override_settings(CHECKPOINT_DIR=os.path.join(self.tmp, 'checkpoints')):
+                last = Person.objects.order_by('pk').reverse()[0]
+                Checkpoint('photo-sync').save({'pk': last.pk, 'since': '2000-01-01'})
+
+                totals = photos.sync_all(batch_size=1, workers=2)
+        finally:
+            thumbnails.generate = generate
+
+        self.assertEqual(totals['created'], len(MEMBERS))
+        self.assertEqual(sessions, [2])
+        self.assertEqual(rendered, [list(Photo.objects.order_by('person').values_list('pk', flat=True))])
+
+    def test_cleanup(self):
+        "Ensure downloads are removed when streaming or saving fails."
+        downloads = os.path.join(self.tmp, 'downloads')
+        os.mkdir(downloads)
+        tempdir, tempfile.tempdir = tempfile.tempdir, downloads
+        try:
+            with self.assertRaises(IOError):
+                photos.download(BrokenResponse('http://example.com/', content=b'not a jpeg'))
+            self.assertEqual(os.listdir(downloads), [])
+
+            result = photos.fetch_photo(self.session, Person.objects.get(last='McConnell'))
+            self.assertEqual(len(os.listdir(downloads)), 1)
+
+            result.response = None
+            with self.assertRaises(AttributeError):
+                photos.save_photo(result)
+            self.assertEqual(os.listdir(downloads), [])
+        finally:
+            tempfile.tempdir = tempdir
+
+
+class ThumbnailTest(TestCase):
+    """
+    Test precomputed thumbnail bookkeeping.
+    """
+    def test_stale_on_crop(self):
+        "Ensure changing the crop clears precomputed thumbnails."
+        person = Person.objects.create(name='Paul Ryan')
+        photo = Photo(person=person, image='photos/ab/ab.jpg')
+        photo.save()
+
+        photo.thumbnails = {'thumbnail': '/media/cache/ab.jpg'}
+        photo.save()
+        self.assertEqual(photo.thumbnail(), '/media/cache/ab.jpg')
+
+        photo = Photo.objects.get(pk=photo.pk)
+        photo.crop_vert = '0%'
+        photo.save()
+        self.assertEqual(Photo.objects.get(pk=photo.pk).thumbnails, {})
+
+    def test_render_errors(self):
+        "Ensure photos that can't be rendered are skipped, not fatal."
+        tmp = tempfile.mkdtemp()
+        try:
+            with self.settings(MEDIA_ROOT=tmp, PHOTO_WIDTHS=(8,)):
+                with open(replay.fixture_path('photo.jpg'), 'rb') as f:
+                    good = Photo.objects.create(person=Person.objects.create(name='Paul Ryan'),
+                        image=default_storage.save('photos/ef.jpg', File(f)))
+                missing = Photo.objects.create(person=Person.objects.create(name='John Boehner'),
+                    image='photos/cd.jpg')
+
+                deleted = missing.pk + good.pk
+                self.assertEqual(thumbnails.render(deleted), (deleted, None))
+                self.assertEqual(thumbnails.generate([missing.pk, deleted, good.pk], processes=1), 1)
+
+                self.assertEqual(Photo.objects.get(pk=missing.pk).thumbnails, {})
+                self.assertEqual(set(Photo.objects.get(pk=good.pk).thumbnails), set(Photo.renditions()))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_srcset(self):
+        "Ensure srcset is built from precomputed variants."
+        person = Person.objects.create(name='Paul Ryan')
+        photo = Photo(person=person, image='photos/ab/ab.jpg',
+            thumbnails={'w150.webp': 'ab-150.webp', 'w300.webp': 'ab-300.webp'})
+
+        with self.settings(PHOTO_WIDTHS=(150, 300)):
+            self.assertEqual(photo.srcset('webp'), 'ab-150.webp 150w, ab-300.webp 300w')
 
+        self.assertEqual(Photo(person=person).srcset('webp'), '')
 
+    def test_render(self):
+        "Ensure a variant renders in each format, WebP included."
+        tmp = tempfile.mkdtemp()
+        try:
+            with self.settings(MEDIA_ROOT=tmp, PHOTO_WIDTHS=(8,)):
+                with open(replay.fixture_path('photo.jpg'), 'rb') as f:
+                    photo = Photo(image=default_storage.save('photos/ab.jpg', File(f)))
 
+                renditions = Photo.renditions()
+                for format in settings.PHOTO_FORMATS:
+                    geometry, options = renditions[variant_key(8, format)]
+                    thumb = photo.resize(geometry, **options)
 
+                    self.assertTrue(thumb.exists())
+                    self.assertTrue(thumb.name.endswith(thumbnails.EXTENSIONS[format]))
+                    self.assertEqual(Image.open(thumb.storage.path(thumb.name)).format, format)
+                    thumb.delete()
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,144 @@
+"""
+Pre-generate photo thumbnails on a process pool.
+
+Rendered URLs are stored on Photo.thumbnails, so pages read them
+straight from the row, without image work or sorl key-value store
+lookups on the request path.
+
+Saving a new image or crop only clears a photo's thumbnails.
+The render_thumbnails command renders every stale photo on the
+pool; photo syncs render what they changed themselves.
+"""
+import logging
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+from sorl.thumbnail import base
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+
+from .models import Photo
+from .signals import thumbnails_rendered
+
+log = logging.getLogger(__name__)
+
+# file extensions by PIL format; sorl-thumbnail 12.3, the last
+# release for Django 1.6, only knows JPEG and PNG
+EXTENSIONS = dict(base.EXTENSIONS, WEBP='webp')
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    """
+    sorl's backend, naming files for every format in PHOTO_FORMATS.
+    Set as THUMBNAIL_BACKEND.
+    """
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = '%s/%s/%s' % (key[:2], key[2:4], key)
+        return '%s%s.%s' % (sorl_settings.THUMBNAIL_PREFIX, path, EXTENSIONS[options['format']])
+
+
+def generate(photo_ids=None, processes=None):
+    """
+    Render thumbnails for photos, `processes` at a time.
+
+    By default, this covers every photo whose thumbnails
+    are missing or stale. Returns the number rendered.
+    """
+    if photo_ids is None:
+        photo_ids = stale_photo_ids()
+
+    photo_ids = list(photo_ids)
+    if not photo_ids:
+        return 0
+
+    if processes is None:
+        processes = settings.THUMBNAIL_PROCESSES
+
+    if processes == 1 or len(photo_ids) == 1:
+        return sum(store(*render(pk)) for pk in photo_ids)
+
+    # forked workers can't share our database connection
+    connection.close()
+    pool = Pool(processes)
+    rendered = 0
+    try:
+        for pk, urls in pool.imap_unordered(render, photo_ids):
+            rendered += store(pk, urls)
+    finally:
+        pool.close()
+        pool.join()
+
+    log.info('Rendered thumbnails for %i of %i photos', rendered, len(photo_ids))
+    return rendered
+
+
+def render(pk):
+    """
+    Render one photo's thumbnails. Runs in worker processes, so a
+    missing photo or a broken image is logged and returns no URLs
+    instead of stopping the rest of the pool.
+    """
+    try:
+        photo = Photo.objects.get(pk=pk)
+        return pk, photo.render_thumbnails()
+    except Exception:
+        log.exception('Could not render thumbnails for photo %s', pk)
+        return pk, None
+
+
+def store(pk, urls):
+    "Save rendered URLs, returning whether there were any"
+    if urls is None:
+        return False
+
+    Photo.objects.filter(pk=pk).update(thumbnails=urls)
+    thumbnails_rendered.send(sender=Photo, photo_id=pk)
+    return True
+
+
+def stale_photo_ids():
+    """
+    Photos with an image, missing any configured size.
+    """
+    sizes = set(Photo.renditions())
+    photos = Photo.objects.exclude(image='').exclude(image__isnull=True)
+    return [pk for pk, thumbnails in photos.values_list('pk', 'thumbnails')
+        if not sizes.issubset(thumbnails or {})]
+
+
+def variant_report(photos=None):
+    """
+    Total stored bytes per rendition across photos, with the original
+    images for comparison. Returns a list of (name, count, bytes)
+    tuples, smallest first.
+    """
+    if photos is None:
+        photos = Photo.objects.exclude(image='').exclude(image__isnull=True)
+
+    totals = {}
+
+    def add(name, size):
+        count, total = totals.get(name, (0, 0))
+        totals[name] = (count + 1, total + size)
+
+    for photo in photos:
+        if default_storage.exists(photo.image.name):
+            add('original', photo.image.size)
+
+        for name, url in (photo.thumbnails or {}).items():
+            path = storage_name(url)
+            if path and default_storage.exists(path):
+                add(name, default_storage.size(path))
+
+    report = [(name, count, total) for name, (count, total) in totals.items()]
+    report.sort(key=lambda row: row[2])
+    return report
+
+
+def storage_name(url):
+    "Storage name for a media URL, or None"
+    if url.startswith(settings.MEDIA_URL):
+        return url[len(settings.MEDIA_URL):]
@@ -0,0 +1,6 @@
+from django.conf.urls import patterns, url
+
+urlpatterns = patterns('pq.apps.people.views',
+    url(r'^people/$', 'person_list', name='person_list'),
+    url(r'^people/(?P<slug>[-\w]+)/$', 'person_detail', name='person_detail'),
+)
@@ -1,3 +1,35 @@
-from django.shortcuts import render
+"""
+Read-only JSON API for people. Only public people are listed.
+"""
+from django.shortcuts import get_object_or_404
 
-# Create your views here.
+from pq.utils.api import detail_response, list_response
+from .managers import INDEXED_IDS
+from .models import Person
+from .serializers import serialize_person
+
+
+def people():
+    return Person.objects.public().select_related('photo')
+
+
+def person_list(request):
+    """
+    Public people, by sort_name (last, first). Filter with ?party=<party>,
+    or cross-reference external IDs with ?bioguide=<id>,<id> (or any
+    kind in INDEXED_IDS).
+    """
+    qs = people()
+    if request.GET.get('party'):
+        qs = qs.filter(party=request.GET['party'])
+
+    for kind in INDEXED_IDS:
+        if request.GET.get(kind):
+            qs = qs.by_external_ids(kind, request.GET[kind].split(','))
+
+    return list_response(request, qs, ('sort_name', 'pk'), serialize_person)
+
+
+def person_detail(request, slug):
+    person = get_object_or_404(people(), slug=slug)
+    return detail_response(request, person, serialize_person)
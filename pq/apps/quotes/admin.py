@@ -1,6 +1,65 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
 
-from .models import Topic, Quote, Storyline, StorylineQuote
+from pq.utils.api import BadRequest, keyset_page
+from .models import Rollup, Topic, Quote, Storyline, StorylineQuote
+
+CURSOR_VAR = 'cursor'
+
+# a storyline's quote count, read from its rollup row (see rollups.py)
+QUOTE_COUNT = "SELECT count FROM %s WHERE kind = 'storyline' AND key = CAST(%s.id AS varchar)" % (
+	Rollup._meta.db_table, Storyline._meta.db_table)
+
+
+class KeysetChangeList(ChangeList):
+	"""
+	A changelist that pages by keyset in its default order, like the
+	API (see pq.utils.api): each page links to the next with a cursor
+	holding the last row's ordering values, so deep pages cost the same
+	as the first instead of an OFFSET over every row before them.
+	Sorting by a column falls back to numbered pages.
+	"""
+	keyset = False
+	next_cursor = None
+
+	def get_filters_params(self, params=None):
+		lookup_params = super(KeysetChangeList, self).get_filters_params(params)
+		lookup_params.pop(CURSOR_VAR, None)
+		return lookup_params
+
+	def get_results(self, request):
+		super(KeysetChangeList, self).get_results(request)
+
+		ordering = self.keyset_ordering()
+		if not ordering or (self.show_all and self.can_show_all):
+			return
+
+		try:
+			self.result_list, self.next_cursor = keyset_page(self.queryset, ordering,
+				self.params.get(CURSOR_VAR), self.list_per_page)
+		except BadRequest:
+			raise IncorrectLookupParameters
+
+		# no numbered pages
+		self.keyset, self.multi_page = True, False
+		self.cursor = self.params.get(CURSOR_VAR)
+		self.first_page_url = self.get_query_string(remove=[CURSOR_VAR])
+		self.next_page_url = self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+	def keyset_ordering(self):
+		"""
+		The default ordering, if it's all plain columns of this
+		model, ending in the pk. None when sorted by a column.
+		"""
+		if ORDER_VAR in self.params:
+			return None
+
+		ordering = list(self.queryset.query.order_by)
+		names = set(f.attname for f in self.opts.concrete_fields) | set(['pk'])
+		if ordering and all(f.lstrip('-') in names for f in ordering) \
+				and ordering[-1].lstrip('-') in ('pk', self.opts.pk.attname):
+			return ordering
 
 class TopicAdmin(admin.ModelAdmin):
 	prepopulated_fields = {'slug': ('name',)}
@@ -8,8 +67,56 @@ class TopicAdmin(admin.ModelAdmin):
 
 class QuoteAdmin(admin.ModelAdmin):
 
-	list_display = ('speaker', 'text', 'source_title', 'datetime', 'added_by')
+	list_display = ('speaker_thumbnail', 'speaker', 'text', 'source_title', 'datetime', 'added_by')
+	list_display_links = ('speaker', 'text')
+
+	# join related rows instead of a query per row
+	list_select_related = ('speaker', 'speaker__photo', 'added_by')
+
+	# don't render every person into select widgets
+	raw_id_fields = ('speaker', 'mentions')
+
+	def get_queryset(self, request):
+		"Estimated counts on the unfiltered changelist, instead of COUNT(*)"
+		return super(QuoteAdmin, self).get_queryset(request).estimated()
+
+	def get_changelist(self, request, **kwargs):
+		return KeysetChangeList
+
+	def speaker_thumbnail(self, obj):
+		if obj.speaker:
+			return obj.speaker.admin_thumbnail()
+		return u''
+	speaker_thumbnail.allow_tags = True
+	speaker_thumbnail.short_description = 'Photo'
+
+
+class StorylineQuoteInline(admin.TabularInline):
+	model = StorylineQuote
+	raw_id_fields = ('quote',)
+	extra = 1
+
+
+class StorylineAdmin(admin.ModelAdmin):
+
+	list_display = ('title', 'author', 'status', 'datetime', 'quote_count')
+	list_filter = ('status',)
+	list_select_related = ('author',)
+	inlines = [StorylineQuoteInline]
+
+	def get_queryset(self, request):
+		"Estimated counts, and quote counts from rollups instead of joining every quote"
+		qs = super(StorylineAdmin, self).get_queryset(request).estimated()
+		return qs.extra(select={'quote_count': QUOTE_COUNT})
+
+	def get_changelist(self, request, **kwargs):
+		return KeysetChangeList
+
+	def quote_count(self, obj):
+		return obj.quote_count or 0
+	quote_count.short_description = 'Quotes'
+	quote_count.admin_order_field = 'quote_count'
 
 
 admin.site.register(Quote, QuoteAdmin)
-admin.site.register(Storyline)
+admin.site.register(Storyline, StorylineAdmin)
@@ -0,0 +1,185 @@
+"""
+Near-duplicate detection for quotes, using MinHash signatures
+and locality-sensitive hashing (LSH).
+
+Each quote's text is broken into word shingles and reduced to a
+MinHash signature. The signature is split into bands, and each band
+is hashed into a bucket stored in QuoteBucket. Quotes that share any
+bucket are candidate duplicates, so finding them is an indexed lookup
+instead of a comparison against every other quote.
+
+With 16 bands of 4 rows, quotes sharing about half their shingles
+are likely to collide in at least one band.
+"""
+import hashlib
+import random
+import re
+import zlib
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from pq.utils import batched
+from .models import Quote, QuoteBucket
+from .text import normalize
+
+SHINGLE_SIZE = 3
+BANDS = 16
+ROWS = 4
+THRESHOLD = 0.5
+
+# a prime just above 2 ** 32, for universal hashing
+PRIME = 4294967311
+
+# fixed seed, so signatures are stable across runs and processes
+_random = random.Random(1729)
+PERMUTATIONS = [(_random.randint(1, PRIME - 1), _random.randint(0, PRIME - 1))
+    for i in range(BANDS * ROWS)]
+
+WORDS = re.compile(r'\w+', re.UNICODE)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Overlapping runs of `size` words from normalized text.
+    Punctuation, ellipses and case are ignored.
+    """
+    words = WORDS.findall(normalize(text))
+    if len(words) <= size:
+        return set([u' '.join(words)])
+
+    return set(u' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def signature(shingle_set):
+    """
+    MinHash signature for a set of shingles.
+    """
+    hashes = [zlib.crc32(s.encode('utf-8')) & 0xffffffff for s in shingle_set]
+    return [min((a * h + b) % PRIME for h in hashes) for a, b in PERMUTATIONS]
+
+
+def buckets(text):
+    """
+    (band, bucket) pairs for some text.
+    """
+    sig = signature(shingles(text))
+    result = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        key = hashlib.sha1(','.join(map(str, rows))).hexdigest()[:16]
+        result.append((band, key))
+
+    return result
+
+
+def similarity(a, b):
+    """
+    Jaccard similarity of two texts' shingles.
+    """
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / float(len(a | b))
+
+
+def index_quote(quote):
+    """
+    Replace a quote's LSH buckets.
+    """
+    with transaction.atomic():
+        QuoteBucket.objects.filter(quote=quote).delete()
+        QuoteBucket.objects.bulk_create(
+            QuoteBucket(quote_id=quote.pk, band=band, bucket=bucket)
+            for band, bucket in buckets(quote.text))
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuild buckets for every quote, in batches.
+    Returns the number of quotes indexed.
+    """
+    count = 0
+    rows = Quote.objects.order_by('pk').values_list('pk', 'text').iterator()
+
+    with transaction.atomic():
+        QuoteBucket.objects.all().delete()
+        for batch in batched(rows, batch_size):
+            QuoteBucket.objects.bulk_create(
+                QuoteBucket(quote_id=pk, band=band, bucket=bucket)
+                for pk, text in batch
+                for band, bucket in buckets(text))
+            count += len(batch)
+
+    return count
+
+
+def likely_duplicates(quote, threshold=THRESHOLD):
+    """
+    Quotes that are probably near-duplicates of this one,
+    as (quote, similarity) pairs, most similar first.
+    """
+    query = Q()
+    for band, bucket in buckets(quote.text):
+        query |= Q(buckets__band=band, buckets__bucket=bucket)
+
+    candidates = Quote.objects.filter(query).exclude(pk=quote.pk).distinct()
+
+    result = []
+    for candidate in candidates.select_related('speaker'):
+        score = similarity(quote.text, candidate.text)
+        if score >= threshold:
+            result.append((candidate, score))
+
+    result.sort(key=lambda pair: pair[1], reverse=True)
+    return result
+
+
+def duplicate_report(threshold=THRESHOLD):
+    """
+    Groups of likely near-duplicate quotes across the whole corpus,
+    as lists of quote IDs, largest groups first.
+
+    Only quotes sharing a bucket are ever compared.
+    """
+    table = QuoteBucket._meta.db_table
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT b.band, b.bucket, b.quote_id FROM {0} b
+        JOIN (
+            SELECT band, bucket FROM {0}
+            GROUP BY band, bucket HAVING count(*) > 1
+        ) d ON b.band = d.band AND b.bucket = d.bucket
+    """.format(table))
+
+    shared = defaultdict(set)
+    for band, bucket, quote_id in cursor.fetchall():
+        shared[(band, bucket)].add(quote_id)
+
+    pairs = set()
+    for ids in shared.values():
+        ids = sorted(ids)
+        pairs.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+
+    ids = set(pk for pair in pairs for pk in pair)
+    texts = dict(Quote.objects.filter(pk__in=ids).values_list('pk', 'text'))
+
+    # union-find over pairs that pass the similarity check
+    parent = dict((pk, pk) for pk in ids)
+
+    def find(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    for a, b in pairs:
+        if similarity(texts[a], texts[b]) >= threshold:
+            parent[find(a)] = find(b)
+
+    groups = defaultdict(list)
+    for pk in ids:
+        groups[find(pk)].append(pk)
+
+    groups = [sorted(g) for g in groups.values() if len(g) > 1]
+    groups.sort(key=len, reverse=True)
+    return groups
@@ -1,29 +1,54 @@
 """
 Loader scripts for quotes, including Tumblr import.
 """
+import calendar
 import datetime
+import hashlib
 import logging
 import os
+import threading
+from multiprocessing.pool import ThreadPool
 
 from calais import Calais
 from pytumblr import TumblrRestClient
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import get_cache
+from django.db import transaction
 from django.utils.timezone import utc
 
-from pq.apps.people.models import Person
+from pq.apps.people.resolver import PersonResolver
+from pq.utils import batched
+from pq.utils.checkpoints import Checkpoint
+from pq.utils.instrumentation import traced
+from . import rollups
 from .models import Topic, Quote
+from .text import fingerprint
 
 CALAIS_API_KEY = settings.CALAIS_API_KEY
 TUMBLR_API_KEY = settings.TUMBLR_API_KEY
 TUMBLR_BLOG = settings.TUMBLR_BLOG
 
+# the most posts tumblr will return per request
+PAGE_SIZE = 20
+
+# concurrent page fetches for backfills
+FETCH_WORKERS = 4
+
+# concurrent Calais requests for cache misses
+CALAIS_WORKERS = 4
+
 calais = Calais(CALAIS_API_KEY)
 tumblr = TumblrRestClient(TUMBLR_API_KEY)
 
+# Calais results, keyed by a hash of the analyzed text.
+# Size and age limits are set on the 'calais' cache in settings.
+speaker_cache = get_cache('calais')
+
 log = logging.getLogger(__name__)
 
+@traced('tumblr ingest')
 def tumblr_ingest(blog=TUMBLR_BLOG, **kwargs):
     """
     Load quotes from tumblr blog. See fields available here:
@@ -34,30 +59,185 @@ def tumblr_ingest(blog=TUMBLR_BLOG, **kwargs):
     """
     kwargs.setdefault('limit', 50)
     quotes = tumblr.posts(blog, type='quote', **kwargs)
+    ingest_posts(quotes['posts'])
+
+
+@traced('tumblr sync')
+def tumblr_sync(blog=TUMBLR_BLOG, backfill=False, workers=FETCH_WORKERS, batch_size=100,
+                since=None, limit=None, dry_run=False, progress=None):
+    """
+    Sync quotes from a tumblr blog, paging past the first page.
+
+    By default, this is incremental: pages are fetched newest first,
+    stopping at the first post at or below the high-water mark stored
+    from the last sync. With backfill=True, every page of the blog is
+    fetched, `workers` pages at a time.
+
+    Posts are ingested oldest first, `batch_size` at a time, and the
+    mark moves after each batch, so an interrupted sync picks up where
+    it stopped. `since`, a date, skips older posts; `limit` ingests at
+    most that many, oldest first. With dry_run, posts are fetched and
+    checked for duplicates but nothing is written. A Progress, if
+    given, is updated after each batch.
+
+    Returns the number of posts ingested (or that would be).
+    """
+    checkpoint = Checkpoint('tumblr-%s' % blog)
+    state = checkpoint.load()
+    since_timestamp = timestamp(since) if since else 0
+
+    if backfill:
+        posts = fetch_all_posts(blog, workers)
+    else:
+        posts = fetch_new_posts(blog, state.get('id', 0), since_timestamp)
+
+    posts = [p for p in posts if p['timestamp'] >= since_timestamp]
+    if not posts:
+        log.info('No new posts on %s', blog)
+        return 0
+
+    # oldest first, so the mark only moves past posts we've ingested
+    posts.sort(key=lambda p: p['id'])
+    if limit is not None:
+        posts = posts[:limit]
+
+    if progress is not None:
+        progress.total = len(posts)
+
+    if dry_run:
+        count = len(new_posts(posts))
+        if progress is not None:
+            progress.update(len(posts), new=count)
+        return count
+
+    # one index of people for the whole run, kept current by signals
+    resolver = PersonResolver()
+
+    ingested = 0
+    for batch in batched(posts, batch_size):
+        created = ingest_posts(batch, workers, resolver=resolver)
+        ingested += created
+
+        latest = batch[-1]
+        if latest['id'] > state.get('id', 0):
+            state = {'id': latest['id'], 'timestamp': latest['timestamp']}
+            checkpoint.save(state)
+
+        if progress is not None:
+            progress.update(len(batch), created=created)
+
+    return ingested
+
+
+def fetch_new_posts(blog, since_id=0, since_timestamp=0):
+    """
+    Page through posts newer than since_id (and no older than
+    since_timestamp), newest first.
+    """
+    posts = []
+    offset = 0
+    while True:
+        page = fetch_page(blog, offset, client=tumblr)
+        new = [p for p in page if p['id'] > since_id and p['timestamp'] >= since_timestamp]
+        posts.extend(new)
+
+        if len(new) < len(page) or len(page) < PAGE_SIZE:
+            return posts
+
+        offset += PAGE_SIZE
+
+
+def timestamp(date):
+    "A date as a UTC unix timestamp, like tumblr's"
+    return calendar.timegm(date.timetuple())
+
+
+def fetch_all_posts(blog, workers=FETCH_WORKERS):
+    """
+    Fetch every quote post on a blog, fetching pages concurrently.
+    """
+    first = tumblr.posts(blog, type='quote', limit=PAGE_SIZE)
+    offsets = range(PAGE_SIZE, first['total_posts'], PAGE_SIZE)
+
+    pool = ThreadPool(workers)
+    try:
+        pages = pool.map(fetch_page_for(blog), offsets)
+    finally:
+        pool.close()
+
+    # offsets shift if something is posted mid-backfill, so dedupe
+    posts = dict((p['id'], p) for p in first['posts'])
+    for page in pages:
+        posts.update((p['id'], p) for p in page)
+
+    return posts.values()
+
+
+def fetch_page(blog, offset, client=None):
+    """
+    Get one page of quote posts. Each thread needs its own client,
+    since the underlying HTTP connection isn't thread-safe.
+    """
+    client = client or TumblrRestClient(TUMBLR_API_KEY)
+    return client.posts(blog, type='quote', limit=PAGE_SIZE, offset=offset)['posts']
+
+
+def fetch_page_for(blog):
+    "Bind fetch_page to a blog, for pool.map"
+    return lambda offset: fetch_page(blog, offset)
+
+
+def ingest_posts(posts, workers=CALAIS_WORKERS, resolver=None):
+    """
+    Create quotes (and speakers) from a list of tumblr posts,
+    analyzing speakers `workers` at a time. Quotes go in in one
+    transaction, with their rollup counts written together at the end.
+    Speakers are matched with `resolver`, a PersonResolver, which
+    callers ingesting several batches should build once and pass in.
+    Returns the number of quotes created.
+    """
     default_user = get_default_user()
+    posts = new_posts(posts)
+    speakers = get_speakers(posts, workers)
+
+    if resolver is None:
+        resolver = PersonResolver()
+    speaker_ids = resolver.resolve_many(filter(bool, speakers))
+
+    with transaction.atomic(), rollups.deferred():
+        for post, speaker in zip(posts, speakers):
+            fields = {
+                'datetime': datetime.datetime.utcfromtimestamp(post['timestamp']).replace(tzinfo=utc),
+                'added_by': default_user,
+                'context': post['source'],
+                'source_url': post['source_url'],
+                'source_title': post['source_title'],
+            }
+
+            fields['speaker_id'] = speaker_ids.get(speaker)
 
-    for post in quotes['posts']:
-        defaults = {
-            'datetime': datetime.datetime.utcfromtimestamp(post['timestamp']).replace(tzinfo=utc),
-            'added_by': default_user,
-            'context': post['source'],
-            'source_url': post['source_url'],
-            'source_title': post['source_title'],
-        }
+            quote = Quote.objects.create(text=post['text'].strip(), **fields)
+            log_created(quote, True)
 
-        speaker = get_speaker(post)
-        if speaker:
-            speaker, created = Person.objects.get_or_create(name=speaker)
-            log_created(speaker, created)
+    return len(posts)
 
-        defaults['speaker'] = speaker
 
-        # uniqueness based on text
-        # todo find a better way
-        quote, created = Quote.objects.get_or_create(
-            text=post['text'].strip(), defaults=defaults)
+def new_posts(posts):
+    """
+    Drop posts whose quotes we already have, or that repeat an earlier
+    post in the list. Uniqueness is based on a fingerprint of normalized
+    text, checked for the whole list in one query.
+    """
+    fingerprints = [fingerprint(post['text']) for post in posts]
+    seen = Quote.objects.existing_fingerprints(fingerprints)
+
+    result = []
+    for fp, post in zip(fingerprints, posts):
+        if fp not in seen:
+            seen.add(fp)
+            result.append(post)
 
-        log_created(quote, created)
+    return result
 
 
 def get_default_user():
@@ -65,18 +245,83 @@ def get_default_user():
     return User.objects.get(username=settings.DEFAULT_USER)
 
 
+class CacheStats(object):
+    """
+    Thread-safe hit/miss counters for a cache.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def __repr__(self):
+        return '<CacheStats: %i hits, %i misses>' % (self.hits, self.misses)
+
+    def reset(self):
+        self.hits = self.misses = 0
+
+    def record(self, hits=0, misses=0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+
+speaker_stats = CacheStats()
+
+
 def get_speaker(quote):
     """
     Get the most relevant person from a Calais response
     """
-    resp = calais.analyze(quote['source'])
-    people = [e for e in resp.entities if e['_type'] == 'Person']
-    
+    return get_speakers([quote])[0]
+
+
+def get_speakers(posts, workers=CALAIS_WORKERS):
+    """
+    Get speakers for a list of posts, in order.
+
+    Results are cached by a hash of post['source'], so unchanged text
+    never goes back to Calais. Misses are analyzed `workers` at a time.
+    Hits and misses are counted in speaker_stats.
+    """
+    keys = [speaker_key(post['source']) for post in posts]
+    found = speaker_cache.get_many(keys)
+
+    misses = dict((key, post['source']) for key, post in zip(keys, posts)
+        if key not in found)
+    speaker_stats.record(hits=len(keys) - len(misses), misses=len(misses))
+
+    if misses:
+        pool = ThreadPool(min(workers, len(misses)))
+        try:
+            names = pool.map(extract_speaker, misses.values())
+        finally:
+            pool.close()
+
+        # cache empty results too, as u""
+        results = dict(zip(misses.keys(), (name or u"" for name in names)))
+        speaker_cache.set_many(results)
+        found.update(results)
+
+    return [found[key] or None for key in keys]
+
+
+def extract_speaker(text):
+    """
+    Ask Calais for the most relevant person in some text.
+    """
+    resp = calais.analyze(text)
+    people = [e for e in getattr(resp, 'entities', []) if e['_type'] == 'Person']
+
     if people:
         people.sort(key=lambda p: p['relevance'], reverse=True)
         return people[0]['name']
 
 
+def speaker_key(text):
+    "Cache key for analyzed text"
+    return 'speaker:%s' % hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
 def log_created(obj, created):
     """
     Logs object creation.
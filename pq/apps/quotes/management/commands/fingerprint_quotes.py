@@ -0,0 +1,46 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from pq.apps.quotes.models import Quote
+from pq.apps.quotes.text import fingerprint
+from pq.utils import batched
+
+
+class Command(BaseCommand):
+    help = "Compute fingerprints for quotes that don't have one."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=1000,
+            help="Quotes to update per transaction"),
+        make_option('--all', action='store_true', default=False,
+            help="Recompute every fingerprint, not just missing ones"),
+    )
+
+    def handle(self, *args, **options):
+        quotes = Quote.objects.order_by('pk')
+        if not options['all']:
+            quotes = quotes.filter(fingerprint__isnull=True)
+
+        rows = quotes.values_list('pk', 'text').iterator()
+        updated = duplicates = 0
+
+        for batch in batched(rows, options['batch_size']):
+            prints = dict((pk, fingerprint(text)) for pk, text in batch)
+            taken = dict(Quote.objects.filter(fingerprint__in=prints.values())
+                .values_list('fingerprint', 'pk'))
+
+            with transaction.atomic():
+                for pk, fp in sorted(prints.items()):
+                    if taken.get(fp, pk) != pk:
+                        # leave duplicates unfingerprinted for an editor to merge
+                        self.stderr.write('Quote %i duplicates quote %i' % (pk, taken[fp]))
+                        duplicates += 1
+                        continue
+
+                    Quote.objects.filter(pk=pk).update(fingerprint=fp)
+                    taken[fp] = pk
+                    updated += 1
+
+        self.stdout.write('Fingerprinted %i quotes, %i duplicates' % (updated, duplicates))
@@ -0,0 +1,24 @@
+from optparse import make_option
+
+from pq.apps.quotes import load
+from pq.utils.commands import LoaderCommand, workers_option
+
+
+class Command(LoaderCommand):
+    help = "Sync quotes from Tumblr, picking up from the last sync."
+    label = 'posts'
+    batch_size = 100
+
+    option_list = LoaderCommand.option_list + (
+        workers_option(load.FETCH_WORKERS),
+        make_option('--blog', default=load.TUMBLR_BLOG,
+            help="Tumblr blog to sync"),
+        make_option('--backfill', action='store_true', default=False,
+            help="Fetch every page of the blog, not just new posts"),
+    )
+
+    def load(self, progress, **options):
+        load.tumblr_sync(options['blog'], backfill=options['backfill'],
+            workers=options['workers'], batch_size=options['batch_size'],
+            since=options['since'], limit=options['limit'],
+            dry_run=options['dry_run'], progress=progress)
@@ -0,0 +1,32 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from pq.apps.quotes.dedupe import THRESHOLD, duplicate_report, rebuild_index
+from pq.apps.quotes.models import Quote
+
+
+class Command(BaseCommand):
+    help = "Report groups of likely near-duplicate quotes."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rebuild', action='store_true', default=False,
+            help="Rebuild the near-duplicate index first"),
+        make_option('--threshold', type='float', default=THRESHOLD,
+            help="Minimum shingle similarity, 0 to 1"),
+    )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rebuild_index()
+            self.stdout.write('Indexed %i quotes' % count)
+
+        groups = duplicate_report(options['threshold'])
+        quotes = Quote.objects.in_bulk([pk for group in groups for pk in group])
+
+        for group in groups:
+            self.stdout.write('')
+            for pk in group:
+                self.stdout.write(u'%i: %s' % (pk, quotes[pk].text[:100]))
+
+        self.stdout.write('\n%i groups of likely duplicates' % len(groups))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from pq.apps.quotes import rollups
+from pq.apps.quotes.models import DailyRollup, Rollup
+
+
+class Command(BaseCommand):
+    help = "Recount quote rollups for speakers, parties, topics and storylines."
+
+    def handle(self, *args, **options):
+        rollups.rebuild()
+        self.stdout.write('Rebuilt %i rollups, %i daily' % (
+            Rollup.objects.count(), DailyRollup.objects.count()))
@@ -0,0 +1,20 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from pq.utils import replay
+
+
+class Command(BaseCommand):
+    help = "Re-record loader fixtures for offline tests and benchmarks."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--members', type='int', default=5,
+            help="Members to keep from each congress-legislators file"),
+        make_option('--posts', type='int', default=20,
+            help="Tumblr posts to record, up to one page"),
+    )
+
+    def handle(self, *args, **options):
+        replay.record(options['members'], options['posts'])
+        self.stdout.write('Recorded fixtures in %s' % replay.FIXTURE_DIR)
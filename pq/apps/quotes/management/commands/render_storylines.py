@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from pq.apps.quotes import renders
+
+
+class Command(BaseCommand):
+    args = '[storyline_id ...]'
+    help = "Rebuild cached storyline payloads, for all storylines or the ones given."
+
+    def handle(self, *args, **options):
+        pks = [int(pk) for pk in args] or None
+        payloads = renders.rebuild(pks)
+        self.stdout.write('Rendered %i storylines' % len(payloads))
@@ -0,0 +1,28 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from pq.apps.quotes import storyline_topics
+
+
+class Command(BaseCommand):
+    args = '[storyline_id ...]'
+    help = "Check Storyline.topics counts against quote topics, and fix drift."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--verify', action='store_true', default=False,
+            help="Only report drift, don't fix it"),
+    )
+
+    def handle(self, *args, **options):
+        pks = [int(pk) for pk in args] or None
+
+        if options['verify']:
+            drift = storyline_topics.verify(pks)
+            for (storyline_id, topic_id), (stored, expected) in sorted(drift.items()):
+                self.stdout.write('storyline %i, topic %i: %i stored, %i expected' % (
+                    storyline_id, topic_id, stored, expected))
+            self.stdout.write('%i counts out of sync' % len(drift))
+        else:
+            fixed = storyline_topics.rebuild(pks)
+            self.stdout.write('Fixed %i counts' % fixed)
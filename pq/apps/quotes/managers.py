@@ -0,0 +1,83 @@
+from django.db import connection
+from django.db.models.query import QuerySet
+from model_utils.managers import PassThroughManager
+
+from pq.utils.queries import EstimatedCountMixin
+
+
+SEARCH_CONFIG = 'english'
+
+# StartSel/StopSel wrap matches in highlighted snippets
+HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10'
+
+
+def tsquery_function(phrase=False):
+    """
+    phraseto_tsquery is new in PostgreSQL 9.6. Older servers get
+    plainto_tsquery, matching the words in any order.
+    """
+    if phrase and connection.pg_version >= 90600:
+        return 'phraseto_tsquery'
+    return 'plainto_tsquery'
+
+
+class QuoteQuerySet(EstimatedCountMixin, QuerySet):
+
+    def search(self, query, phrase=False):
+        """
+        Ranked full-text search over text, tease, context, source_title
+        and speaker name, using the GIN-indexed search_vector column
+        (see migrations/0005_quote_search.py). Adds a `rank` attribute,
+        best first. With phrase=True, words must appear together, in order
+        (on PostgreSQL 9.6 and later, see tsquery_function).
+        """
+        vector = '"%s"."search_vector"' % self.model._meta.db_table
+        tsquery = "%s('%s', %%s)" % (tsquery_function(phrase), SEARCH_CONFIG)
+
+        return self.extra(
+            select={'rank': 'ts_rank(%s, %s)' % (vector, tsquery)},
+            select_params=[query],
+            where=['%s @@ %s' % (vector, tsquery)],
+            params=[query],
+            order_by=['-rank'])
+
+    def headlines(self, query, pks, phrase=False):
+        """
+        Highlighted snippets of quote text for a search, as a dict by pk.
+        Only run this for the page being shown: ts_headline is slow.
+        """
+        pks = list(pks)
+        if not pks:
+            return {}
+
+        tsquery = "%s('%s', %%s)" % (tsquery_function(phrase), SEARCH_CONFIG)
+
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT id, ts_headline('{0}', text, {1}, %s) FROM {2} WHERE id = ANY(%s)".format(
+                SEARCH_CONFIG, tsquery, self.model._meta.db_table),
+            [query, HEADLINE_OPTIONS, pks])
+
+        return dict(cursor.fetchall())
+
+    def existing_fingerprints(self, fingerprints):
+        """
+        Which of these fingerprints are already stored? One query,
+        however many fingerprints. Returns a set.
+        """
+        fingerprints = set(fingerprints)
+        if not fingerprints:
+            return set()
+
+        return set(self.filter(fingerprint__in=fingerprints)
+            .values_list('fingerprint', flat=True))
+
+
+QuoteManager = PassThroughManager.for_queryset_class(QuoteQuerySet)
+
+
+class StorylineQuerySet(EstimatedCountMixin, QuerySet):
+    pass
+
+
+StorylineManager = PassThroughManager.for_queryset_class(StorylineQuerySet)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    depends_on = (
+        ('people', '0001_initial'),
+    )
+
+    def forwards(self, orm):
+        # Adding model 'Topic'
+        db.create_table(u'quotes_topic', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('created', self.gf('model_utils.fields.AutoCreatedField')(default=datetime.datetime.now)),
+            ('modified', self.gf('model_utils.fields.AutoLastModifiedField')(default=datetime.datetime.now)),
+            ('name', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('slug', self.gf('django.db.models.fields.SlugField')(unique=True, max_length=50)),
+            ('description', self.gf('django.db.models.fields.TextField')(blank=True)),
+        ))
+        db.send_create_signal(u'quotes', ['Topic'])
+
+        # Adding model 'Quote'
+        db.create_table(u'quotes_quote', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('created', self.gf('model_utils.fields.AutoCreatedField')(default=datetime.datetime.now)),
+            ('modified', self.gf('model_utils.fields.AutoLastModifiedField')(default=datetime.datetime.now)),
+            ('added_by', self.gf('django.db.models.fields.related.ForeignKey')(related_name='quotes', to=orm['auth.User'])),
+            ('datetime', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('speaker', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='quotes', null=True, to=orm['people.Person'])),
+            ('tease', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('text', self.gf('django.db.models.fields.TextField')()),
+            ('context', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('source_url', self.gf('django.db.models.fields.URLField')(max_length=200)),
+            ('source_title', self.gf('django.db.models.fields.CharField')(max_length=500, blank=True)),
+        ))
+        db.send_create_signal(u'quotes', ['Quote'])
+
+        # Adding M2M table for field mentions on 'Quote'
+        m2m_table_name = db.shorten_name(u'quotes_quote_mentions')
+        db.create_table(m2m_table_name, (
+            ('id', models.AutoField(verbose_name='ID', primary_key=True, auto_created=True)),
+            ('quote', models.ForeignKey(orm[u'quotes.quote'], null=False)),
+            ('person', models.ForeignKey(orm[u'people.person'], null=False))
+        ))
+        db.create_unique(m2m_table_name, ['quote_id', 'person_id'])
+
+        # Adding M2M table for field topics on 'Quote'
+        m2m_table_name = db.shorten_name(u'quotes_quote_topics')
+        db.create_table(m2m_table_name, (
+            ('id', models.AutoField(verbose_name='ID', primary_key=True, auto_created=True)),
+            ('quote', models.ForeignKey(orm[u'quotes.quote'], null=False)),
+            ('topic', models.ForeignKey(orm[u'quotes.topic'], null=False))
+        ))
+        db.create_unique(m2m_table_name, ['quote_id', 'topic_id'])
+
+        # Adding model 'Storyline'
+        db.create_table(u'quotes_storyline', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('created', self.gf('model_utils.fields.AutoCreatedField')(default=datetime.datetime.now)),
+            ('modified', self.gf('model_utils.fields.AutoLastModifiedField')(default=datetime.datetime.now)),
+            ('author', self.gf('django.db.models.fields.related.ForeignKey')(related_name='storylines', to=orm['auth.User'])),
+            ('title', self.gf('django.db.models.fields.CharField')(max_length=500)),
+            ('slug', self.gf('django.db.models.fields.SlugField')(max_length=50)),
+            ('datetime', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('text', self.gf('django.db.models.fields.TextField')(blank=True)),
+        ))
+        db.send_create_signal(u'quotes', ['Storyline'])
+
+        # Adding M2M table for field topics on 'Storyline'
+        m2m_table_name = db.shorten_name(u'quotes_storyline_topics')
+        db.create_table(m2m_table_name, (
+            ('id', models.AutoField(verbose_name='ID', primary_key=True, auto_created=True)),
+            ('storyline', models.ForeignKey(orm[u'quotes.storyline'], null=False)),
+            ('topic', models.ForeignKey(orm[u'quotes.topic'], null=False))
+        ))
+        db.create_unique(m2m_table_name, ['storyline_id', 'topic_id'])
+
+        # Adding model 'StorylineQuote'
+        db.create_table(u'quotes_storylinequote', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('quote', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['quotes.Quote'])),
+            ('storyline', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['quotes.Storyline'])),
+            ('order', self.gf('django.db.models.fields.IntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'quotes', ['StorylineQuote'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'Topic'
+        db.delete_table(u'quotes_topic')
+
+        # Deleting model 'Quote'
+        db.delete_table(u'quotes_quote')
+
+        # Removing M2M table for field mentions on 'Quote'
+        db.delete_table(db.shorten_name(u'quotes_quote_mentions'))
+
+        # Removing M2M table for field topics on 'Quote'
+        db.delete_table(db.shorten_name(u'quotes_quote_topics'))
+
+        # Deleting model 'Storyline'
+        db.delete_table(u'quotes_storyline')
+
+        # Removing M2M table for field topics on 'Storyline'
+        db.delete_table(db.shorten_name(u'quotes_storyline_topics'))
+
+        # Deleting model 'StorylineQuote'
+        db.delete_table(u'quotes_storylinequote')
+
+
+    models = {
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Group']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Permission']"}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'people.person': {
+            'Meta': {'ordering': "('last', 'first')", 'object_name': 'Person'},
+            'bio': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'display': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'first': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'gender': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'links': (u'django_hstore.fields.DictionaryField', [], {'null': 'True', 'blank': 'True'}),
+            'middle': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'nickname': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'party': ('django.db.models.fields.CharField', [], {'max_length': '50', 'blank': 'True'}),
+            'public': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '50'}),
+            'suffix': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'})
+        },
+        u'quotes.quote': {
+            'Meta': {'ordering': "('-datetime',)", 'object_name': 'Quote'},
+            'added_by': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'quotes'", 'to': u"orm['auth.User']"}),
+            'context': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'datetime': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'mentions': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'mentions'", 'null': 'True', 'symmetrical': 'False', 'to': u"orm['people.Person']"}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'source_title': ('django.db.models.fields.CharField', [], {'max_length': '500', 'blank': 'True'}),
+            'source_url': ('django.db.models.fields.URLField', [], {'max_length': '200'}),
+            'speaker': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'quotes'", 'null': 'True', 'to': u"orm['people.Person']"}),
+            'tease': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'text': ('django.db.models.fields.TextField', [], {}),
+            'topics': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'quotes'", 'null': 'True', 'symmetrical': 'False', 'to': u"orm['quotes.Topic']"})
+        },
+        u'quotes.storyline': {
+            'Meta': {'ordering': "('-datetime',)", 'object_name': 'Storyline'},
+            'author': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'storylines'", 'to': u"orm['auth.User']"}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'datetime': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'quotes': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'storylines'", 'to': u"orm['quotes.Quote']", 'through': u"orm['quotes.StorylineQuote']", 'blank': 'True', 'symmetrical': 'False', 'null': 'True'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'max_length': '50'}),
+            'text': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '500'}),
+            'topics': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'storylines'", 'null': 'True', 'symmetrical': 'False', 'to': u"orm['quotes.Topic']"})
+        },
+        u'quotes.storylinequote': {
+            'Meta': {'ordering': "('order', 'quote')", 'object_name': 'StorylineQuote'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'order': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'quote': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['quotes.Quote']"}),
+            'storyline': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['quotes.Storyline']"})
+        },
+        u'quotes.topic': {
+            'Meta': {'ordering': "('name',)", 'object_name': 'Topic'},
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '50'})
+        }
+    }
+
+    complete_apps = ['quotes']
\ No newline at end of file
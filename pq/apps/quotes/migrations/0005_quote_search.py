@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+# search_vector from a quote and its speaker's name, see QuoteQuerySet.search
+QUOTE_VECTOR = """
+CREATE OR REPLACE FUNCTION quotes_quote_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.text, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce((
+            SELECT concat_ws(' ', p.first, p.middle, p.last, p.nickname, p.display_name)
+            FROM people_person p WHERE p.id = NEW.speaker_id), '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.tease, '')), 'B') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.context, '')), 'C') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.source_title, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# reindex a speaker's quotes when their name changes, see NAME_CHANGED
+SPEAKER_VECTOR = """
+CREATE OR REPLACE FUNCTION quotes_speaker_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE quotes_quote SET speaker_id = speaker_id WHERE speaker_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# every Person.save updates these columns, changed or not
+NAME_COLUMNS = ('first', 'middle', 'last', 'nickname', 'display_name')
+NAME_CHANGED = ' OR '.join('OLD.{0} IS DISTINCT FROM NEW.{0}'.format(c) for c in NAME_COLUMNS)
+
+
+class Migration(SchemaMigration):
+    """
+    Full-text search for quotes. search_vector is kept current by
+    triggers, so saves, bulk_create and raw loads are all indexed.
+    It isn't a model field.
+
+    Phrase searches use phraseto_tsquery, from PostgreSQL 9.6; older
+    servers fall back to matching the words in any order.
+    """
+
+    # speaker names are indexed as rendered, see people.names
+    depends_on = (
+        ('people', '0008_render_person_names'),
+    )
+
+    def forwards(self, orm):
+        db.execute("ALTER TABLE quotes_quote ADD COLUMN search_vector tsvector")
+        db.execute("CREATE INDEX quotes_quote_search_vector "
+                   "ON quotes_quote USING gin (search_vector)")
+
+        db.execute(QUOTE_VECTOR)
+        db.execute("CREATE TRIGGER quotes_quote_search_vector BEFORE INSERT OR UPDATE "
+                   "OF text, tease, context, source_title, speaker_id ON quotes_quote "
+                   "FOR EACH ROW EXECUTE PROCEDURE quotes_quote_search_vector()")
+
+        db.execute(SPEAKER_VECTOR)
+        db.execute("CREATE TRIGGER quotes_speaker_search_vector AFTER UPDATE "
+                   "OF {0} ON people_person FOR EACH ROW WHEN ({1}) "
+                   "EXECUTE PROCEDURE quotes_speaker_search_vector()".format(
+                       ', '.join(NAME_COLUMNS), NAME_CHANGED))
+
+        # index quotes already there
+        db.execute("UPDATE quotes_quote SET speaker_id = speaker_id")
+
+    def backwards(self, orm):
+        db.execute("DROP TRIGGER quotes_speaker_search_vector ON people_person")
+        db.execute("DROP FUNCTION quotes_speaker_search_vector()")
+        db.execute("DROP TRIGGER quotes_quote_search_vector ON quotes_quote")
+        db.execute("DROP FUNCTION quotes_quote_search_vector()")
+        db.execute("ALTER TABLE quotes_quote DROP COLUMN search_vector")
+
+    models = {
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Group']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Permission']"}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'people.person': {
+            'Meta': {'ordering': "('last', 'first')", 'object_name': 'Person', 'index_together': "[('last', 'first', 'id')]"},
+            'bio': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'display': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'first': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'gender': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'links': (u'django_hstore.fields.DictionaryField', [], {'null': 'True', 'blank': 'True'}),
+            'middle': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'nickname': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'party': ('django.db.models.fields.CharField', [], {'max_length': '50', 'blank': 'True'}),
+            'public': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '50'}),
+            'suffix': ('django.db.models.fields.CharField', [], {'max_length': '10', 'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'})
+        },
+        u'quotes.quote': {
+            'Meta': {'ordering': "('-datetime',)", 'object_name': 'Quote', 'index_together': "[('datetime', 'id')]"},
+            'added_by': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'quotes'", 'to': u"orm['auth.User']"}),
+            'context': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'datetime': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'fingerprint': ('django.db.models.fields.CharField', [], {'max_length': '40', 'unique': 'True', 'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'mentions': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'mentions'", 'null': 'True', 'symmetrical': 'False', 'to': u"orm['people.Person']"}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'source_title': ('django.db.models.fields.CharField', [], {'max_length': '500', 'blank': 'True'}),
+            'source_url': ('django.db.models.fields.URLField', [], {'max_length': '200'}),
+            'speaker': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'quotes'", 'null': 'True', 'to': u"orm['people.Person']"}),
+            'tease': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'text': ('django.db.models.fields.TextField', [], {}),
+            'topics': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'quotes'", 'null': 'True', 'symmetrical': 'False', 'to': u"orm['quotes.Topic']"})
+        },
+        u'quotes.quotebucket': {
+            'Meta': {'object_name': 'QuoteBucket', 'index_together': "[('band', 'bucket')]"},
+            'band': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'bucket': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'quote': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'buckets'", 'to': u"orm['quotes.Quote']"})
+        },
+        u'quotes.storyline': {
+            'Meta': {'ordering': "('-datetime',)", 'object_name': 'Storyline', 'index_together': "[('datetime', 'id')]"},
+            'author': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'storylines'", 'to': u"orm['auth.User']"}),
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'datetime': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'quotes': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'storylines'", 'to': u"orm['quotes.Quote']", 'through': u"orm['quotes.StorylineQuote']", 'blank': 'True', 'symmetrical': 'False', 'null': 'True'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'max_length': '50'}),
+            'text': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '500'}),
+            'topics': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'storylines'", 'null': 'True', 'symmetrical': 'False', 'to': u"orm['quotes.Topic']"})
+        },
+        u'quotes.storylinequote': {
+            'Meta': {'ordering': "('order', 'quote')", 'object_name': 'StorylineQuote'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'order': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'quote': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['quotes.Quote']"}),
+            'storyline': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['quotes.Storyline']"})
+        },
+        u'quotes.topic': {
+            'Meta': {'ordering': "('name',)", 'object_name': 'Topic'},
+            'created': ('model_utils.fields.AutoCreatedField', [], {'default': 'datetime.datetime.now'}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('model_utils.fields.AutoLastModifiedField', [], {'default': 'datetime.datetime.now'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '50'})
+        }
+    }
+
+    complete_apps = ['quotes']
\ No newline at end of file
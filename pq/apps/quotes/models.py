@@ -1,12 +1,17 @@
 import datetime
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 
 from model_utils import Choices
 from model_utils.models import TimeStampedModel
 
 from pq.apps.people.models import Person
+from pq.utils.slugs import unique_slug
+from .managers import QuoteManager, StorylineManager
+from .text import fingerprint
 
 
 class Topic(TimeStampedModel):
@@ -29,7 +34,8 @@ class Topic(TimeStampedModel):
         super(Topic, self).save(*args, **kwargs)
 
     def slugify(self):
-        return slugify(self.name)
+        "Make a slug, ensuring no dupes."
+        return unique_slug(Topic, self.name)
 
 
 class Quote(TimeStampedModel):
@@ -69,6 +75,10 @@ class Quote(TimeStampedModel):
     text = models.TextField(
         help_text="The quote itself, with no attribution or surrounding quote marks.")
 
+    # hash of normalized text, for deduplication
+    fingerprint = models.CharField(max_length=40, unique=True,
+        blank=True, null=True, editable=False)
+
     context = models.TextField(blank=True,
         help_text="Optional: A few words about this quote, if needed.")
 
@@ -79,17 +89,78 @@ class Quote(TimeStampedModel):
     topics = models.ManyToManyField(Topic, related_name='quotes',
         blank=True, null=True)
 
+    objects = QuoteManager()
+
     class Meta:
         # reverse chron
         get_latest_by = "datetime"
         ordering = ('-datetime',)
+        index_together = [('datetime', 'id')]
 
     def __unicode__(self):
         if self.speaker:
-            return u"{0}: {1}".format(self.speaker.name, self.text)
+            return u"{0}: {1}".format(self.speaker.display_name, self.text)
         else:
             return self.text
 
+    def __init__(self, *args, **kwargs):
+        super(Quote, self).__init__(*args, **kwargs)
+        self._saved_bucket = self.rollup_bucket()
+
+    def clean(self):
+        "Catch duplicate text before the unique fingerprint does."
+        if self.pk and self.fingerprint is None:
+            return # a known duplicate, see save()
+
+        duplicate = self.duplicate_of(fingerprint(self.text))
+        if duplicate:
+            raise ValidationError(u"This quote duplicates quote %i." % duplicate)
+
+    def save(self, *args, **kwargs):
+        """
+        Fingerprint text before saving. Duplicates that fingerprint_quotes
+        left without a fingerprint keep saving without one until merged.
+        """
+        fp = fingerprint(self.text)
+        if self.pk and self.fingerprint is None and self.duplicate_of(fp):
+            fp = None
+
+        self.fingerprint = fp
+        super(Quote, self).save(*args, **kwargs)
+        self._saved_bucket = self.rollup_bucket()
+
+    def duplicate_of(self, fp):
+        "The pk of another quote with this fingerprint, or None"
+        return Quote.objects.filter(fingerprint=fp).exclude(pk=self.pk) \
+            .values_list('pk', flat=True).first()
+
+    def rollup_bucket(self):
+        """
+        (speaker_id, day) this quote is counted under in rollups,
+        read without loading deferred fields.
+        """
+        dt = self.__dict__.get('datetime')
+        if dt is None:
+            return (self.__dict__.get('speaker_id'), None)
+
+        # days are UTC, as the database sees them
+        if timezone.is_naive(dt):
+            dt = timezone.make_aware(dt, timezone.get_default_timezone())
+        return (self.__dict__.get('speaker_id'), dt.astimezone(timezone.utc).date())
+
+
+class QuoteBucket(models.Model):
+    """
+    An LSH bucket for a quote, used to find near-duplicates.
+    See pq.apps.quotes.dedupe.
+    """
+    quote = models.ForeignKey(Quote, related_name='buckets')
+    band = models.SmallIntegerField()
+    bucket = models.CharField(max_length=16)
+
+    class Meta:
+        index_together = [('band', 'bucket')]
+
 
 class Storyline(TimeStampedModel):
     """
@@ -112,9 +183,15 @@ class Storyline(TimeStampedModel):
         ('private', 'Private') # visible only with a link
     )
 
+    # published storylines are listed; private ones are served by pk only
+    VISIBLE = (STATUS.published, STATUS.private)
+
     author = models.ForeignKey(settings.AUTH_USER_MODEL, 
         related_name='storylines')
 
+    status = models.CharField(max_length=20, choices=STATUS,
+        default=STATUS.draft, db_index=True)
+
     title = models.CharField(max_length=500)
     slug = models.SlugField(db_index=True)
     datetime = models.DateTimeField(default=datetime.datetime.now)
@@ -126,17 +203,21 @@ class Storyline(TimeStampedModel):
         through='StorylineQuote',
         blank=True, null=True) # so we can save before adding quotes
 
-    # topics, should be union of quote topics
-    # can we do this without creating another table?
+    # topics, the union of quote topics, maintained by
+    # reference counts in StorylineTopic (see storyline_topics.py)
     topics = models.ManyToManyField(Topic, related_name='storylines',
+        through='StorylineTopic',
         blank=True, null=True)
 
     # todo photos
 
+    objects = StorylineManager()
+
     class Meta:
         # reverse chron by default
         get_latest_by = "datetime"
         ordering = ('-datetime',)
+        index_together = [('datetime', 'id')]
 
     def __unicode__(self):
         return self.title
@@ -144,7 +225,7 @@ class Storyline(TimeStampedModel):
     def save(self, *args, **kwargs):
         "Make a slug before saving"
         if not self.slug:
-            self.slug = slugify(self.title)
+            self.slug = slugify(unicode(self.title))
         super(Storyline, self).save(*args, **kwargs)
 
 
@@ -159,4 +240,77 @@ class StorylineQuote(models.Model):
     class Meta:
         ordering = ('order', 'quote')
 
-    
\ No newline at end of file
+    def __init__(self, *args, **kwargs):
+        super(StorylineQuote, self).__init__(*args, **kwargs)
+
+        # the row as stored; new links aren't, whatever they were given
+        self._saved_link = self.link() if self.pk else (None, None)
+
+    def save(self, *args, **kwargs):
+        super(StorylineQuote, self).save(*args, **kwargs)
+        self._saved_link = self.link()
+
+    def link(self):
+        "(storyline_id, quote_id), read without loading deferred fields"
+        return (self.__dict__.get('storyline_id'), self.__dict__.get('quote_id'))
+
+
+class StorylineTopic(models.Model):
+    """
+    A through-model for Storyline.topics, counting how many of the
+    storyline's quotes have each topic. Rows are removed at zero.
+    """
+    storyline = models.ForeignKey(Storyline)
+    topic = models.ForeignKey(Topic)
+    quote_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('storyline', 'topic')]
+
+
+class Rollup(models.Model):
+    """
+    An all-time quote count for one key, like a speaker's pk or a party.
+    Maintained incrementally, see rollups.py.
+    """
+    KINDS = Choices(
+        ('quotes', 'All quotes'),
+        ('speaker', 'Speaker'),
+        ('party', 'Party'),
+        ('topic', 'Topic'),
+        ('mention', 'Mention'),
+        ('storyline', 'Storyline'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    key = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('kind', 'key')]
+        index_together = [('kind', 'count')]
+
+    def __unicode__(self):
+        return u"%s %s: %i" % (self.kind, self.key, self.count)
+
+
+class DailyRollup(models.Model):
+    """
+    A quote count for one key on one day, for sparklines and
+    "this week" leaderboards.
+    """
+    kind = models.CharField(max_length=20, choices=Rollup.KINDS)
+    key = models.CharField(max_length=100)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('kind', 'key', 'day')]
+        index_together = [('kind', 'day')]
+
+    def __unicode__(self):
+        return u"%s %s on %s: %i" % (self.kind, self.key, self.day, self.count)
+
+
+# connect signal handlers
+from . import signals
@@ -0,0 +1,143 @@
+"""
+Precomputed storyline payloads.
+
+A payload is everything needed to render a storyline: its fields and
+its quotes in order, each with speaker display name, thumbnail URL and
+topics. Payloads are built in one batched pass and cached until
+a signal handler invalidates them (see signals.py), so reading a
+published storyline is one cache hit.
+"""
+from collections import defaultdict
+
+from django.core.cache import get_cache
+from django.utils import timezone
+
+from .models import Quote, Storyline, StorylineQuote
+
+# bump when the payload format changes, to orphan old payloads
+RENDER_VERSION = 2
+
+# a day, as a backstop for anything invalidation misses
+TIMEOUT = 60 * 60 * 24
+
+# shared, so payloads warmed or invalidated anywhere hold everywhere
+cache = get_cache('shared')
+
+
+def payload_key(pk):
+    return 'storyline-render:%i:v%i' % (pk, RENDER_VERSION)
+
+
+def get_payload(pk):
+    """
+    A storyline's payload, built and cached if it's missing.
+    Returns None for storylines that don't exist.
+    """
+    return get_payloads([pk]).get(pk)
+
+
+def get_payloads(pks):
+    """
+    Payloads for many storylines, as a dict by pk. Cache misses
+    are built together, in one pass.
+    """
+    pks = list(pks)
+    found = cache.get_many([payload_key(pk) for pk in pks])
+    result = dict((pk, found[payload_key(pk)]) for pk in pks if payload_key(pk) in found)
+
+    missing = [pk for pk in pks if pk not in result]
+    if missing:
+        result.update(rebuild(missing))
+
+    return result
+
+
+def rebuild(pks=None):
+    """
+    Build and cache payloads for storylines (all of them by default).
+    Four queries, however many storylines and quotes.
+    """
+    storylines = Storyline.objects.select_related('author')
+    if pks is not None:
+        storylines = storylines.filter(pk__in=pks)
+    storylines = dict((s.pk, s) for s in storylines)
+
+    rows = (StorylineQuote.objects
+        .filter(storyline__in=storylines.keys())
+        .select_related('quote', 'quote__speaker', 'quote__speaker__photo')
+        .order_by('storyline', 'order', '-quote__datetime'))
+    rows = list(rows)
+
+    quote_topics = defaultdict(list)
+    through = Quote.topics.through.objects.select_related('topic')
+    for row in through.filter(quote__in=set(r.quote_id for r in rows)):
+        quote_topics[row.quote_id].append({'slug': row.topic.slug, 'name': row.topic.name})
+
+    storyline_topics = defaultdict(list)
+    through = Storyline.topics.through.objects.select_related('topic')
+    for row in through.filter(storyline__in=storylines.keys()):
+        storyline_topics[row.storyline_id].append({'slug': row.topic.slug, 'name': row.topic.name})
+
+    built = timezone.now()
+    payloads = {}
+    for pk, storyline in storylines.items():
+        payloads[pk] = {
+            'id': pk,
+            'title': storyline.title,
+            'slug': storyline.slug,
+            'datetime': storyline.datetime,
+            'author': storyline.author.get_username(),
+            'status': storyline.status,
+            'text': storyline.text,
+            'topics': storyline_topics[pk],
+            'quotes': [],
+            'built': built,
+        }
+
+    for row in rows:
+        payloads[row.storyline_id]['quotes'].append(
+            quote_payload(row.quote, row.order, quote_topics[row.quote_id]))
+
+    cache.set_many(dict((payload_key(pk), p) for pk, p in payloads.items()), TIMEOUT)
+    return payloads
+
+
+def quote_payload(quote, order, topics):
+    speaker = None
+    if quote.speaker:
+        photo = quote.speaker.get_photo()
+        speaker = {
+            'id': quote.speaker.pk,
+            'slug': quote.speaker.slug,
+            'name': quote.speaker.display_name,
+            'thumbnail': (photo.thumbnails or {}).get('thumbnail') if photo else None,
+        }
+
+    return {
+        'id': quote.pk,
+        'order': order,
+        'datetime': quote.datetime,
+        'text': quote.text,
+        'tease': quote.tease,
+        'context': quote.context,
+        'source_url': quote.source_url,
+        'source_title': quote.source_title,
+        'speaker': speaker,
+        'topics': topics,
+    }
+
+
+def invalidate(pks):
+    "Drop cached payloads for storylines"
+    pks = set(pks)
+    if pks:
+        cache.delete_many([payload_key(pk) for pk in pks])
+
+
+def storylines_for(**filters):
+    """
+    Storyline pks with quotes matching filters on StorylineQuote,
+    like quote__in=[...] or quote__speaker=pk.
+    """
+    return StorylineQuote.objects.filter(**filters) \
+        .values_list('storyline_id', flat=True).distinct()
@@ -0,0 +1,331 @@
+"""
+Denormalized quote counts, for leaderboards and sparklines.
+
+Counts are kept per speaker, party, topic, mention and storyline
+(plus all quotes), all-time in Rollup and by day of the quote in
+DailyRollup. Signal handlers apply +1/-1 changes as quotes are saved
+and deleted, topics and mentions change and quotes join or leave
+storylines. A party is counted as the speaker's party, and its
+counts move when a speaker changes party. Counts for a deleted topic
+or person are dropped with it. rebuild() recounts everything from
+scratch, to repair counts changed behind the signals' backs, like
+queryset updates to Person.party.
+
+Loaders saving many quotes at once can wrap them in deferred(), so
+changes to the same count are added up and written once, and
+speakers' parties are looked up together on the way out.
+"""
+import datetime
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+
+from pq.apps.people.models import Person
+from .models import DailyRollup, Quote, Rollup, StorylineQuote
+
+# for storylines, which aren't bucketed by day
+NO_DAY = None
+
+# changes held back by deferred(), per thread
+pending = threading.local()
+
+
+def quote_changes(buckets):
+    """
+    Changes for a dict of (speaker_id, day) buckets to deltas:
+    all quotes, speaker and the speaker's party.
+    """
+    speakers = set(speaker_id for speaker_id, day in buckets if speaker_id)
+    parties = dict(Person.objects.filter(pk__in=speakers).values_list('pk', 'party'))
+
+    changes = defaultdict(int)
+    for (speaker_id, day), delta in buckets.items():
+        changes[('quotes', 'all', day)] += delta
+        if speaker_id:
+            changes[('speaker', speaker_id, day)] += delta
+            if parties.get(speaker_id):
+                changes[('party', parties[speaker_id], day)] += delta
+
+    return changes
+
+
+def buckets_changed(buckets):
+    """
+    Count quotes in or out of (speaker_id, day) buckets. Deferred,
+    they're held until parties are looked up on the way out.
+    """
+    held = getattr(pending, 'buckets', None)
+    if held is None:
+        apply(quote_changes(buckets))
+        return
+
+    for bucket, delta in buckets.items():
+        held[bucket] += delta
+
+
+def resolve(speakers=None):
+    """
+    Turn held buckets into changes now, for `speakers` or all
+    of them, before a speaker goes and their party with them.
+    """
+    held = getattr(pending, 'buckets', None)
+    if not held:
+        return
+
+    buckets = dict((bucket, delta) for bucket, delta in held.items()
+        if speakers is None or bucket[0] in speakers)
+    for bucket in buckets:
+        del held[bucket]
+
+    apply(quote_changes(buckets))
+
+
+def quote_saved(quote, old_bucket, created):
+    "Move a quote between buckets, if its speaker or day changed"
+    new_bucket = quote.rollup_bucket()
+    if created:
+        buckets_changed({new_bucket: 1})
+    elif old_bucket != new_bucket:
+        buckets_changed({old_bucket: -1, new_bucket: 1})
+
+        # related counts are bucketed by the quote's day too
+        if old_bucket[1] != new_bucket[1]:
+            related_moved(quote, old_bucket[1], new_bucket[1])
+
+
+def quote_deleted(quote):
+    """
+    Uncount a quote and its topics and mentions, before the
+    rows go (they're removed without m2m signals). The party is
+    looked up now, even deferred, since deleting a speaker deletes
+    their quotes.
+    """
+    day = quote._saved_bucket[1]
+    changes = quote_changes({quote._saved_bucket: -1})
+    for kind, ids in related_ids(quote).items():
+        for pk in ids:
+            changes[(kind, pk, day)] -= 1
+    apply(changes)
+
+
+def related_ids(quote):
+    return {
+        'topic': list(quote.topics.values_list('pk', flat=True)),
+        'mention': list(quote.mentions.values_list('pk', flat=True)),
+    }
+
+
+def related_moved(quote, old_day, new_day):
+    changes = defaultdict(int)
+    for kind, ids in related_ids(quote).items():
+        for pk in ids:
+            changes[(kind, pk, old_day)] -= 1
+            changes[(kind, pk, new_day)] += 1
+    apply(changes)
+
+
+def related_changed(kind, quote_ids, pks, delta):
+    """
+    Topics or mentions were added to or removed from quotes.
+    """
+    days = dict((pk, dt.date()) for pk, dt in
+        Quote.objects.filter(pk__in=quote_ids).values_list('pk', 'datetime'))
+
+    changes = defaultdict(int)
+    for quote_id in quote_ids:
+        for pk in pks:
+            changes[(kind, pk, days.get(quote_id))] += delta
+    apply(changes)
+
+
+def storyline_changed(storyline_id, delta):
+    apply({('storyline', storyline_id, NO_DAY): delta})
+
+
+def parties_changed(people):
+    """
+    Move speakers' daily counts from the party they were saved
+    with to their party now, for people whose party changed.
+    A party that wasn't loaded is None, and taken as unchanged.
+    """
+    moves = dict((person.pk, (person._saved_party, person.party))
+        for person in people if person.pk and person._saved_party is not None
+        and person._saved_party != person.party)
+    if not moves:
+        return
+
+    changes = defaultdict(int)
+    rows = DailyRollup.objects.filter(kind='speaker',
+        key__in=[unicode(pk) for pk in moves]).values_list('key', 'day', 'count')
+    for key, day, count in rows:
+        old, new = moves[int(key)]
+        if old:
+            changes[('party', old, day)] -= count
+        if new:
+            changes[('party', new, day)] += count
+    apply(changes)
+
+
+def forget(kind, key):
+    """
+    Drop all counts for a key that's gone, like a deleted topic,
+    including any held back by deferred().
+    """
+    key = unicode(key)
+    held = getattr(pending, 'changes', None)
+    if held is not None:
+        for change in [c for c in held if c[0] == kind and unicode(c[1]) == key]:
+            del held[change]
+
+    with transaction.atomic():
+        Rollup.objects.filter(kind=kind, key=key).delete()
+        DailyRollup.objects.filter(kind=kind, key=key).delete()
+
+
+@contextmanager
+def deferred():
+    """
+    Hold back changes made inside the block, and apply them together
+    when it exits. Counts lag until then. If the block raises, the
+    changes are dropped, so wrap it in the transaction it writes in.
+    """
+    if getattr(pending, 'changes', None) is not None:
+        # already deferred further out
+        yield
+        return
+
+    pending.changes = defaultdict(int)
+    pending.buckets = defaultdict(int)
+    try:
+        yield
+        resolve()
+        changes = pending.changes
+    finally:
+        pending.changes = pending.buckets = None
+
+    apply(changes)
+
+
+def apply(changes):
+    """
+    Apply a dict of (kind, key, day) to delta, to all-time
+    and daily counts, in one transaction.
+    """
+    held = getattr(pending, 'changes', None)
+    if held is not None:
+        for change, delta in changes.items():
+            held[change] += delta
+        return
+
+    totals, daily = defaultdict(int), defaultdict(int)
+    for (kind, key, day), delta in changes.items():
+        totals[(kind, unicode(key))] += delta
+        if day is not NO_DAY:
+            daily[(kind, unicode(key), day)] += delta
+
+    with transaction.atomic():
+        bump(Rollup, ('kind', 'key'), totals)
+        bump(DailyRollup, ('kind', 'key', 'day'), daily)
+
+
+def bump(model, fields, changes):
+    """
+    Add deltas to counts, creating rows as needed. Updates are atomic
+    in the database, and if another transaction creates a row between
+    our update and insert, the insert fails and we update after all.
+    """
+    for values, delta in changes.items():
+        if not delta:
+            continue
+
+        filters = dict(zip(fields, values))
+        if add(model, filters, delta):
+            continue
+
+        try:
+            # a savepoint, so a failed insert leaves the transaction usable
+            with transaction.atomic():
+                model.objects.create(count=delta, **filters)
+        except IntegrityError:
+            add(model, filters, delta)
+
+
+def add(model, filters, delta):
+    "Returns the number of rows updated"
+    return model.objects.filter(**filters).update(count=F('count') + delta)
+
+
+def leaderboard(kind, limit=10, since=None):
+    """
+    Top keys by count, as (key, count) pairs. With `since`, a date,
+    counts are summed from daily rollups instead of all-time.
+    """
+    if since is None:
+        rows = Rollup.objects.filter(kind=kind, count__gt=0) \
+            .order_by('-count').values_list('key', 'count')
+    else:
+        rows = DailyRollup.objects.filter(kind=kind, day__gte=since) \
+            .values_list('key').annotate(total=Sum('count')) \
+            .filter(total__gt=0).order_by('-total')
+
+    return list(rows[:limit])
+
+
+def sparkline(kind, key, days=30, end=None):
+    """
+    Daily counts for one key, oldest first, zeros included.
+    """
+    end = end or datetime.date.today()
+    start = end - datetime.timedelta(days=days - 1)
+    counts = dict(DailyRollup.objects
+        .filter(kind=kind, key=unicode(key), day__gte=start, day__lte=end)
+        .values_list('day', 'count'))
+
+    return [counts.get(start + datetime.timedelta(days=i), 0) for i in range(days)]
+
+
+def rebuild():
+    """
+    Recount every rollup from scratch with set-based SQL,
+    in one transaction.
+    """
+    tables = {
+        'rollup': Rollup._meta.db_table,
+        'daily': DailyRollup._meta.db_table,
+        'quote': Quote._meta.db_table,
+        'person': Person._meta.db_table,
+        'topics': Quote.topics.through._meta.db_table,
+        'mentions': Quote.mentions.through._meta.db_table,
+        'storyline': StorylineQuote._meta.db_table,
+    }
+
+    # (kind, key expression, FROM/WHERE clause) for every dated count
+    sources = [
+        ("'quotes'", "'all'", "{quote} q"),
+        ("'speaker'", "q.speaker_id::text", "{quote} q WHERE q.speaker_id IS NOT NULL"),
+        ("'party'", "p.party", "{quote} q JOIN {person} p ON p.id = q.speaker_id WHERE p.party <> ''"),
+        ("'topic'", "t.topic_id::text", "{quote} q JOIN {topics} t ON t.quote_id = q.id"),
+        ("'mention'", "m.person_id::text", "{quote} q JOIN {mentions} m ON m.quote_id = q.id"),
+    ]
+
+    statements = ["DELETE FROM {rollup}", "DELETE FROM {daily}"]
+    for kind, key, source in sources:
+        statements.append(
+            "INSERT INTO {daily} (kind, key, day, count) "
+            "SELECT %s, %s, date(q.datetime AT TIME ZONE 'UTC'), count(*) FROM %s "
+            "GROUP BY 2, 3" % (kind, key, source))
+
+    statements.extend([
+        "INSERT INTO {rollup} (kind, key, count) "
+        "SELECT kind, key, sum(count) FROM {daily} GROUP BY kind, key",
+        "INSERT INTO {rollup} (kind, key, count) "
+        "SELECT 'storyline', storyline_id::text, count(*) FROM {storyline} GROUP BY 1, 2",
+    ])
+
+    with transaction.atomic():
+        cursor = connection.cursor()
+        for statement in statements:
+            cursor.execute(statement.format(**tables))
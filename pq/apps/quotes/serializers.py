@@ -0,0 +1,48 @@
+"""
+Plain-dict representations of quotes, topics and storylines, for JSON.
+
+Related objects are read from select_related/prefetch_related caches,
+so callers control the queries.
+"""
+from pq.apps.people.serializers import serialize_person
+
+
+def serialize_topic(topic):
+    return {
+        'id': topic.pk,
+        'slug': topic.slug,
+        'name': topic.name,
+        'description': topic.description,
+        'modified': topic.modified,
+    }
+
+
+def serialize_quote(quote):
+    return {
+        'id': quote.pk,
+        'datetime': quote.datetime,
+        'speaker': serialize_person(quote.speaker) if quote.speaker else None,
+        'text': quote.text,
+        'tease': quote.tease,
+        'context': quote.context,
+        'source_url': quote.source_url,
+        'source_title': quote.source_title,
+        'topics': [t.slug for t in quote.topics.all()],
+        'mentions': [p.slug for p in quote.mentions.all()],
+        'modified': quote.modified,
+    }
+
+
+def serialize_storyline(storyline):
+    return {
+        'id': storyline.pk,
+        'slug': storyline.slug,
+        'title': storyline.title,
+        'datetime': storyline.datetime,
+        'author': storyline.author.get_username(),
+        'status': storyline.status,
+        'text': storyline.text,
+        'quotes': [sq.quote_id for sq in storyline.storylinequote_set.all()],
+        'topics': [t.slug for t in storyline.topics.all()],
+        'modified': storyline.modified,
+    }
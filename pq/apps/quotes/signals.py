@@ -0,0 +1,301 @@
+"""
+Signal handlers for quotes, connected when models are loaded.
+
+Modules that import models are imported inside handlers,
+since this module is itself imported from models.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from pq.apps.people.models import Person, Photo
+from pq.apps.people.signals import people_changed, thumbnails_rendered
+from pq.utils.api import bump_version
+from .models import Quote, Storyline, StorylineQuote, Topic
+
+
+@receiver(post_save, sender=Quote)
+def index_duplicates(sender, instance, raw=False, **kwargs):
+    "Keep near-duplicate buckets current"
+    from .dedupe import index_quote
+
+    if not raw:
+        index_quote(instance)
+
+
+# storyline payloads, see renders.py
+
+@receiver(post_save, sender=Storyline)
+@receiver(post_delete, sender=Storyline)
+def invalidate_storyline(sender, instance, **kwargs):
+    from .renders import invalidate
+    invalidate([instance.pk])
+
+
+@receiver(post_save, sender=StorylineQuote)
+@receiver(post_delete, sender=StorylineQuote)
+def invalidate_storyline_quote(sender, instance, **kwargs):
+    from .renders import invalidate
+    invalidate([instance.storyline_id])
+
+
+@receiver(post_save, sender=Quote)
+def invalidate_quote(sender, instance, created, raw=False, **kwargs):
+    from .renders import invalidate, storylines_for
+
+    # a new quote isn't in any storyline yet
+    if not (raw or created):
+        invalidate(storylines_for(quote=instance.pk))
+
+
+@receiver(m2m_changed, sender=Quote.topics.through)
+def invalidate_topics(sender, instance, action, reverse, pk_set, **kwargs):
+    from .renders import invalidate, storylines_for
+
+    # clears don't say what they removed, so catch them before it's gone
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if isinstance(instance, Quote):
+        invalidate(storylines_for(quote=instance.pk))
+    else:
+        quotes = pk_set if pk_set is not None else instance.quotes.all()
+        invalidate(storylines_for(quote__in=quotes))
+
+
+@receiver(post_save, sender=Topic)
+def invalidate_topic(sender, instance, raw=False, **kwargs):
+    from .renders import invalidate, storylines_for
+    if not raw:
+        invalidate(storylines_for(quote__topics=instance.pk))
+        invalidate(instance.storylines.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Topic)
+def find_topic_storylines(sender, instance, **kwargs):
+    "Storylines showing a topic, while its links are still there"
+    from .renders import storylines_for
+    instance._storylines = set(storylines_for(quote__topics=instance.pk))
+    instance._storylines.update(instance.storylines.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Topic)
+def invalidate_deleted_topic(sender, instance, **kwargs):
+    from .renders import invalidate
+    invalidate(getattr(instance, '_storylines', ()))
+
+
+@receiver(post_save, sender=Person)
+def invalidate_speaker(sender, instance, raw=False, **kwargs):
+    from .renders import invalidate, storylines_for
+    if not raw:
+        invalidate(storylines_for(quote__speaker=instance.pk))
+
+
+@receiver(pre_delete, sender=Person)
+def find_speaker_storylines(sender, instance, **kwargs):
+    "Storylines quoting a person, before their quotes go with them"
+    from .renders import storylines_for
+    instance._storylines = set(storylines_for(quote__speaker=instance.pk))
+
+
+@receiver(post_delete, sender=Person)
+def invalidate_deleted_speaker(sender, instance, **kwargs):
+    from .renders import invalidate
+    invalidate(getattr(instance, '_storylines', ()))
+
+
+@receiver(people_changed, sender=Person)
+def invalidate_speakers(sender, people, **kwargs):
+    from .renders import invalidate, storylines_for
+    invalidate(storylines_for(quote__speaker__in=[p.pk for p in people]))
+
+
+@receiver(post_save, sender=Photo)
+def invalidate_photo(sender, instance, raw=False, **kwargs):
+    from .renders import invalidate, storylines_for
+    if not raw:
+        invalidate(storylines_for(quote__speaker=instance.person_id))
+
+
+@receiver(thumbnails_rendered, sender=Photo)
+def invalidate_thumbnails(sender, photo_id, **kwargs):
+    from .renders import invalidate, storylines_for
+    invalidate(storylines_for(quote__speaker__photo=photo_id))
+
+
+# Storyline.topics reference counts, see storyline_topics.py
+
+@receiver(post_save, sender=StorylineQuote)
+def count_storyline_quote(sender, instance, raw=False, **kwargs):
+    "Count topics for a quote joining a storyline, or moving between them"
+    from .storyline_topics import quote_linked
+
+    # _saved_link is still the row as it was before this save
+    old, new = instance._saved_link, instance.link()
+    if raw or old == new:
+        return
+
+    if all(old):
+        quote_linked(old[0], old[1], -1)
+    quote_linked(new[0], new[1], 1)
+
+
+@receiver(pre_delete, sender=StorylineQuote)
+def uncount_storyline_quote(sender, instance, **kwargs):
+    "Before a quote leaves a storyline, while its topics are still there"
+    from .storyline_topics import quote_linked
+
+    storyline_id, quote_id = instance._saved_link
+    if storyline_id and quote_id:
+        quote_linked(storyline_id, quote_id, -1)
+
+
+@receiver(m2m_changed, sender=Quote.topics.through)
+def count_quote_topics(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Adjust counts when quote topics change, from either side.
+    Removals are counted before they happen.
+    """
+    from .storyline_topics import topics_changed
+
+    if action == 'post_add':
+        delta = 1
+    elif action in ('pre_remove', 'pre_clear'):
+        delta = -1
+    else:
+        return
+
+    if delta < 0:
+        pk_set = linked_pks(sender, 'topic', instance, reverse, pk_set)
+
+    if reverse:
+        topics_changed(pk_set, [instance.pk], delta)
+    else:
+        topics_changed([instance.pk], pk_set, delta)
+
+
+def linked_pks(sender, related, instance, reverse, pk_set):
+    """
+    For m2m removals and clears on Quote: pks on the other side of
+    links that actually exist, since pk_set holds whatever was asked
+    for (or None on a clear). `related` names the non-quote side.
+    """
+    this, other = (related, 'quote') if reverse else ('quote', related)
+    links = sender.objects.filter(**{this: instance.pk})
+    if pk_set is not None:
+        links = links.filter(**{other + '__in': pk_set})
+
+    return list(links.values_list(other + '_id', flat=True))
+
+
+# quote count rollups, see rollups.py
+
+@receiver(post_save, sender=Quote)
+def count_quote(sender, instance, created, raw=False, **kwargs):
+    from .rollups import quote_saved
+
+    # _saved_bucket is still the row as it was before this save
+    if not raw:
+        quote_saved(instance, instance._saved_bucket, created)
+
+
+@receiver(pre_delete, sender=Quote)
+def uncount_quote(sender, instance, **kwargs):
+    from .rollups import quote_deleted
+    quote_deleted(instance)
+
+
+@receiver(m2m_changed, sender=Quote.topics.through)
+@receiver(m2m_changed, sender=Quote.mentions.through)
+def count_related(sender, instance, action, reverse, pk_set, **kwargs):
+    from .rollups import related_changed
+
+    if sender is Quote.topics.through:
+        kind, related = 'topic', 'topic'
+    else:
+        kind, related = 'mention', 'person'
+
+    if action == 'post_add':
+        delta = 1
+    elif action in ('pre_remove', 'pre_clear'):
+        delta = -1
+        pk_set = linked_pks(sender, related, instance, reverse, pk_set)
+    else:
+        return
+
+    if reverse:
+        related_changed(kind, pk_set, [instance.pk], delta)
+    else:
+        related_changed(kind, [instance.pk], pk_set, delta)
+
+
+@receiver(post_save, sender=StorylineQuote)
+def count_storyline(sender, instance, raw=False, **kwargs):
+    from .rollups import storyline_changed
+
+    old, new = instance._saved_link, instance.link()
+    if raw or old == new:
+        return
+
+    if all(old):
+        storyline_changed(old[0], -1)
+    storyline_changed(new[0], 1)
+
+
+@receiver(pre_delete, sender=StorylineQuote)
+def uncount_storyline(sender, instance, **kwargs):
+    from .rollups import storyline_changed
+
+    if all(instance._saved_link):
+        storyline_changed(instance._saved_link[0], -1)
+
+
+@receiver(post_save, sender=Person)
+def count_party(sender, instance, raw=False, **kwargs):
+    from .rollups import parties_changed
+
+    # _saved_party is still the party as it was before this save
+    if not raw:
+        parties_changed([instance])
+
+
+@receiver(people_changed, sender=Person)
+def count_parties(sender, people, **kwargs):
+    from .rollups import parties_changed
+    parties_changed(people)
+
+
+@receiver(pre_delete, sender=Person)
+def resolve_speaker(sender, instance, **kwargs):
+    "Count deferred quotes under the speaker's party while it's there"
+    from .rollups import resolve
+    resolve([instance.pk])
+
+
+@receiver(post_delete, sender=Topic)
+def uncount_topic(sender, instance, **kwargs):
+    from .rollups import forget
+    forget('topic', instance.pk)
+
+
+@receiver(post_delete, sender=Person)
+def uncount_person(sender, instance, **kwargs):
+    from .rollups import forget
+    forget('speaker', instance.pk)
+    forget('mention', instance.pk)
+
+
+# API ETags, see pq.utils.api
+
+@receiver(m2m_changed, sender=Quote.topics.through)
+@receiver(m2m_changed, sender=Quote.mentions.through)
+@receiver(people_changed, sender=Person)
+@receiver(thumbnails_rendered, sender=Photo)
+def bump_api_version(sender, **kwargs):
+    "Anything the API serves changed, so ETags should too"
+    bump_version()
+
+
+for model in (Quote, Topic, Storyline, StorylineQuote, Person, Photo):
+    post_save.connect(bump_api_version, sender=model)
+    post_delete.connect(bump_api_version, sender=model)
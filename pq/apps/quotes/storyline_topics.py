@@ -0,0 +1,132 @@
+"""
+Maintain Storyline.topics as the union of its quotes' topics.
+
+StorylineTopic.quote_count counts, for each storyline and topic,
+the storyline's quotes with that topic. Signal handlers adjust only
+the affected counts when quotes join or leave a storyline or a
+quote's topics change, so the union is always current without
+aggregating at query time. verify() and rebuild() catch drift.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Quote, StorylineQuote, StorylineTopic
+
+
+def quote_linked(storyline_id, quote_id, delta):
+    """
+    A quote joined (delta=1) or left (delta=-1) a storyline.
+    """
+    topics = Quote.topics.through.objects.filter(quote=quote_id) \
+        .values_list('topic_id', flat=True)
+    adjust(dict(((storyline_id, topic_id), delta) for topic_id in topics))
+
+
+def topics_changed(quote_ids, topic_ids, delta):
+    """
+    Topics were added to (delta=1) or removed from (delta=-1) quotes.
+    Every storyline row holding one of the quotes counts once.
+    """
+    changes = defaultdict(int)
+    links = StorylineQuote.objects.filter(quote__in=quote_ids) \
+        .values_list('storyline_id', 'quote_id')
+
+    for storyline_id, quote_id in links:
+        for topic_id in topic_ids:
+            changes[(storyline_id, topic_id)] += delta
+
+    adjust(changes)
+
+
+def adjust(changes):
+    """
+    Apply count changes, a dict of (storyline_id, topic_id) to delta.
+    Updates are grouped by storyline and delta, missing rows are
+    created and rows that reach zero are deleted.
+    """
+    groups = defaultdict(set)
+    for (storyline_id, topic_id), delta in changes.items():
+        if delta:
+            groups[(storyline_id, delta)].add(topic_id)
+
+    if not groups:
+        return
+
+    with transaction.atomic():
+        for (storyline_id, delta), topic_ids in groups.items():
+            rows = StorylineTopic.objects.filter(storyline=storyline_id, topic__in=topic_ids)
+            if delta < 0:
+                rows.update(quote_count=F('quote_count') + delta)
+                rows.filter(quote_count__lte=0).delete()
+                continue
+
+            existing = set(rows.values_list('topic_id', flat=True))
+            if existing:
+                rows.filter(topic__in=existing).update(quote_count=F('quote_count') + delta)
+            for topic_id in topic_ids - existing:
+                insert(storyline_id, topic_id, delta)
+
+
+def insert(storyline_id, topic_id, delta):
+    """
+    Create a count row. If another transaction created it since we
+    looked, the insert fails and we add to that row instead.
+    """
+    try:
+        # a savepoint, so a failed insert leaves the transaction usable
+        with transaction.atomic():
+            StorylineTopic.objects.create(storyline_id=storyline_id,
+                topic_id=topic_id, quote_count=delta)
+    except IntegrityError:
+        StorylineTopic.objects.filter(storyline=storyline_id, topic=topic_id) \
+            .update(quote_count=F('quote_count') + delta)
+
+
+def expected_counts(storyline_ids=None):
+    """
+    True counts, aggregated from StorylineQuote and quote topics.
+    """
+    rows = StorylineQuote.objects.filter(quote__topics__isnull=False)
+    if storyline_ids is not None:
+        rows = rows.filter(storyline__in=storyline_ids)
+
+    # without order_by(), Meta.ordering joins the GROUP BY
+    rows = rows.order_by().values_list('storyline_id', 'quote__topics').annotate(n=Count('pk'))
+    return dict(((s, t), n) for s, t, n in rows)
+
+
+def stored_counts(storyline_ids=None):
+    rows = StorylineTopic.objects.all()
+    if storyline_ids is not None:
+        rows = rows.filter(storyline__in=storyline_ids)
+
+    rows = rows.values_list('storyline_id', 'topic_id', 'quote_count')
+    return dict(((s, t), n) for s, t, n in rows)
+
+
+def verify(storyline_ids=None):
+    """
+    Differences between stored and true counts, as a dict of
+    (storyline_id, topic_id) to (stored, expected). Empty when in sync.
+    """
+    expected = expected_counts(storyline_ids)
+    stored = stored_counts(storyline_ids)
+
+    return dict((key, (stored.get(key, 0), expected.get(key, 0)))
+        for key in set(expected) | set(stored)
+        if stored.get(key, 0) != expected.get(key, 0))
+
+
+def rebuild(storyline_ids=None):
+    """
+    Fix drift in bulk, touching only rows that differ.
+    Returns the number of rows fixed.
+    """
+    drift = verify(storyline_ids)
+    if drift:
+        adjust(dict((key, expected - stored)
+            for key, (stored, expected) in drift.items()))
+
+    return len(drift)
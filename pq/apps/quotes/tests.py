@@ -1,20 +1,85 @@
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.contrib.admin import site
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import get_cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.timezone import utc
 
-from .models import Topic, Quote, Storyline, StorylineQuote
+from .models import (DailyRollup, Rollup, Topic, Quote, Storyline,
+    StorylineQuote, StorylineTopic)
+from pq.apps.people.models import Person
+from pq.apps.people.signals import people_changed
 from .load import TUMBLR_BLOG, tumblr, tumblr_ingest
+from pq.apps.quotes import dedupe, load, renders, rollups, storyline_topics, views
+from pq.apps.quotes.text import fingerprint
+from pq.utils import api, instrumentation, replay
+from pq.utils.progress import Progress
 
 User = get_user_model()
 
+
+def make_posts(n, start=1):
+    "Fake tumblr quote posts, newest first"
+    posts = []
+    for i in range(start, start + n):
+        posts.append({
+            'id': i,
+            'timestamp': 1396000000 + i,
+            'text': u'Quote number %i' % i,
+            'source': u'Somebody said it',
+            'source_url': 'http://example.com/%i' % i,
+            'source_title': u'Example',
+        })
+    posts.reverse()
+    return posts
+
+
+class FakeTumblr(object):
+    "Stand-in for TumblrRestClient.posts, serving pages from a list"
+
+    def __init__(self, posts):
+        self.posts_list = posts
+        self.calls = 0
+
+    def posts(self, blog, type=None, limit=20, offset=0):
+        self.calls += 1
+        return {
+            'posts': self.posts_list[offset:offset + limit],
+            'total_posts': len(self.posts_list),
+        }
+
+@override_settings(DEFAULT_USER='guynoir')
 class QuoteLoadingTest(TestCase):
     """
-    Tests for loading quotes from external sources
+    Tests for loading quotes from external sources, against
+    replayed fixture responses
     """
     
     def setUp(self):
         # create a default user
         User.objects.create_user('guynoir', 'guy@example.com')
 
+        self.speaker_cache = load.speaker_cache
+        load.speaker_cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache', LOCATION='replay')
+
+        self.replay = replay.offline()
+        self.replay.__enter__()
+
+    def tearDown(self):
+        self.replay.__exit__()
+        load.speaker_cache = self.speaker_cache
+
     def test_tumblr_ingest(self):
         "Ensure tumblr ingest works"
 
@@ -25,3 +90,784 @@ class QuoteLoadingTest(TestCase):
         tumblr_ingest(TUMBLR_BLOG, limit=10)
 
         self.assertEqual(len(quotes['posts']), Quote.objects.count())
+
+    def test_speakers(self):
+        "Ensure Calais speakers are resolved to people"
+        tumblr_ingest(TUMBLR_BLOG)
+
+        self.assertEqual(Quote.objects.filter(speaker__last='Pelosi').count(), 1)
+        self.assertEqual(Quote.objects.filter(speaker=None).count(), 1)
+        self.assertEqual(self.replay.counts()['calais'], Quote.objects.count())
+
+
+class TopicTest(TestCase):
+    """
+    Tests for topics
+    """
+
+    def test_duplicate_names(self):
+        "Ensure topics with the same name get unique slugs"
+        first = Topic.objects.create(name='Health care')
+        second = Topic.objects.create(name='Health Care')
+
+        self.assertEqual(first.slug, 'health-care')
+        self.assertEqual(second.slug, 'health-care-1')
+
+
+class TumblrSyncTest(TestCase):
+    """
+    Tests for incremental and backfill tumblr syncs, without the network
+    """
+
+    def setUp(self):
+        User.objects.create_user('guynoir', 'guy@example.com')
+        self.tmp = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            DEFAULT_USER='guynoir', CHECKPOINT_DIR=self.tmp)
+        self.settings_override.enable()
+
+        self.originals = load.tumblr, load.fetch_page, load.get_speakers
+        self.client = FakeTumblr(make_posts(45))
+        load.tumblr = self.client
+        load.fetch_page = lambda blog, offset, client=None: \
+            self.client.posts(blog, limit=load.PAGE_SIZE, offset=offset)['posts']
+        load.get_speakers = lambda posts, workers=None: [None] * len(posts)
+
+    def tearDown(self):
+        load.tumblr, load.fetch_page, load.get_speakers = self.originals
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp)
+
+    def test_incremental(self):
+        "Ensure syncs page back to the high-water mark and no further"
+        self.assertEqual(load.tumblr_sync(), 45)
+        self.assertEqual(Quote.objects.count(), 45)
+
+        self.client.posts_list = make_posts(3, start=46) + self.client.posts_list
+        self.assertEqual(load.tumblr_sync(), 3)
+        self.assertEqual(Quote.objects.count(), 48)
+
+        # nothing new costs one request
+        self.client.calls = 0
+        self.assertEqual(load.tumblr_sync(), 0)
+        self.assertEqual(self.client.calls, 1)
+
+    def test_one_resolver(self):
+        "Ensure a sync loads the person index once, not once per batch"
+        built, resolver = [], load.PersonResolver
+        load.PersonResolver = lambda: built.append(resolver()) or built[-1]
+        try:
+            self.assertEqual(load.tumblr_sync(batch_size=10), 45)
+        finally:
+            load.PersonResolver = resolver
+
+        self.assertEqual(len(built), 1)
+
+    def test_backfill(self):
+        "Ensure backfills get every page"
+        self.assertEqual(load.tumblr_sync(backfill=True, workers=2), 45)
+        self.assertEqual(Quote.objects.count(), 45)
+
+    def test_limits(self):
+        "Ensure dry runs write nothing, and limited runs resume"
+        self.assertEqual(load.tumblr_sync(dry_run=True), 45)
+        self.assertEqual(Quote.objects.count(), 0)
+
+        self.assertEqual(load.tumblr_sync(since=datetime.date(2014, 3, 30)), 0)
+
+        progress = Progress('posts', stream=StringIO())
+        self.assertEqual(load.tumblr_sync(limit=10, batch_size=4, progress=progress), 10)
+        self.assertEqual(progress.counts['created'], 10)
+        self.assertEqual(Quote.objects.latest().source_url, 'http://example.com/10')
+
+        self.assertEqual(load.tumblr_sync(), 35)
+
+
+class SpeakerCacheTest(TestCase):
+    """
+    Tests for cached Calais speaker extraction
+    """
+
+    def setUp(self):
+        self.originals = load.speaker_cache, load.extract_speaker
+        self.analyzed = []
+
+        def extract_speaker(text):
+            self.analyzed.append(text)
+            return u'Barack Obama' if 'Obama' in text else None
+
+        load.speaker_cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache', LOCATION='speakers')
+        load.extract_speaker = extract_speaker
+        load.speaker_stats.reset()
+
+    def tearDown(self):
+        load.speaker_cache, load.extract_speaker = self.originals
+
+    def test_cache(self):
+        "Ensure repeat text skips Calais, including empty results"
+        posts = [{'source': u'President Obama said'}, {'source': u'Nobody said'}]
+
+        self.assertEqual(load.get_speakers(posts), [u'Barack Obama', None])
+        self.assertEqual(load.get_speakers(posts), [u'Barack Obama', None])
+
+        self.assertEqual(len(self.analyzed), 2)
+        self.assertEqual((load.speaker_stats.hits, load.speaker_stats.misses), (2, 2))
+
+
+class CalaisCacheTest(TestCase):
+    """
+    Tests for the table-backed Calais cache
+    """
+
+    def setUp(self):
+        self.cache = get_cache('pq.utils.dbcache.DatabaseCache',
+            LOCATION='calais_cache', OPTIONS={'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 4})
+
+    def test_many(self):
+        "Ensure batches of keys are read and written a query at a time"
+        # delete and insert in a savepoint, then expire and count
+        with self.assertNumQueries(6):
+            self.cache.set_many({'a': u'Barack Obama', 'b': u'', 'c': None})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get_many(['a', 'b', 'c', 'd']),
+                {'a': u'Barack Obama', 'b': u'', 'c': None})
+
+        self.cache.set('a', u'Joe Biden')
+        self.assertEqual(self.cache.get('a'), u'Joe Biden')
+
+    def test_cull(self):
+        "Ensure entries past MAX_ENTRIES are culled oldest first"
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.cache.set_many({'d': 4, 'e': 5})
+
+        # down to 4, less a quarter
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c', 'd', 'e']), {'d': 4, 'e': 5, 'c': 3})
+
+        self.cache.set('f', 6, timeout=-1)
+        self.assertEqual(self.cache.get('f'), None)
+
+
+class FingerprintTest(TestCase):
+    """
+    Tests for quote fingerprints
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('guynoir', 'guy@example.com')
+
+    def test_normalized(self):
+        "Ensure whitespace, case and curly quotes don't change fingerprints"
+        self.assertEqual(
+            fingerprint(u'\u201cWe don\u2019t  have a\nplan.\u201d'),
+            fingerprint(u'we don\'t have a plan.'))
+
+    def test_existing(self):
+        "Ensure existing fingerprints are found in one query"
+        Quote.objects.create(text=u'Read my lips', added_by=self.user,
+            source_url='http://example.com/')
+
+        with self.assertNumQueries(1):
+            found = Quote.objects.existing_fingerprints(
+                [fingerprint(u'read my  lips'), fingerprint(u'No new taxes')])
+
+        self.assertEqual(found, set([fingerprint(u'Read my lips')]))
+
+    def test_unmerged_duplicates(self):
+        "Ensure duplicates without a fingerprint still save, and new ones are caught"
+        Quote.objects.create(text=u'Read my lips', added_by=self.user,
+            source_url='http://example.com/')
+        duplicate = Quote.objects.create(text=u'No new taxes', added_by=self.user,
+            source_url='http://example.com/')
+
+        # as fingerprint_quotes leaves it
+        Quote.objects.filter(pk=duplicate.pk).update(text=u'read my lips', fingerprint=None)
+        duplicate = Quote.objects.get(pk=duplicate.pk)
+        duplicate.context = u'Said twice'
+        duplicate.full_clean()
+        duplicate.save()
+        self.assertIsNone(Quote.objects.get(pk=duplicate.pk).fingerprint)
+
+        with self.assertRaises(ValidationError):
+            Quote(text=u'READ MY LIPS', added_by=self.user,
+                source_url='http://example.com/').full_clean()
+
+
+class DuplicateTest(TestCase):
+    """
+    Tests for near-duplicate detection
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('guynoir', 'guy@example.com')
+        texts = [
+            u"We can't wait for an increasingly dysfunctional Congress to do its job. "
+            u"Where they won't act, I will.",
+            u"We can't wait for an increasingly dysfunctional Congress to do its job... "
+            u"where they won't act, I will",
+            u"I'm going to be working with Congress where I can.",
+        ]
+        self.quotes = [Quote.objects.create(text=text, added_by=user,
+            source_url='http://example.com/') for text in texts]
+
+    def test_likely_duplicates(self):
+        "Ensure edited versions of a quote are found, and others aren't"
+        first, second, third = self.quotes
+        found = [quote for quote, score in dedupe.likely_duplicates(first)]
+        self.assertEqual(found, [second])
+
+    def test_report(self):
+        "Ensure the corpus report groups duplicates"
+        first, second, third = self.quotes
+        self.assertEqual(dedupe.duplicate_report(), [[first.pk, second.pk]])
+
+
+class AdminTest(TestCase):
+    """
+    Tests for admin changelists
+    """
+
+    def setUp(self):
+        User.objects.create_superuser('guynoir', 'guy@example.com', 'secret')
+        self.client.login(username='guynoir', password='secret')
+
+    def add_quotes(self, n):
+        user = User.objects.get(username='guynoir')
+        for i in range(n):
+            Quote.objects.create(text=u'Quote %i' % Quote.objects.count(),
+                speaker=Person.objects.create(name='John Smith'),
+                added_by=user, source_url='http://example.com/')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(queries)
+
+    def test_quote_changelist(self):
+        "Ensure the quote changelist doesn't query per row"
+        url = reverse('admin:quotes_quote_changelist')
+        self.add_quotes(2)
+        few = self.count_queries(url)
+
+        self.add_quotes(10)
+        self.assertEqual(few, self.count_queries(url))
+
+    def test_keyset_pages(self):
+        "Ensure changelists page by cursor, through every row once"
+        self.add_quotes(5)
+        url = reverse('admin:quotes_quote_changelist')
+
+        seen, page = [], url
+        admin = site._registry[Quote]
+        admin.list_per_page, per_page = 2, admin.list_per_page
+        try:
+            while page:
+                cl = self.client.get(page).context['cl']
+                self.assertTrue(cl.keyset)
+                seen.extend(q.pk for q in cl.result_list)
+                page = cl.next_cursor and url + cl.next_page_url
+        finally:
+            admin.list_per_page = per_page
+
+        self.assertEqual(seen, list(Quote.objects.order_by('-datetime', '-pk')
+            .values_list('pk', flat=True)))
+
+        # sorted by a column, it's numbered pages again
+        self.assertFalse(self.client.get(url + '?o=4').context['cl'].keyset)
+        self.assertEqual(self.client.get(url + '?cursor=nonsense').status_code, 302)
+
+    def test_storyline_counts(self):
+        "Ensure storyline quote counts come from rollups"
+        self.add_quotes(2)
+        storyline = Storyline.objects.create(title='Health care',
+            author=User.objects.get(username='guynoir'))
+        for quote in Quote.objects.all():
+            StorylineQuote.objects.create(storyline=storyline, quote=quote)
+        Storyline.objects.create(title='Budget', author=storyline.author)
+
+        cl = self.client.get(reverse('admin:quotes_storyline_changelist')).context['cl']
+        self.assertEqual(dict((s.title, site._registry[Storyline].quote_count(s))
+            for s in cl.result_list), {'Health care': 2, 'Budget': 0})
+
+        cl = self.client.get(reverse('admin:quotes_storyline_changelist') + '?status__exact=draft').context['cl']
+        self.assertEqual(cl.result_count, 2)
+
+
+class APITest(TestCase):
+    """
+    Tests for the JSON API
+    """
+
+    def setUp(self):
+        self.caches = api.cache, renders.cache
+        api.cache = renders.cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache', LOCATION='api')
+        api.cache.clear()
+
+        self.user = user = User.objects.create_user('guynoir', 'guy@example.com')
+        topic = Topic.objects.create(name='Economy')
+        self.speaker = speaker = Person.objects.create(name='John Boehner', public=True)
+
+        # pairs of quotes share a timestamp, to test tie-breaking
+        start = datetime.datetime(2014, 1, 1, tzinfo=utc)
+        for i in range(25):
+            quote = Quote.objects.create(text=u'Quote %i' % i, speaker=speaker,
+                added_by=user, source_url='http://example.com/',
+                datetime=start + datetime.timedelta(days=i // 2))
+            quote.topics.add(topic)
+
+    def tearDown(self):
+        api.cache, renders.cache = self.caches
+
+    def get(self, url, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, **extra)
+        return resp, len(queries)
+
+    def test_keyset_pages(self):
+        "Ensure pages cover every quote once, in order, in constant queries"
+        url = reverse('quote_list') + '?limit=10'
+        seen, counts = [], set()
+
+        while url:
+            resp, queries = self.get(url)
+            data = json.loads(resp.content)
+            seen.extend(q['id'] for q in data['results'])
+            counts.add(queries)
+            url = data['next']
+
+        expected = list(Quote.objects.order_by('-datetime', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(counts), 1)
+
+    def test_not_modified(self):
+        "Ensure a matching ETag gets a 304"
+        resp, queries = self.get(reverse('quote_list'))
+        resp, queries = self.get(reverse('quote_list'), HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(queries, 0)
+
+    def test_related_changes(self):
+        "Ensure changes to related rows change ETags"
+        url = reverse('quote_list')
+        tag = self.get(url)[0]['ETag']
+
+        self.speaker.last = 'Boner'
+        self.speaker.save()
+        resp, queries = self.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(resp.status_code, 200)
+
+        tag = resp['ETag']
+        Quote.objects.all()[0].topics.clear()
+        resp, queries = self.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_storyline_status(self):
+        "Ensure drafts aren't served, and private storylines aren't listed"
+        storylines = dict((status, Storyline.objects.create(title=status,
+            author=self.user, status=status)) for status, label in Storyline.STATUS)
+
+        resp, queries = self.get(reverse('storyline_list'))
+        data = json.loads(resp.content)
+        self.assertEqual([s['title'] for s in data['results']], ['published'])
+
+        for status, code in (('draft', 404), ('published', 200), ('private', 200)):
+            pk = storylines[status].pk
+            self.assertEqual(self.get(reverse('storyline_detail', args=[pk]))[0].status_code, code)
+            self.assertEqual(self.get(reverse('storyline_render', args=[pk]))[0].status_code, code)
+
+    def test_bad_cursor(self):
+        "Ensure garbage cursors are a 400"
+        resp, queries = self.get(reverse('quote_list') + '?cursor=garbage')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_people(self):
+        "Ensure public people are listed"
+        resp, queries = self.get(reverse('person_list'))
+        data = json.loads(resp.content)
+        self.assertEqual([p['name'] for p in data['results']], ['John Boehner'])
+
+
+class SearchTest(TestCase):
+    """
+    Tests for full-text search
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('guynoir', 'guy@example.com')
+        bush = Person.objects.create(name='George H. W. Bush')
+        for text in [u'Read my lips: no new taxes.', u'Taxes are going up.',
+                     u'A kinder, gentler nation.']:
+            Quote.objects.create(text=text, speaker=bush, added_by=user,
+                source_url='http://example.com/')
+
+    def test_search(self):
+        "Ensure searches match stemmed words, phrases and speakers"
+        self.assertEqual(Quote.objects.search('tax').count(), 2)
+        self.assertEqual(Quote.objects.search('new taxes', phrase=True).count(), 1)
+        self.assertEqual(Quote.objects.search('bush').count(), 3)
+
+    def test_speaker_rename(self):
+        "Ensure renaming a speaker reindexes their quotes"
+        Person.objects.filter(last='Bush').update(nickname='Poppy')
+        self.assertEqual(Quote.objects.search('poppy').count(), 3)
+
+        bush = Person.objects.get(last='Bush')
+        bush.display = u'President {last}'
+        bush.save()
+        self.assertEqual(Quote.objects.search('president').count(), 3)
+
+    def test_api(self):
+        "Ensure the search API highlights matches"
+        resp = self.client.get(reverse('quote_search'), {'q': 'lips'})
+        data = json.loads(resp.content)
+        self.assertEqual(len(data['results']), 1)
+        self.assertIn('<mark>lips</mark>', data['results'][0]['headline'])
+
+
+class StorylineRenderTest(TestCase):
+    """
+    Tests for precomputed storyline payloads
+    """
+
+    def setUp(self):
+        self.render_cache = renders.cache
+        renders.cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache', LOCATION='renders')
+        renders.cache.clear()
+
+        user = User.objects.create_user('guynoir', 'guy@example.com')
+        self.speaker = Person.objects.create(name='Paul Ryan')
+        self.storyline = Storyline.objects.create(title='The budget', author=user)
+
+        for i in range(5):
+            quote = Quote.objects.create(text=u'Budget quote %i' % i,
+                speaker=self.speaker, added_by=user, source_url='http://example.com/')
+            quote.topics.add(Topic.objects.create(name='Budget %i' % i))
+            StorylineQuote.objects.create(storyline=self.storyline, quote=quote, order=i)
+
+    def tearDown(self):
+        renders.cache = self.render_cache
+
+    def test_batched(self):
+        "Ensure building a payload costs the same however many quotes it has"
+        with self.assertNumQueries(4):
+            payload = renders.get_payload(self.storyline.pk)
+
+        self.assertEqual([q['order'] for q in payload['quotes']], range(5))
+        self.assertEqual(payload['quotes'][0]['speaker']['name'], 'Paul Ryan')
+
+        with self.assertNumQueries(0):
+            renders.get_payload(self.storyline.pk)
+
+    def test_invalidation(self):
+        "Ensure speaker and ordering changes invalidate payloads"
+        renders.get_payload(self.storyline.pk)
+
+        self.speaker.display = 'Rep. {first} {last}'
+        self.speaker.save()
+        payload = renders.get_payload(self.storyline.pk)
+        self.assertEqual(payload['quotes'][0]['speaker']['name'], 'Rep. Paul Ryan')
+
+        StorylineQuote.objects.filter(order=0).update(order=10)
+        StorylineQuote.objects.get(order=10).save()
+        payload = renders.get_payload(self.storyline.pk)
+        self.assertEqual(payload['quotes'][-1]['order'], 10)
+
+    def test_deletes(self):
+        "Ensure deleting a topic or speaker invalidates payloads"
+        renders.get_payload(self.storyline.pk)
+
+        Topic.objects.get(name='Budget 0').delete()
+        payload = renders.get_payload(self.storyline.pk)
+        self.assertEqual(payload['quotes'][0]['topics'], [])
+
+        self.speaker.delete()
+        self.assertEqual(renders.get_payload(self.storyline.pk)['quotes'], [])
+
+
+class StorylineTopicsTest(TestCase):
+    """
+    Tests for Storyline.topics reference counts
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('guynoir', 'guy@example.com')
+        self.storyline = Storyline.objects.create(title='Health care', author=user)
+        self.aca, self.budget = [Topic.objects.create(name=n) for n in ('ACA', 'Budget')]
+        self.quotes = [Quote.objects.create(text=u'Quote %i' % i, added_by=user,
+            source_url='http://example.com/') for i in range(2)]
+
+        for quote in self.quotes:
+            quote.topics.add(self.aca)
+
+    def counts(self):
+        return dict(StorylineTopic.objects.filter(storyline=self.storyline)
+            .values_list('topic__name', 'quote_count'))
+
+    def test_union(self):
+        "Ensure storyline topics follow quotes and their topics"
+        first, second = self.quotes
+        link = StorylineQuote.objects.create(storyline=self.storyline, quote=first)
+        StorylineQuote.objects.create(storyline=self.storyline, quote=second)
+        self.assertEqual(self.counts(), {'ACA': 2})
+
+        first.topics.add(self.budget)
+        self.assertEqual(self.counts(), {'ACA': 2, 'Budget': 1})
+
+        # removing something that isn't there changes nothing
+        second.topics.remove(self.budget)
+        self.assertEqual(self.counts(), {'ACA': 2, 'Budget': 1})
+
+        link.delete()
+        self.assertEqual(self.counts(), {'ACA': 1})
+
+        self.aca.quotes.clear()
+        self.assertEqual(self.counts(), {})
+        self.assertEqual(storyline_topics.verify(), {})
+
+    def test_rebuild(self):
+        "Ensure drift is found and fixed"
+        for quote in self.quotes:
+            StorylineQuote.objects.create(storyline=self.storyline, quote=quote)
+
+        StorylineTopic.objects.update(quote_count=5)
+        self.assertEqual(len(storyline_topics.verify()), 1)
+
+        self.assertEqual(storyline_topics.rebuild(), 1)
+        self.assertEqual(self.counts(), {'ACA': 2})
+
+    def test_scoped(self):
+        "Ensure changes only touch their own rows, and inserts that lose a race add"
+        other = Storyline.objects.create(title='Budget', author=self.storyline.author)
+        StorylineTopic.objects.create(storyline=other, topic=self.aca, quote_count=0)
+
+        link = StorylineQuote.objects.create(storyline=self.storyline, quote=self.quotes[0])
+        link.delete()
+        self.assertEqual(StorylineTopic.objects.filter(storyline=other).count(), 1)
+
+        # as if another transaction created the row after we looked
+        storyline_topics.insert(other.pk, self.aca.pk, 2)
+        self.assertEqual(StorylineTopic.objects.get(storyline=other).quote_count, 2)
+
+
+class RollupTest(TestCase):
+    """
+    Tests for denormalized quote counts
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('guynoir', 'guy@example.com')
+        self.day = datetime.datetime(2013, 3, 1, 12, tzinfo=utc)
+        self.boehner = Person.objects.create(first='John', last='Boehner', party='R')
+        self.pelosi = Person.objects.create(first='Nancy', last='Pelosi', party='D')
+        self.aca = Topic.objects.create(name='ACA')
+        self.made = 0
+
+    def quote(self, speaker, day=None, **kwargs):
+        # distinct text, since duplicates are refused
+        self.made += 1
+        return Quote.objects.create(text=u'Quote %i' % self.made, added_by=self.user,
+            speaker=speaker, datetime=day or self.day, source_url='http://example.com/', **kwargs)
+
+    def counts(self):
+        return dict(((r.kind, r.key), r.count) for r in Rollup.objects.all() if r.count)
+
+    def daily(self):
+        return dict(((r.kind, r.key, r.day), r.count)
+            for r in DailyRollup.objects.all() if r.count)
+
+    def test_incremental(self):
+        "Ensure counts follow quote saves, deletes and m2m changes"
+        first = self.quote(self.boehner)
+        second = self.quote(self.boehner)
+        self.quote(self.pelosi)
+        self.assertEqual(rollups.leaderboard('speaker'),
+            [(unicode(self.boehner.pk), 2), (unicode(self.pelosi.pk), 1)])
+        self.assertEqual(rollups.leaderboard('party'), [(u'R', 2), (u'D', 1)])
+
+        first.topics.add(self.aca)
+        self.aca.quotes.add(second)
+        first.mentions.add(self.pelosi)
+        self.assertEqual(rollups.leaderboard('topic'), [(unicode(self.aca.pk), 2)])
+
+        # a new speaker moves the quote
+        second.speaker = self.pelosi
+        second.save()
+        self.assertEqual(rollups.leaderboard('party'), [(u'D', 2), (u'R', 1)])
+
+        # removing a link that isn't there changes nothing
+        second.mentions.remove(self.pelosi)
+        first.topics.clear()
+        self.assertEqual(rollups.leaderboard('topic'), [(unicode(self.aca.pk), 1)])
+
+        storyline = Storyline.objects.create(title='Health care', author=self.user)
+        link = StorylineQuote.objects.create(storyline=storyline, quote=first)
+        self.assertEqual(rollups.leaderboard('storyline'), [(unicode(storyline.pk), 1)])
+
+        first.delete()
+        self.assertEqual(rollups.leaderboard('speaker'), [(unicode(self.pelosi.pk), 2)])
+        self.assertEqual(rollups.leaderboard('mention'), [])
+        self.assertEqual(rollups.leaderboard('storyline'), [])
+        self.assertFalse(StorylineQuote.objects.filter(pk=link.pk).exists())
+
+    def test_sparkline(self):
+        "Ensure daily counts move with the quote's day"
+        quote = self.quote(self.boehner)
+        quote.topics.add(self.aca)
+        self.quote(self.boehner, day=self.day - datetime.timedelta(days=2))
+
+        end = self.day.date()
+        self.assertEqual(rollups.sparkline('speaker', self.boehner.pk, 3, end), [1, 0, 1])
+
+        quote.datetime = self.day - datetime.timedelta(days=1)
+        quote.save()
+        self.assertEqual(rollups.sparkline('speaker', self.boehner.pk, 3, end), [1, 1, 0])
+        self.assertEqual(rollups.sparkline('topic', self.aca.pk, 3, end), [0, 1, 0])
+        self.assertEqual(rollups.leaderboard('speaker', since=end), [])
+
+    def test_deferred(self):
+        "Ensure deferred changes are added up and written on the way out"
+        with rollups.deferred():
+            for i in range(3):
+                self.quote(self.boehner)
+            self.assertEqual(rollups.leaderboard('speaker'), [])
+
+        self.assertEqual(rollups.leaderboard('speaker'), [(unicode(self.boehner.pk), 3)])
+
+    def test_deferred_parties(self):
+        "Ensure deferred saves look up speakers' parties once, on the way out"
+        with CaptureQueriesContext(connection) as queries:
+            with rollups.deferred():
+                self.quote(self.boehner)
+                self.quote(self.pelosi)
+                self.quote(self.boehner)
+
+        lookups = [q for q in queries if '"people_person"."party"' in q['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(rollups.leaderboard('party'), [(u'R', 2), (u'D', 1)])
+
+    def test_party_change(self):
+        "Ensure a speaker's counts follow them to a new party"
+        self.quote(self.boehner)
+        self.quote(self.boehner, day=self.day - datetime.timedelta(days=1))
+
+        self.boehner.party = 'D'
+        self.boehner.save()
+        self.assertEqual(rollups.leaderboard('party'), [(u'D', 2)])
+        self.assertEqual(rollups.sparkline('party', 'D', 2, self.day.date()), [1, 1])
+
+        # bulk loads say who changed with people_changed
+        boehner = Person.objects.get(pk=self.boehner.pk)
+        Person.objects.filter(pk=boehner.pk).update(party='R')
+        boehner.party = 'R'
+        people_changed.send(sender=Person, people=[boehner])
+        self.assertEqual(rollups.leaderboard('party'), [(u'R', 2)])
+
+    def test_deletes(self):
+        "Ensure counts go with deleted topics and people"
+        quote = self.quote(self.boehner)
+        quote.topics.add(self.aca)
+        quote.mentions.add(self.pelosi)
+
+        self.aca.delete()
+        self.pelosi.delete()
+        self.assertEqual(rollups.leaderboard('topic'), [])
+        self.assertEqual(rollups.leaderboard('mention'), [])
+        self.assertFalse(Rollup.objects.filter(kind='mention').exists())
+
+        # a speaker deleted mid-batch takes their quotes' counts along
+        with rollups.deferred():
+            self.quote(self.boehner)
+            self.boehner.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_insert_race(self):
+        "Ensure a row created between our update and insert gets added to"
+        self.quote(self.boehner)
+        add, misses = rollups.add, []
+
+        def lose_race(model, filters, delta):
+            # the first update misses, as if the row came in just after
+            if not misses:
+                misses.append(filters)
+                return 0
+            return add(model, filters, delta)
+
+        rollups.add = lose_race
+        try:
+            rollups.bump(Rollup, ('kind', 'key'), {('speaker', unicode(self.boehner.pk)): 1})
+        finally:
+            rollups.add = add
+
+        self.assertEqual(rollups.leaderboard('speaker'), [(unicode(self.boehner.pk), 2)])
+
+    def test_rebuild(self):
+        "Ensure a rebuild from scratch matches incremental counts"
+        quote = self.quote(self.boehner)
+        quote.topics.add(self.aca)
+        quote.mentions.add(self.pelosi)
+        self.quote(self.pelosi, day=self.day - datetime.timedelta(days=1))
+        storyline = Storyline.objects.create(title='Health care', author=self.user)
+        StorylineQuote.objects.create(storyline=storyline, quote=quote)
+
+        counts, daily = self.counts(), self.daily()
+        Rollup.objects.update(count=0)
+        DailyRollup.objects.all().delete()
+
+        rollups.rebuild()
+        self.assertEqual(self.counts(), counts)
+        self.assertEqual(self.daily(), daily)
+
+
+@override_settings(INSTRUMENTATION=True, INSTRUMENTATION_SAMPLE_RATE=1.0,
+    INSTRUMENTATION_STATS_FILE=None)
+class InstrumentationTest(TestCase):
+    """
+    Tests for request and run tracing
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('guynoir', 'guy@example.com')
+        self.quotes = [Quote.objects.create(text=u'Quote %i' % i, added_by=self.user,
+            source_url='http://example.com/') for i in range(6)]
+
+    def test_duplicates(self):
+        "Ensure repeated statements are flagged, and traces don't nest"
+        with instrumentation.trace('speakers') as trace:
+            for quote in Quote.objects.all():
+                quote.added_by
+
+            with instrumentation.trace('nested') as nested:
+                self.assertIsNone(nested)
+
+        self.assertEqual(trace.queries, 7)
+        duplicates = trace.duplicates()
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0][1], 6)
+        self.assertEqual(trace.summary()['duplicates'][0]['count'], 6)
+
+    def test_sampling(self):
+        "Ensure unsampled runs aren't traced"
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=0):
+            with instrumentation.trace('skipped') as trace:
+                self.assertIsNone(trace)
+
+        with override_settings(INSTRUMENTATION=False):
+            self.assertRaises(MiddlewareNotUsed, instrumentation.InstrumentationMiddleware)
+
+    def test_middleware(self):
+        "Ensure sampled requests get a Server-Timing header"
+        middleware = instrumentation.InstrumentationMiddleware()
+        request = RequestFactory().get('/api/quotes/')
+
+        middleware.process_request(request)
+        response = views.quote_list(request)
+        response = middleware.process_response(request, response)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIsNone(instrumentation.local.trace)
+
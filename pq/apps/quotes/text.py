@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Text normalization for comparing quotes.
+"""
+import hashlib
+import re
+import unicodedata
+
+# typographic marks that vary by source
+PUNCTUATION = {
+    u'‘': u"'", u'’': u"'", u'‚': u"'", u'‛': u"'",
+    u'′': u"'", u'´': u"'", u'`': u"'",
+    u'“': u'"', u'”': u'"', u'„': u'"', u'‟': u'"',
+    u'″': u'"', u'«': u'"', u'»': u'"',
+    u'‐': u'-', u'‑': u'-', u'‒': u'-', u'–': u'-',
+    u'—': u'-', u'―': u'-', u'−': u'-',
+}
+PUNCTUATION = dict((ord(k), v) for k, v in PUNCTUATION.items())
+
+WHITESPACE = re.compile(r'\s+', re.UNICODE)
+
+
+def normalize(text):
+    """
+    Normalize quote text for comparison: unicode compatibility forms,
+    straight quotes and dashes, collapsed whitespace, no surrounding
+    quote marks, lowercase.
+    """
+    if not isinstance(text, unicode):
+        text = text.decode('utf-8')
+
+    text = unicodedata.normalize('NFKC', text).translate(PUNCTUATION)
+    text = WHITESPACE.sub(u' ', text).strip().strip(u'"\'').strip()
+    return text.lower()
+
+
+def fingerprint(text):
+    """
+    A sha1 hex digest of normalized text.
+    """
+    return hashlib.sha1(normalize(text).encode('utf-8')).hexdigest()
@@ -0,0 +1,12 @@
+from django.conf.urls import patterns, url
+
+urlpatterns = patterns('pq.apps.quotes.views',
+    url(r'^quotes/$', 'quote_list', name='quote_list'),
+    url(r'^quotes/search/$', 'quote_search', name='quote_search'),
+    url(r'^quotes/(?P<pk>\d+)/$', 'quote_detail', name='quote_detail'),
+    url(r'^topics/$', 'topic_list', name='topic_list'),
+    url(r'^topics/(?P<slug>[-\w]+)/$', 'topic_detail', name='topic_detail'),
+    url(r'^storylines/$', 'storyline_list', name='storyline_list'),
+    url(r'^storylines/(?P<pk>\d+)/$', 'storyline_detail', name='storyline_detail'),
+    url(r'^storylines/(?P<pk>\d+)/render/$', 'storyline_render', name='storyline_render'),
+)
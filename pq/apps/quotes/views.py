@@ -1,3 +1,131 @@
-from django.shortcuts import render
+"""
+Read-only JSON API for quotes, topics and storylines.
 
-# Create your views here.
+Every view runs a fixed number of queries, however big the page:
+one for the page and one per prefetch. Conditional headers come from
+a cached version, so a 304 costs none.
+
+Drafts aren't served. Published storylines are listed, and private
+ones are served to anyone with the link.
+"""
+import datetime
+
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+
+from pq.utils.api import MAX_LIMIT, detail_response, json_response, list_response
+from . import renders
+from .models import Quote, Storyline, Topic
+from .serializers import serialize_quote, serialize_storyline, serialize_topic
+
+
+def quotes():
+    return (Quote.objects
+        .select_related('speaker', 'speaker__photo')
+        .prefetch_related('topics', 'mentions'))
+
+
+def storylines():
+    return (Storyline.objects
+        .filter(status__in=Storyline.VISIBLE)
+        .select_related('author')
+        .prefetch_related('storylinequote_set', 'topics'))
+
+
+def quote_list(request):
+    """
+    Quotes, newest first. Filter with ?speaker=<slug> or ?topic=<slug>.
+    """
+    qs = quotes()
+    if request.GET.get('speaker'):
+        qs = qs.filter(speaker__slug=request.GET['speaker'])
+    if request.GET.get('topic'):
+        qs = qs.filter(topics__slug=request.GET['topic'])
+
+    return list_response(request, qs, ('-datetime', '-pk'), serialize_quote)
+
+
+def quote_search(request):
+    """
+    Ranked full-text search: ?q=<words>, with phrase=1 to match
+    words in order. Filter with speaker, topic, since and until
+    (YYYY-MM-DD). Page with limit and offset; search results are
+    for finding things, so only the first few pages are served.
+    """
+    query = request.GET.get('q', '').strip()
+    phrase = request.GET.get('phrase') in ('1', 'true')
+
+    try:
+        limit = min(int(request.GET.get('limit', 20)), MAX_LIMIT)
+        offset = min(int(request.GET.get('offset', 0)), 10 * MAX_LIMIT)
+        since = parse_date(request.GET.get('since', '')) if request.GET.get('since') else None
+        until = parse_date(request.GET.get('until', '')) if request.GET.get('until') else None
+    except ValueError:
+        since = until = limit = None
+
+    if not query or not limit or limit < 1 or offset < 0:
+        return json_response({'error': 'Invalid search'}, status=400)
+
+    qs = quotes().search(query, phrase=phrase)
+    if request.GET.get('speaker'):
+        qs = qs.filter(speaker__slug=request.GET['speaker'])
+    if request.GET.get('topic'):
+        qs = qs.filter(topics__slug=request.GET['topic'])
+    if since:
+        qs = qs.filter(datetime__gte=since)
+    if until:
+        qs = qs.filter(datetime__lt=until + datetime.timedelta(days=1))
+
+    results = list(qs[offset:offset + limit])
+    headlines = Quote.objects.headlines(query, [q.pk for q in results], phrase=phrase)
+
+    data = []
+    for quote in results:
+        item = serialize_quote(quote)
+        item['rank'] = quote.rank
+        item['headline'] = headlines.get(quote.pk)
+        data.append(item)
+
+    return json_response({'results': data})
+
+
+def quote_detail(request, pk):
+    quote = get_object_or_404(quotes(), pk=pk)
+    return detail_response(request, quote, serialize_quote)
+
+
+def topic_list(request):
+    return list_response(request, Topic.objects.all(), ('name', 'pk'), serialize_topic)
+
+
+def topic_detail(request, slug):
+    topic = get_object_or_404(Topic, slug=slug)
+    return detail_response(request, topic, serialize_topic)
+
+
+def storyline_list(request):
+    """
+    Published storylines, newest first. Filter with ?topic=<slug>.
+    """
+    qs = storylines().filter(status=Storyline.STATUS.published)
+    if request.GET.get('topic'):
+        qs = qs.filter(topics__slug=request.GET['topic'])
+
+    return list_response(request, qs, ('-datetime', '-pk'), serialize_storyline)
+
+
+def storyline_detail(request, pk):
+    storyline = get_object_or_404(storylines(), pk=pk)
+    return detail_response(request, storyline, serialize_storyline)
+
+
+def storyline_render(request, pk):
+    """
+    Everything needed to render a storyline, from the precomputed payload.
+    """
+    payload = renders.get_payload(int(pk))
+    if payload is None or payload['status'] not in Storyline.VISIBLE:
+        raise Http404
+
+    return json_response(payload)
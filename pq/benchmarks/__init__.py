@@ -0,0 +1,6 @@
+"""
+Benchmarks for loaders and models. They're Django tests, kept out of
+the normal suite by their bench_ prefix. Run them with:
+
+    python manage.py test pq.benchmarks -p "bench_*.py"
+"""
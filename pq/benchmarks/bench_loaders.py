@@ -0,0 +1,152 @@
+"""
+Loader throughput against the offline replay server: members/sec for
+congress(), posts/sec for tumblr_ingest() and photos/sec for photo sync,
+with queries per item and peak memory.
+
+Scale and simulated network latency come from the environment:
+
+    BENCH_SIZE=1000 BENCH_LATENCY=0.05 python manage.py test pq.benchmarks -p "bench_*.py"
+
+Each benchmark also fails if queries per item go over its budget, so
+an N+1 in a loader shows up here before it shows up in production.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import get_cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from pq.apps.people import load as people_load, photos
+from pq.apps.people.models import Person, Photo
+from pq.apps.quotes import load as quotes_load
+from pq.apps.quotes.models import Quote
+from pq.utils import replay
+from .measure import Measurement, report, save
+
+SIZE = int(os.environ.get('BENCH_SIZE', 200))
+LATENCY = float(os.environ.get('BENCH_LATENCY', 0.01))
+
+# most queries per item before a benchmark fails, from what each
+# loader is designed to cost rather than what it runs today: lookups
+# and rollups are per batch, so an ingested post should be little more
+# than its insert and near-duplicate buckets, and a synced photo its
+# insert. Congress loads are set-based throughout.
+BUDGETS = {
+    'congress': 0.1,
+    'congress reload': 0.1,
+    'tumblr ingest': 2.5,
+    'photo sync': 1.5,
+}
+
+
+def make_members(n):
+    "n current members, cloned from the fixture ones with unique IDs and names"
+    fixture = replay.load_fixture('legislators-current.yaml')
+    members = []
+    for i in range(n):
+        member = copy.deepcopy(fixture[i % len(fixture)])
+        member['id'] = {'bioguide': 'B%06i' % i, 'govtrack': 900000 + i}
+        member['name']['last'] = u'%s %s' % (member['name']['last'], letters(i))
+        member['name'].pop('official_full', None)
+        members.append(member)
+    return members
+
+
+def make_posts(n):
+    """
+    n tumblr posts, cloned from the fixture ones with unique IDs,
+    text and sources, so none are duplicates or Calais cache hits
+    """
+    fixture = replay.load_fixture('tumblr-posts.json')['response']['posts']
+    posts = []
+    for i in range(n):
+        post = dict(fixture[i % len(fixture)])
+        post['id'] = 1000000 + i
+        post['timestamp'] = post['timestamp'] - i * 60
+        post['text'] = u'%s (%s)' % (post['text'], letters(i))
+        post['source'] = u'%s, %s' % (post['source'], letters(i))
+        posts.append(post)
+    return posts
+
+
+def letters(i):
+    "0, 1, 2 ... as a, b, c ... aa, ab, so generated names stay names"
+    s = u''
+    while True:
+        s = unichr(ord('a') + i % 26) + s
+        i = i // 26 - 1
+        if i < 0:
+            return s
+
+
+class LoaderBenchmark(TestCase):
+    results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        report(cls.results)
+        save('loaders', cls.results)
+        super(LoaderBenchmark, cls).tearDownClass()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            SOURCE_CACHE_DIR=os.path.join(self.tmp, 'sources'),
+            MEDIA_ROOT=os.path.join(self.tmp, 'media'),
+            CHECKPOINT_DIR=os.path.join(self.tmp, 'checkpoints'),
+            DEFAULT_USER='benchmark')
+        self.settings_override.enable()
+
+        self.speaker_cache = quotes_load.speaker_cache
+        quotes_load.speaker_cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache', LOCATION='benchmark')
+
+    def tearDown(self):
+        quotes_load.speaker_cache = self.speaker_cache
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp)
+
+    def record(self, measurement):
+        result = measurement.result()
+        self.results.append(result)
+        self.assertLessEqual(result['queries_per_item'], BUDGETS[result['name']],
+            '%(name)s ran %(queries_per_item)s queries per item' % result)
+
+    def test_congress(self):
+        members = make_members(SIZE)
+        with replay.offline(LATENCY, members=members):
+            with Measurement('congress', SIZE) as m:
+                people_load.congress()
+            self.record(m)
+            self.assertEqual(Person.objects.count(), SIZE)
+
+            # nothing changed, so nothing is written
+            with Measurement('congress reload', SIZE) as m:
+                people_load.congress()
+            self.record(m)
+
+    def test_tumblr_ingest(self):
+        get_user_model().objects.create_user('benchmark', 'benchmark@example.com')
+        posts = make_posts(SIZE)
+
+        with replay.offline(LATENCY, posts=posts) as server:
+            with Measurement('tumblr ingest', SIZE) as m:
+                quotes_load.ingest_posts(quotes_load.fetch_all_posts(quotes_load.TUMBLR_BLOG))
+            self.record(m)
+
+        self.assertEqual(Quote.objects.count(), SIZE)
+        self.assertEqual(server.counts()['calais'], SIZE)
+
+    def test_photo_sync(self):
+        people_load.load_members(make_members(SIZE))
+
+        with replay.offline(LATENCY):
+            with Measurement('photo sync', SIZE) as m:
+                photos.sync_photos(render=False)
+            self.record(m)
+
+        self.assertEqual(Photo.objects.count(), SIZE)
@@ -0,0 +1,124 @@
+"""
+Model-layer hot paths over a synthetic corpus: saving and slugging
+people, name lookups, Quote get_or_create, storyline rendering and
+admin changelists.
+
+Every benchmark has a query budget, so an N+1 fails the run instead of
+quietly slowing pages down. Corpus size comes from BENCH_SIZE (people;
+five times as many quotes), and BENCH_OUTPUT keeps results as JSON.
+
+    BENCH_SIZE=2000 python manage.py test pq.benchmarks -p "bench_models.py"
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.cache import get_cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from pq.apps.people.models import Person
+from pq.apps.quotes import renders
+from pq.apps.quotes.models import Quote
+from . import synthetic
+from .measure import Measurement, report, save
+
+SIZE = int(os.environ.get('BENCH_SIZE', 200))
+
+# operations per benchmark
+REPEAT = 50
+
+
+class ModelBenchmark(TestCase):
+    results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        report(cls.results)
+        save('models', cls.results)
+        super(ModelBenchmark, cls).tearDownClass()
+
+    def setUp(self):
+        self.render_cache = renders.cache
+        renders.cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache', LOCATION='bench')
+
+        self.corpus = synthetic.build(people=SIZE, quotes=SIZE * 5,
+            storylines=max(SIZE / 10, 1), per_storyline=20)
+
+    def tearDown(self):
+        renders.cache = self.render_cache
+
+    def record(self, measurement, max_queries):
+        "Keep a result, failing if it ran more than max_queries in all"
+        result = measurement.result()
+        result['max_queries'] = max_queries
+        self.results.append(result)
+        self.assertLessEqual(result['queries'], max_queries,
+            '%(name)s ran %(queries)i queries, over a budget of %(max_queries)i' % result)
+
+    def test_person_save(self):
+        # insert, one slug query and render invalidation for the speaker
+        with Measurement('person save', REPEAT) as m:
+            for i in range(REPEAT):
+                Person.objects.create(name='John Smith')
+        self.record(m, REPEAT * 4)
+
+    def test_slugify(self):
+        Person.objects.create(name='John Smith')
+        with Measurement('person slugify', REPEAT) as m:
+            for i in range(REPEAT):
+                Person(name='John Smith').slugify()
+        self.record(m, REPEAT)
+
+    def test_filter_by_name(self):
+        with Measurement('person filter(name=)', REPEAT) as m:
+            for i in range(REPEAT):
+                list(Person.objects.filter(name='John Smith'))
+        self.record(m, REPEAT)
+
+    def test_quote_get_or_create(self):
+        # the Tumblr loader looks quotes up by their text
+        texts = list(Quote.objects.filter(pk__in=self.corpus.quotes[:REPEAT])
+            .values_list('text', flat=True))
+        with Measurement('quote get_or_create hit', REPEAT) as m:
+            for text in texts:
+                Quote.objects.get_or_create(text=text)
+        self.record(m, REPEAT)
+
+        # misses insert and run the fingerprint, near-duplicate and rollup
+        # signals: about 18 queries each
+        speaker_id = self.corpus.people[0]
+        with Measurement('quote get_or_create miss', REPEAT) as m:
+            for i in range(REPEAT):
+                Quote.objects.get_or_create(text=u'Benchmark quote %i' % i, defaults={
+                    'added_by': self.corpus.user, 'speaker_id': speaker_id,
+                    'source_url': 'http://example.com/'})
+        self.record(m, REPEAT * 19)
+
+    def test_storyline_render(self):
+        renders.cache.clear()
+
+        # every storyline in a fixed number of queries, however many quotes
+        pks = self.corpus.storylines
+        with Measurement('storyline rebuild', len(pks)) as m:
+            renders.rebuild(pks)
+        self.record(m, 4)
+
+        with Measurement('storyline cached', len(pks)) as m:
+            renders.get_payloads(pks)
+        self.record(m, 0)
+
+    def test_admin_changelists(self):
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.login(username='admin', password='secret')
+
+        # sessions, auth, count, page of rows and filters, not per row
+        for name, url in (
+                ('admin quotes', reverse('admin:quotes_quote_changelist')),
+                ('admin storylines', reverse('admin:quotes_storyline_changelist')),
+                ('admin people', reverse('admin:people_person_changelist')),
+                ('admin people search', reverse('admin:people_person_changelist') + '?q=smith')):
+            with Measurement(name, 1) as m:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.record(m, 12)
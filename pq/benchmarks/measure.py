@@ -0,0 +1,112 @@
+"""
+Throughput, query and memory measurements for benchmarks.
+
+Set BENCH_OUTPUT to a directory to keep results as JSON, one file per
+suite and run, named for the commit, for tracking trends over time.
+"""
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class Measurement(object):
+    """
+    Measure a block of work over `items` things:
+
+        with Measurement('congress', items=len(members)) as m:
+            load.congress()
+        m.result()
+
+    Queries are those run on this thread's connection. Memory is how far
+    the block raised the process's peak RSS, since that's a high-water
+    mark; run a benchmark on its own for a clean number.
+    """
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+        self.queries = CaptureQueriesContext(connection)
+
+    def __enter__(self):
+        self.queries.__enter__()
+        self.peak = peak_rss()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.time() - self.start
+        self.peak_growth = peak_rss() - self.peak
+        self.queries.__exit__(*exc)
+
+    def result(self):
+        return {
+            'name': self.name,
+            'items': self.items,
+            'seconds': round(self.seconds, 4),
+            'per_second': round(self.items / self.seconds, 1) if self.seconds else None,
+            'queries': len(self.queries),
+            'queries_per_item': round(len(self.queries) / float(self.items or 1), 2),
+            'peak_kb': self.peak_growth,
+        }
+
+
+def peak_rss():
+    "Peak resident memory of this process, in KB (on Linux)"
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def report(results, stream=None):
+    "Print results as a table"
+    stream = stream or sys.stderr
+    stream.write('\n%-24s %8s %10s %10s %9s %9s %9s\n' % (
+        'benchmark', 'items', 'seconds', 'items/s', 'queries', 'q/item', 'peak kb'))
+
+    for r in results:
+        stream.write('%-24s %8i %10.3f %10s %9i %9.2f %9i\n' % (
+            r['name'], r['items'], r['seconds'], r['per_second'],
+            r['queries'], r['queries_per_item'], r['peak_kb']))
+
+
+def save(suite, results, directory=None):
+    """
+    Write results to BENCH_OUTPUT (or `directory`) as JSON, along with
+    the commit and time they were measured at. Returns the path.
+    """
+    directory = directory or os.environ.get('BENCH_OUTPUT')
+    if not directory:
+        return
+
+    commit = current_commit()
+    now = datetime.datetime.utcnow()
+    path = os.path.join(directory, '%s-%s-%s.json' % (
+        suite, now.strftime('%Y%m%dT%H%M%S'), (commit or 'unknown')[:10]))
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    with open(path, 'w') as f:
+        json.dump({
+            'suite': suite,
+            'commit': commit,
+            'measured': now.isoformat(),
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+    return path
+
+
+def current_commit():
+    "The checked-out git commit, or None outside a repo"
+    with open(os.devnull, 'w') as devnull:
+        try:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                cwd=os.path.dirname(__file__), stderr=devnull).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
@@ -0,0 +1,153 @@
+"""
+Synthetic corpora for model benchmarks: people (with namesakes),
+quotes with topics and mentions, and storylines of ordered quotes.
+
+Rows go in with bulk_create, so building a big corpus is fast and
+doesn't run per-row signals. Denormalized state (storyline topics,
+rollups) is rebuilt at the end, so the corpus looks like one built
+through the app.
+"""
+import datetime
+import random
+
+from django.contrib.auth import get_user_model
+from django.utils.text import slugify
+from django.utils.timezone import utc
+
+from pq.apps.people.models import Person
+from pq.apps.quotes import rollups, storyline_topics
+from pq.apps.quotes.models import Quote, Storyline, StorylineQuote, Topic
+from pq.apps.quotes.text import fingerprint
+from pq.utils import batched
+from pq.utils.slugs import assign_slugs
+
+FIRST_NAMES = [u'John', u'Mary', u'James', u'Patricia', u'Robert', u'Linda',
+    u'Michael', u'Barbara', u'William', u'Elizabeth', u'Jos\xe9', u'Mar\xeda']
+LAST_NAMES = [u'Smith', u'Johnson', u'Williams', u'Brown', u'Jones', u'Garcia',
+    u'Miller', u'Davis', u'Rodriguez', u'Martinez', u'Hern\xe1ndez', u'Lopez']
+PARTIES = ['democrat', 'republican', 'independent']
+WORDS = (u'budget deficit health care reform jobs economy taxes vote senate house '
+    u'bill law immigration energy debt ceiling shutdown spending defense').split()
+
+START = datetime.datetime(2014, 1, 1, tzinfo=utc)
+BATCH_SIZE = 500
+
+
+class Corpus(object):
+    "Primary keys of everything a build created"
+
+    def __init__(self, user, people, topics, quotes, storylines):
+        self.user = user
+        self.people = people
+        self.topics = topics
+        self.quotes = quotes
+        self.storylines = storylines
+
+    def __repr__(self):
+        return '<Corpus: %i people, %i quotes, %i storylines, %i topics>' % (
+            len(self.people), len(self.quotes), len(self.storylines), len(self.topics))
+
+
+def build(people=100, quotes=500, storylines=10, per_storyline=20, topics=20,
+          mentions=2, namesakes=0.2, seed=0):
+    """
+    Build a corpus. A `namesakes` share of people are drawn from a small
+    pool of common names, so slugs and name lookups see collisions.
+    Each quote gets up to three topics and `mentions` mentioned people;
+    each storyline gets `per_storyline` ordered quotes.
+    """
+    rand = random.Random(seed)
+    user = get_user_model().objects.create_user('synthetic-%i' % seed, 'synthetic@example.com')
+
+    person_ids = make_people(rand, people, namesakes)
+    topic_ids = make_topics(topics)
+    quote_ids = make_quotes(rand, quotes, user, person_ids)
+    link_quotes(rand, quote_ids, topic_ids, person_ids, mentions)
+    storyline_ids = make_storylines(rand, storylines, per_storyline, user, quote_ids)
+
+    storyline_topics.rebuild()
+    rollups.rebuild()
+
+    return Corpus(user, person_ids, topic_ids, quote_ids, storyline_ids)
+
+
+def make_people(rand, n, namesakes):
+    people = []
+    for i in range(n):
+        if rand.random() < namesakes:
+            first, last = rand.choice(FIRST_NAMES[:3]), rand.choice(LAST_NAMES[:3])
+        else:
+            first, last = rand.choice(FIRST_NAMES), u'%s%i' % (rand.choice(LAST_NAMES), i)
+
+        person = Person(first=first, last=last, party=rand.choice(PARTIES), public=True,
+            links={'bioguide': 'S%06i' % i})
+        person.render_names()
+        people.append(person)
+
+    assign_slugs(people, 'name')
+    for batch in batched(people, BATCH_SIZE):
+        Person.objects.bulk_create(batch)
+
+    return list(Person.objects.filter(slug__in=[p.slug for p in people])
+        .values_list('pk', flat=True))
+
+
+def make_topics(n):
+    topics = [Topic(name=u'Topic %i' % i) for i in range(n)]
+    assign_slugs(topics, 'name')
+    Topic.objects.bulk_create(topics)
+    return list(Topic.objects.filter(slug__in=[t.slug for t in topics])
+        .values_list('pk', flat=True))
+
+
+def make_quotes(rand, n, user, person_ids):
+    quotes = []
+    for i in range(n):
+        text = u'%s (%i)' % (u' '.join(rand.sample(WORDS, 8)).capitalize(), i)
+        quotes.append(Quote(text=text, fingerprint=fingerprint(text), added_by=user,
+            speaker_id=rand.choice(person_ids) if person_ids else None,
+            datetime=START + datetime.timedelta(hours=i),
+            source_url='http://example.com/%i' % i, source_title=u'Example'))
+
+    for batch in batched(quotes, BATCH_SIZE):
+        Quote.objects.bulk_create(batch)
+
+    fingerprints = [q.fingerprint for q in quotes]
+    ids = dict(Quote.objects.filter(fingerprint__in=fingerprints)
+        .values_list('fingerprint', 'pk'))
+    return [ids[fp] for fp in fingerprints]
+
+
+def link_quotes(rand, quote_ids, topic_ids, person_ids, mentions):
+    "Topics and mentions for each quote, through rows in bulk"
+    QuoteTopic, QuoteMention = Quote.topics.through, Quote.mentions.through
+    topic_links, mention_links = [], []
+
+    for quote_id in quote_ids:
+        for topic_id in rand.sample(topic_ids, min(len(topic_ids), rand.randint(0, 3))):
+            topic_links.append(QuoteTopic(quote_id=quote_id, topic_id=topic_id))
+        for person_id in rand.sample(person_ids, min(len(person_ids), mentions)):
+            mention_links.append(QuoteMention(quote_id=quote_id, person_id=person_id))
+
+    for model, links in ((QuoteTopic, topic_links), (QuoteMention, mention_links)):
+        for batch in batched(links, BATCH_SIZE):
+            model.objects.bulk_create(batch)
+
+
+def make_storylines(rand, n, per_storyline, user, quote_ids):
+    titles = [u'Storyline %i' % i for i in range(n)]
+    Storyline.objects.bulk_create([Storyline(title=t, slug=slugify(t), author=user)
+        for t in titles])
+    ids = dict(Storyline.objects.filter(author=user, title__in=titles)
+        .values_list('title', 'pk'))
+
+    links = []
+    for title in titles:
+        chosen = rand.sample(quote_ids, min(len(quote_ids), per_storyline))
+        for order, quote_id in enumerate(chosen):
+            links.append(StorylineQuote(storyline_id=ids[title], quote_id=quote_id, order=order))
+
+    for batch in batched(links, BATCH_SIZE):
+        StorylineQuote.objects.bulk_create(batch)
+
+    return [ids[t] for t in titles]
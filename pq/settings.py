@@ -44,6 +44,7 @@ INSTALLED_APPS = (
 
     # 3rd party
     'django_hstore',
+    'sorl.thumbnail',
     'south',
 
     # core
@@ -52,6 +53,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'pq.utils.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +76,34 @@ DATABASES = {
 
 SOUTH_DATABASE_ADAPTERS = {'default': 'south.db.postgresql_psycopg2'}
 
+# Caching
+# https://docs.djangoproject.com/en/1.6/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+
+    # Calais entity extraction, keyed by a hash of the analyzed text,
+    # in a table made with `manage.py createcachetable calais_cache`
+    'calais': {
+        'BACKEND': 'pq.utils.dbcache.DatabaseCache',
+        'LOCATION': 'calais_cache',
+        'TIMEOUT': 60 * 60 * 24 * 180,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+
+    # entries every process has to agree on, like precomputed storyline
+    # payloads (see quotes.renders): render_storylines warms them for
+    # the web workers, and loaders invalidate them. API versions (see
+    # pq.utils.api) are the same. locmem is private to each process,
+    # so this one is memcached.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.6/topics/i18n/
 
@@ -95,6 +125,62 @@ STATIC_URL = '/static/'
 
 MEDIA_ROOT = f('uploads')
 
+# precomputed photo sizes: name -> (geometry, sorl options)
+# crops follow each photo's crop_horz and crop_vert
+PHOTO_SIZES = {
+    'thumbnail': ('75x75', {}),
+    'small': ('150x150', {}),
+    'medium': ('300x300', {}),
+}
+
+# responsive variants, uncropped, at each width in each format
+PHOTO_WIDTHS = (150, 300, 450)
+PHOTO_FORMATS = ('WEBP', 'JPEG')
+PHOTO_FORMAT_OPTIONS = {
+    'WEBP': {'quality': 80},
+    'JPEG': {'quality': 85, 'progressive': True},
+}
+
+# names WebP files, which sorl-thumbnail 12.3 can't
+THUMBNAIL_BACKEND = 'pq.apps.people.thumbnails.ThumbnailBackend'
+
+# processes for thumbnail generation, None for one per CPU
+THUMBNAIL_PROCESSES = None
+
+# downloaded loader inputs, see pq.utils.sources
+SOURCE_CACHE_DIR = f('cache')
+
+# resumable loader state, see pq.utils.checkpoints
+CHECKPOINT_DIR = f('cache/checkpoints')
+
+# timing and SQL stats per request and run, see pq.utils.instrumentation
+INSTRUMENTATION = bool(os.environ.get('PQ_INSTRUMENTATION'))
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('PQ_INSTRUMENTATION_SAMPLE_RATE', 1.0))
+INSTRUMENTATION_DUPLICATES = 5 # repeats of a statement that look like an N+1
+INSTRUMENTATION_SERVER_TIMING = True
+INSTRUMENTATION_STATS_FILE = os.environ.get('PQ_INSTRUMENTATION_STATS_FILE')
+
+# Logging
+# https://docs.djangoproject.com/en/1.6/topics/logging/
+
+# traces are logged at INFO, which Python drops without a handler
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'pq.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # API keys
 CALAIS_API_KEY = os.environ.get('CALAIS_API_KEY')
 TUMBLR_API_KEY = os.environ.get('TUMBLR_API_KEY')
@@ -9,4 +9,8 @@ urlpatterns = patterns('',
     # url(r'^blog/', include('blog.urls')),
 
     url(r'^admin/', include(admin.site.urls)),
+
+    # read-only JSON API
+    url(r'^api/', include('pq.apps.people.urls')),
+    url(r'^api/', include('pq.apps.quotes.urls')),
 )
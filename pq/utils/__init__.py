@@ -0,0 +1,14 @@
+from itertools import islice
+
+
+def batched(iterable, size):
+    """
+    Yield lists of up to `size` items from any iterable,
+    without reading more than one batch at a time.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,175 @@
+"""
+Helpers for the read-only JSON API.
+
+Lists are paginated by keyset: the cursor holds the ordering values
+of the last row on the page, and the next page is a range query
+from there, so deep pages cost the same as the first one.
+
+ETags come from a version number for everything the API serves,
+kept in the shared cache and bumped by signal handlers whenever a
+served row changes (see quotes.signals). Checking one costs a cache
+hit, where an aggregate over the queryset would miss changes to
+related rows, like a speaker's name, anyway.
+"""
+import base64
+import calendar
+import datetime
+import hashlib
+import json
+import time
+
+from django.core.cache import get_cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+VERSION_KEY = 'api-version'
+
+cache = get_cache('shared')
+
+
+class BadRequest(Exception):
+    pass
+
+
+def json_response(data, status=200):
+    return HttpResponse(json.dumps(data, cls=DjangoJSONEncoder),
+        content_type='application/json', status=status)
+
+
+def list_response(request, queryset, ordering, serialize):
+    """
+    A page of `queryset` as JSON, in keyset `ordering`, which must end
+    with a unique field (usually -pk). Responses carry an ETag, and
+    conditional requests get a 304 without a query.
+    """
+    conditions = (etag(request, content_version()), None)
+    if not_modified(request, conditions):
+        return with_conditions(HttpResponseNotModified(), conditions)
+
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        items, cursor = keyset_page(queryset, ordering,
+            request.GET.get('cursor'), max(limit, 1))
+    except (ValueError, BadRequest):
+        return json_response({'error': 'Invalid limit or cursor'}, status=400)
+
+    next_url = None
+    if cursor:
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        next_url = request.build_absolute_uri('?' + params.urlencode())
+
+    data = {
+        'results': [serialize(obj) for obj in items],
+        'next': next_url,
+    }
+    return with_conditions(json_response(data), conditions)
+
+
+def detail_response(request, obj, serialize):
+    "One object as JSON, with conditional headers"
+    conditions = (etag(request, content_version()), obj.modified)
+    if not_modified(request, conditions):
+        return with_conditions(HttpResponseNotModified(), conditions)
+
+    return with_conditions(json_response(serialize(obj)), conditions)
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Get a page of objects after `cursor`, and a cursor for the next
+    page (None on the last page). One query.
+    """
+    if cursor:
+        queryset = queryset.filter(after(ordering, decode_cursor(cursor, len(ordering))))
+
+    items = list(queryset.order_by(*ordering)[:limit + 1])
+    if len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor([getattr(last, f.lstrip('-')) for f in ordering])
+
+
+def after(ordering, values):
+    """
+    Rows strictly after `values` in `ordering`, as a Q object:
+    (a > x) OR (a = x AND b > y) OR ..., flipped for descending fields.
+    """
+    query = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = '__lt' if field.startswith('-') else '__gt'
+        condition = Q(**{name + lookup: values[i]})
+        for prev, value in zip(ordering[:i], values[:i]):
+            condition &= Q(**{prev.lstrip('-'): value})
+        query |= condition
+
+    return query
+
+
+def encode_cursor(values):
+    # full isoformat, since DjangoJSONEncoder drops microseconds
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values)).rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    try:
+        cursor = str(cursor)
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != length:
+            raise BadRequest('Invalid cursor')
+
+        # datetimes round-trip as ISO strings
+        return [(parse_datetime(v) or v) if isinstance(v, basestring) else v
+            for v in values]
+    except (TypeError, ValueError, UnicodeEncodeError):
+        raise BadRequest('Invalid cursor')
+
+
+def content_version():
+    """
+    The current version of everything the API serves. If the cache
+    has lost it, a new one starts from the clock, so ETags handed out
+    before don't match. Without a cache, every request gets a new one.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_version():
+    "Call when anything the API serves changes"
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # not set; the next read starts a new version
+        pass
+
+
+def etag(request, version):
+    key = '%s|%s' % (request.get_full_path(), version)
+    return '"%s"' % hashlib.md5(key).hexdigest()
+
+
+def not_modified(request, conditions):
+    return request.META.get('HTTP_IF_NONE_MATCH') == conditions[0]
+
+
+def with_conditions(response, conditions):
+    tag, latest = conditions
+    response['ETag'] = tag
+    if latest:
+        response['Last-Modified'] = http_date(calendar.timegm(latest.utctimetuple()))
+    return response
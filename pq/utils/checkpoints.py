@@ -0,0 +1,38 @@
+"""
+Checkpoints for long-running loaders, stored as small JSON files
+under settings.CHECKPOINT_DIR so an interrupted run can resume.
+"""
+import json
+import os
+
+from django.conf import settings
+
+from .sources import atomic_write
+
+
+class Checkpoint(object):
+    """
+    Named loader state. Load it at the start of a run, save it
+    after each committed batch and clear it when the run finishes.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.path = os.path.join(settings.CHECKPOINT_DIR, '%s.json' % name)
+
+    def __repr__(self):
+        return '<Checkpoint: %s>' % self.name
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def save(self, state):
+        with atomic_write(self.path) as f:
+            json.dump(state, f)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
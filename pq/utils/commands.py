@@ -0,0 +1,84 @@
+"""
+A base for ingestion commands: shared options, live progress,
+a timing summary and clean interruption.
+
+Loaders checkpoint after each batch, so stopping a command with
+Ctrl-C loses at most the batch in flight, and running it again
+picks up where it stopped.
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from .progress import Progress
+
+def workers_option(default):
+    """
+    A --workers option, for commands whose loaders fetch on a thread
+    pool. Pass the loader's own default, so the two can't disagree.
+    """
+    return make_option('--workers', type='int', default=default,
+        help="Concurrent network requests, %default by default")
+
+
+class LoaderCommand(BaseCommand):
+    """
+    Subclasses set `label` and `batch_size`, and must define
+
+        load(self, progress, **options)
+
+    to do the loading, ticking `progress` as items go by. Options
+    arrive checked: `since` parsed to a date or None, `batch_size`
+    defaulted and `limit` positive or None. It should honor
+    `dry_run`, and return nothing; handle() prints the summary.
+    """
+    label = 'items'
+    batch_size = 100
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int',
+            help="Items loaded and checkpointed at a time"),
+        make_option('--since',
+            help="Only load items from this date on, as YYYY-MM-DD"),
+        make_option('--limit', type='int',
+            help="Load at most this many items; run again to continue"),
+        make_option('--dry-run', action='store_true', default=False,
+            help="Show what would be loaded, writing nothing"),
+    )
+
+    def handle(self, *args, **options):
+        if not hasattr(self, 'load'):
+            raise NotImplementedError('%s should define load(progress, **options)'
+                % type(self).__name__)
+
+        options['since'] = parse_since(options['since'])
+        options['batch_size'] = options['batch_size'] or self.batch_size
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError('--limit should be a positive number')
+
+        progress = Progress(self.label)
+        try:
+            self.load(progress, **options)
+        except KeyboardInterrupt:
+            progress.finish()
+            self.stdout.write(progress.summary())
+            raise CommandError('Interrupted. Run again to resume.')
+
+        progress.finish()
+        self.stdout.write(('Dry run: ' if options['dry_run'] else '') + progress.summary())
+
+
+def parse_since(value):
+    "A --since option as a date, or None"
+    if not value:
+        return None
+
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+
+    if date is None:
+        raise CommandError('--since should be a date, like 2014-03-01, not %r' % value)
+    return date
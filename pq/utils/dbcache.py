@@ -0,0 +1,120 @@
+"""
+A database cache backend for big, long-lived caches, like Calais results.
+
+Django 1.6's DatabaseCache counts the whole table before every key it
+sets, and culls by key order, which for hashed keys is a random slice.
+This one reads and writes a batch of keys in one query each, counts
+at most once per set_many, and culls the oldest entries first.
+
+    'calais': {
+        'BACKEND': 'pq.utils.dbcache.DatabaseCache',
+        'LOCATION': 'calais_cache',
+    }
+
+Create the table with `manage.py createcachetable calais_cache`.
+"""
+import base64
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache.backends import db
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DatabaseError, connections, router, transaction
+from django.utils.encoding import force_bytes
+from django.utils.six.moves import cPickle as pickle
+
+
+class DatabaseCache(db.DatabaseCache):
+    """
+    DatabaseCache with set-based get_many and set_many, and
+    age-ordered culling: past MAX_ENTRIES, entries are deleted
+    oldest first, down to MAX_ENTRIES less 1/CULL_FREQUENCY of it.
+    """
+    def get_many(self, keys, version=None):
+        keys = dict((self.make_key(key, version=version), key) for key in keys)
+        if not keys:
+            return {}
+
+        for key in keys:
+            self.validate_key(key)
+
+        alias = router.db_for_read(self.cache_model_class)
+        connection = connections[alias]
+        cursor = connection.cursor()
+        cursor.execute("SELECT cache_key, value FROM %s WHERE cache_key IN (%s) AND expires >= %%s" % (
+            connection.ops.quote_name(self._table), ', '.join(['%s'] * len(keys))),
+            list(keys) + [connection.ops.value_to_db_datetime(self._now())])
+
+        return dict((keys[key], self._decode(connection, value))
+            for key, value in cursor.fetchall())
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows[key] = base64.b64encode(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+        if not rows:
+            return
+
+        alias = router.db_for_write(self.cache_model_class)
+        connection = connections[alias]
+        table = connection.ops.quote_name(self._table)
+        expires = connection.ops.value_to_db_datetime(self._expires(timeout))
+
+        cursor = connection.cursor()
+        try:
+            with transaction.atomic(using=alias):
+                cursor.execute("DELETE FROM %s WHERE cache_key IN (%s)" % (
+                    table, ', '.join(['%s'] * len(rows))), list(rows))
+                cursor.execute("INSERT INTO %s (cache_key, value, expires) VALUES %s" % (
+                    table, ', '.join(['(%s, %s, %s)'] * len(rows))),
+                    [p for key, value in rows.items() for p in (key, value, expires)])
+        except DatabaseError:
+            # another process set some of these keys first; like
+            # DatabaseCache, leave them be
+            return
+
+        self._cull(alias, cursor, self._now())
+
+    def _cull(self, db, cursor, now):
+        connection = connections[db]
+        table = connection.ops.quote_name(self._table)
+
+        cursor.execute("DELETE FROM %s WHERE expires < %%s" % table,
+            [connection.ops.value_to_db_datetime(now)])
+        cursor.execute("SELECT COUNT(*) FROM %s" % table)
+        count = cursor.fetchone()[0]
+        if count <= self._max_entries:
+            return
+
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+
+        excess = count - self._max_entries + self._max_entries // self._cull_frequency
+        cursor.execute("DELETE FROM %s WHERE cache_key IN ("
+            "SELECT cache_key FROM %s ORDER BY expires, cache_key LIMIT %%s)" % (table, table),
+            [excess])
+
+    def _now(self):
+        "Now, naive, as DatabaseCache writes expiry times"
+        return datetime.utcnow() if settings.USE_TZ else datetime.now()
+
+    def _expires(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return datetime.max
+        if settings.USE_TZ:
+            return datetime.utcfromtimestamp(time.time() + timeout)
+        return datetime.fromtimestamp(time.time() + timeout)
+
+    def _decode(self, connection, value):
+        value = connection.ops.process_clob(value)
+        return pickle.loads(base64.b64decode(force_bytes(value)))
@@ -0,0 +1,246 @@
+"""
+Opt-in timing and SQL instrumentation for requests, management commands
+and loader runs.
+
+A trace records total time and the number and time of SQL queries,
+and counts repeats of each statement. A statement run with different
+parameters over and over (the N+1 signature) is reported as a
+duplicate. Finished traces are logged as JSON to 'pq.instrumentation',
+optionally appended to INSTRUMENTATION_STATS_FILE, and on requests
+summarized in a Server-Timing header.
+
+Everything is off unless INSTRUMENTATION is set. INSTRUMENTATION_SAMPLE_RATE
+picks a share of requests and runs to trace; the rest pay one random().
+Queries are timed by wrapping cursors on the traced thread's
+connection, and statements are kept as counts, not a growing list, so
+long loader runs stay flat. Queries on other threads (pool workers)
+aren't counted.
+
+    with trace('congress'):
+        load.congress()
+
+    @traced('tumblr sync')
+    def tumblr_sync(...):
+"""
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.util import CursorWrapper
+
+log = logging.getLogger('pq.instrumentation')
+
+# long-running or interactive commands, not traced as a whole
+UNTRACED_COMMANDS = ('runserver', 'shell', 'dbshell', 'test', 'testserver')
+
+# the trace running on each thread, so nested traces don't double-count
+local = threading.local()
+
+
+class Trace(object):
+    """
+    Timing and SQL stats for one request or run.
+    """
+    def __init__(self, name, kind='task'):
+        self.name = name
+        self.kind = kind
+        self.statements = Counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.seconds = None
+
+    def __repr__(self):
+        return '<Trace: %s %s>' % (self.kind, self.name)
+
+    def start(self):
+        """
+        Route this thread's cursors through a TracingCursor. Under DEBUG,
+        queries still go to connection.queries as well.
+        """
+        self.connection = conn = connections[DEFAULT_DB_ALIAS]
+        self.previous = conn.use_debug_cursor
+        if self.previous or (self.previous is None and settings.DEBUG):
+            wrap = type(conn).make_debug_cursor
+        else:
+            wrap = lambda conn, cursor: CursorWrapper(cursor, conn)
+
+        conn.use_debug_cursor = True
+        conn.make_debug_cursor = lambda cursor: TracingCursor(wrap(conn, cursor), self)
+        local.trace = self
+        self.began = time.time()
+        return self
+
+    def stop(self):
+        self.seconds = time.time() - self.began
+        self.connection.use_debug_cursor = self.previous
+        del self.connection.make_debug_cursor
+        local.trace = None
+        return self
+
+    def add_query(self, sql, seconds, count=1):
+        self.queries += count
+        self.sql_seconds += seconds
+        self.statements[sql] += count
+
+    def duplicates(self, threshold=None):
+        "Statements run at least `threshold` times, most repeated first"
+        threshold = threshold or settings.INSTRUMENTATION_DUPLICATES
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+    def summary(self, **extra):
+        "A JSON-friendly dict of this trace"
+        result = {
+            'name': self.name,
+            'kind': self.kind,
+            'ms': ms(self.seconds),
+            'queries': self.queries,
+            'sql_ms': ms(self.sql_seconds),
+            'duplicates': [{'sql': sql[:200], 'count': n} for sql, n in self.duplicates()],
+        }
+        result.update(extra)
+        return result
+
+    def server_timing(self):
+        "A Server-Timing header value, with durations in milliseconds"
+        return 'total;dur=%.1f, sql;dur=%.1f;desc="%i queries"' % (
+            ms(self.seconds), ms(self.sql_seconds), self.queries)
+
+
+class TracingCursor(object):
+    """
+    Wraps Django's cursor wrapper, timing statements into a Trace.
+    Statements are counted before parameters are filled in, so
+    the same query with different values counts as a repeat.
+    """
+    def __init__(self, cursor, trace):
+        self.cursor = cursor
+        self.trace = trace
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def execute(self, sql, params=None):
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.trace.add_query(sql, time.time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.trace.add_query(sql, time.time() - start)
+
+
+def ms(seconds):
+    return round((seconds or 0) * 1000, 1)
+
+
+def enabled():
+    return getattr(settings, 'INSTRUMENTATION', False)
+
+
+def sampled():
+    "Whether to trace this request or run, by sample rate"
+    return enabled() and random.random() < settings.INSTRUMENTATION_SAMPLE_RATE
+
+
+def emit(summary):
+    """
+    Send a finished trace to the log, and the stats file if there is one.
+    Duplicates log as a warning, so they stand out.
+    """
+    line = json.dumps(summary, sort_keys=True)
+    if summary['duplicates']:
+        log.warning(line)
+    else:
+        log.info(line)
+
+    path = getattr(settings, 'INSTRUMENTATION_STATS_FILE', None)
+    if path:
+        with open(path, 'a') as f:
+            f.write(line + '\n')
+
+
+class trace(object):
+    """
+    Trace a block as a management command or loader run, if it's sampled
+    and nothing on this thread is already being traced. Yields the
+    Trace, or None when not tracing.
+    """
+    def __init__(self, name, kind='task', active=True):
+        self.name = name
+        self.kind = kind
+        self.active = active
+        self.trace = None
+
+    def __enter__(self):
+        if self.active and getattr(local, 'trace', None) is None and sampled():
+            self.trace = Trace(self.name, self.kind).start()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            self.trace.stop()
+            emit(self.trace.summary(error=exc_type.__name__ if exc_type else None))
+
+
+def traced(name, kind='task'):
+    "Decorate a function to run inside trace()"
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def command(argv):
+    "A trace() for a manage.py command line"
+    name = argv[1] if len(argv) > 1 else 'help'
+    return trace(name, 'command', active=name not in UNTRACED_COMMANDS)
+
+
+class InstrumentationMiddleware(object):
+    """
+    Trace sampled requests, adding a Server-Timing header.
+    Put it first in MIDDLEWARE_CLASSES, so it times everything else.
+    Unused unless INSTRUMENTATION is set.
+    """
+    def __init__(self):
+        if not enabled():
+            raise MiddlewareNotUsed
+
+    def process_request(self, request):
+        # a request whose response never came through here
+        if getattr(local, 'trace', None) is not None:
+            local.trace.stop()
+
+        if sampled():
+            request._trace = Trace(request.path, 'request').start()
+
+    def process_response(self, request, response):
+        trace = getattr(request, '_trace', None)
+        if trace is None:
+            return response
+
+        trace.stop()
+        del request._trace
+        emit(trace.summary(method=request.method, status=response.status_code))
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = trace.server_timing()
+
+        return response
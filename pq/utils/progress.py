@@ -0,0 +1,102 @@
+"""
+Live progress for long-running loads: counts, rates and an ETA,
+redrawn in place on a terminal and logged a line at a time elsewhere.
+"""
+import sys
+import time
+from collections import Counter
+
+
+class Progress(object):
+    """
+    Track items done out of an optional total.
+
+        progress = Progress('members', total=12000)
+        for batch in batches:
+            counts = load(batch)
+            progress.update(len(batch), **counts)
+        progress.finish()
+        print progress.summary()
+
+    Keyword counts (created, updated, errors ...) are summed and shown
+    along with the rate. Output is throttled to once per `interval`.
+    """
+    def __init__(self, label, total=None, stream=None, interval=1.0):
+        self.label = label
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.done = 0
+        self.counts = Counter()
+        self.started = self.drawn = time.time()
+        self.tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+
+    def __repr__(self):
+        return '<Progress: %s>' % self.status()
+
+    def update(self, n=1, **counts):
+        self.done += n
+        self.counts.update(counts)
+
+        now = time.time()
+        if now - self.drawn >= self.interval:
+            self.drawn = now
+            self.draw()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def rate(self):
+        "Items per second so far"
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed else 0.0
+
+    def eta(self):
+        "Seconds left, or None without a total or a rate"
+        if self.total is None or not self.rate:
+            return None
+        return max(self.total - self.done, 0) / self.rate
+
+    def status(self):
+        if self.total:
+            done = '%i/%i %s (%.0f%%)' % (self.done, self.total, self.label,
+                100.0 * self.done / self.total)
+        else:
+            done = '%i %s' % (self.done, self.label)
+
+        parts = [done, '%.1f/s' % self.rate]
+        eta = self.eta()
+        if eta is not None:
+            parts.append('ETA %s' % duration(eta))
+        parts.extend('%s %i' % kv for kv in sorted(self.counts.items()))
+        return ', '.join(parts)
+
+    def draw(self):
+        if self.tty:
+            self.stream.write('\r\033[K' + self.status())
+        else:
+            self.stream.write(self.status() + '\n')
+        self.stream.flush()
+
+    def finish(self):
+        "Draw a last time, ending the line on a terminal"
+        self.draw()
+        if self.tty:
+            self.stream.write('\n')
+
+    def summary(self):
+        "A one-line timing summary"
+        counts = ''.join(', %s %i' % kv for kv in sorted(self.counts.items()))
+        return '%i %s in %s (%.1f/s)%s' % (
+            self.done, self.label, duration(self.elapsed), self.rate, counts)
+
+
+def duration(seconds):
+    "Seconds as h:mm:ss, or m:ss under an hour"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '%i:%02i:%02i' % (hours, minutes, seconds)
+    return '%i:%02i' % (minutes, seconds)
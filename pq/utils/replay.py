@@ -0,0 +1,257 @@
+"""
+Record and replay HTTP for loaders, so tests and benchmarks run offline.
+
+Fixture responses live in pq/fixtures/replay. The congress-legislators
+files are trimmed from the real ones; the Tumblr posts, Calais entities
+and member photo are synthetic, written in the shape of each service's
+responses. A Replay serves them with httpretty, which patches sockets,
+so requests (sources, photos), httplib2 (pytumblr) and httplib (Calais)
+all talk to the stand-in without knowing. Every response can be
+delayed by `latency` seconds, to stand in for a real network, and
+every request is counted in `requests`.
+
+    with replay.offline(latency=0.05) as server:
+        load.congress()
+        print server.counts()
+
+Served data can be swapped for generated data, to load at scale:
+
+    with replay.offline(members=many_members, posts=many_posts):
+        ...
+
+To replace the fixtures with recordings from the live services,
+run manage.py record_replay.
+"""
+import hashlib
+import itertools
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+import urlparse
+from collections import Counter
+
+import httpretty
+import requests
+import yaml
+
+from django.conf import settings
+
+from . import sources
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fixtures', 'replay')
+
+CONGRESS_PATTERN = re.compile(r'^https://raw\.githubusercontent\.com/unitedstates/'
+    r'congress-legislators/master/legislators-(current|historical)\.yaml')
+PHOTO_PATTERN = re.compile(r'^https://raw\.githubusercontent\.com/unitedstates/images/.+\.jpg')
+TUMBLR_PATTERN = re.compile(r'^https?://api\.tumblr\.com/v2/blog/[^/]+/posts')
+CALAIS_PATTERN = re.compile(r'^https?://api\.opencalais\.com(:80)?/enlighten/rest/')
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURE_DIR, name)
+
+
+def read_fixture(name):
+    with open(fixture_path(name), 'rb') as f:
+        return f.read()
+
+
+def load_fixture(name):
+    "A parsed JSON or YAML fixture"
+    body = read_fixture(name)
+    if name.endswith('.json'):
+        return json.loads(body)
+    return yaml.safe_load(body)
+
+
+class Replay(object):
+    """
+    A local stand-in for HTTP services, active inside a with block.
+
+    Routes are added with add(), as a method, a compiled URL pattern and
+    a body. Bodies can be bytes, or a callable taking the request and
+    returning bytes (or a (status, headers, body) tuple), for responses
+    that depend on query strings or posted content.
+    """
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.routes = []
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Replay: %i routes, %i requests>' % (len(self.routes), len(self.requests))
+
+    def __enter__(self):
+        httpretty.reset()
+        httpretty.enable()
+        for method, pattern, name, body, headers in self.routes:
+            httpretty.register_uri(method, pattern, body=self.responder(name, body, headers))
+        return self
+
+    def __exit__(self, *exc):
+        httpretty.disable()
+        httpretty.reset()
+
+    def add(self, method, pattern, body, name=None, headers=None):
+        """
+        Serve `body` for requests matching `pattern`. Requests are
+        counted under `name`, the pattern by default.
+        """
+        self.routes.append((method, pattern, name or pattern.pattern, body, headers or {}))
+
+    def add_fixture(self, method, pattern, fixture, name=None):
+        """
+        Serve a fixture file, with a content type from its extension
+        and an ETag, so conditional requests get a 304.
+        """
+        body = read_fixture(fixture)
+        content_type = mimetypes.guess_type(fixture)[0] or 'application/octet-stream'
+        self.add(method, pattern, conditional(body), name or fixture,
+            {'content-type': content_type})
+
+    def responder(self, name, body, headers):
+        def respond(request, uri, response_headers):
+            with self.lock:
+                self.requests.append((name, request.method, uri))
+            if self.latency:
+                time.sleep(self.latency)
+
+            result = body(request) if callable(body) else body
+            status, extra = 200, {}
+            if isinstance(result, tuple):
+                status, extra, result = result
+
+            response_headers.update(headers)
+            response_headers.update(extra)
+            return status, response_headers, result
+
+        return respond
+
+    def counts(self):
+        "Requests served, by route name"
+        return Counter(name for name, method, uri in self.requests)
+
+
+def conditional(body):
+    "A body callable honoring If-None-Match, with a content-hash ETag"
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+
+    def respond(request):
+        if request.headers.get('If-None-Match') == etag:
+            return 304, {'etag': etag}, ''
+        return 200, {'etag': etag}, body
+
+    return respond
+
+
+def offline(latency=0, members=None, historical=None, posts=None):
+    """
+    A Replay with routes for every loader: congress-legislators YAML,
+    member photos, Tumblr quote posts and Calais.
+
+    Fixtures are served by default; pass lists of `members`,
+    `historical` members or tumblr `posts` to serve those instead.
+    """
+    server = Replay(latency)
+
+    for kind, data in (('current', members), ('historical', historical)):
+        pattern = re.compile(CONGRESS_PATTERN.pattern.replace('(current|historical)', kind))
+        if data is None:
+            server.add_fixture('GET', pattern, 'legislators-%s.yaml' % kind)
+        else:
+            server.add('GET', pattern, conditional(yaml.safe_dump(data, default_flow_style=False)),
+                'legislators-%s.yaml' % kind)
+
+    server.add_fixture('GET', PHOTO_PATTERN, 'photo.jpg')
+
+    if posts is None:
+        posts = load_fixture('tumblr-posts.json')['response']['posts']
+    server.add('GET', TUMBLR_PATTERN, tumblr_posts(posts), 'tumblr')
+
+    server.add('POST', CALAIS_PATTERN, calais_entities(load_fixture('calais.json')), 'calais')
+
+    return server
+
+
+def tumblr_posts(posts):
+    """
+    Serve pages of `posts` the way the Tumblr API does,
+    by offset and limit, newest first.
+    """
+    posts = sorted(posts, key=lambda p: p['id'], reverse=True)
+
+    def respond(request):
+        query = dict((k, v[0]) for k, v in request.querystring.items())
+        offset, limit = int(query.get('offset', 0)), min(int(query.get('limit', 20)), 20)
+        return json.dumps({
+            'meta': {'status': 200, 'msg': 'OK'},
+            'response': {
+                'posts': posts[offset:offset + limit],
+                'total_posts': len(posts),
+            },
+        })
+
+    return respond
+
+
+def calais_entities(response):
+    """
+    Serve a Calais response from the fixture, keeping only the people
+    named in the submitted content, so each quote gets its own speaker.
+    """
+    doc = response['doc']
+    people = dict((k, v) for k, v in response.items()
+        if isinstance(v, dict) and v.get('_type') == 'Person')
+
+    def respond(request):
+        content = urlparse.parse_qs(request.body).get('content', [''])[0].decode('utf-8')
+        result = dict((k, v) for k, v in people.items() if v['name'] in content)
+        result['doc'] = doc
+        return json.dumps(result)
+
+    return respond
+
+
+def record(members=5, posts=20):
+    """
+    Re-record fixtures from the live services: the first `members` of
+    each congress-legislators file, the first member's photo, a page
+    of `posts` Tumblr quotes and Calais people for their sources.
+    Needs the network, TUMBLR_API_KEY and CALAIS_API_KEY.
+    """
+    from pq.apps.people import load, photos
+    from pq.apps.quotes.load import calais
+
+    current = list(itertools.islice(sources.iter_yaml_list(load.CURRENT_URL), members))
+    historical = list(itertools.islice(sources.iter_yaml_list(load.HISTORICAL_URL), members))
+    for kind, data in (('current', current), ('historical', historical)):
+        write_fixture('legislators-%s.yaml' % kind, yaml.safe_dump(data,
+            default_flow_style=False, allow_unicode=True, encoding='utf-8'))
+
+    photo = requests.get(photos.PHOTO_URL.format(current[0]['id']['bioguide']), timeout=60)
+    photo.raise_for_status()
+    write_fixture('photo.jpg', photo.content)
+
+    url = 'https://api.tumblr.com/v2/blog/%s/posts/quote' % settings.TUMBLR_BLOG
+    page = requests.get(url, timeout=60,
+        params={'api_key': settings.TUMBLR_API_KEY, 'limit': min(posts, 20)})
+    page.raise_for_status()
+    write_fixture('tumblr-posts.json', json.dumps(page.json(), indent=2, sort_keys=True))
+
+    # every person Calais finds in the recorded sources, in one response
+    response = {}
+    for post in page.json()['response']['posts']:
+        result = calais.analyze(post['source'])
+        if result is not None:
+            response.update(result.raw_response)
+    write_fixture('calais.json', json.dumps(response, indent=2, sort_keys=True))
+
+
+def write_fixture(name, body):
+    with open(fixture_path(name), 'wb') as f:
+        f.write(body)
+
@@ -0,0 +1,70 @@
+"""
+Slug allocation, with one query per batch instead of one per candidate.
+"""
+from django.db.models import Q
+from django.utils.text import slugify
+
+
+def unique_slug(model, value, field='slug'):
+    """
+    Get a unique slug for a single value.
+    """
+    return allocate_slugs(model, [value], field)[0]
+
+
+def allocate_slugs(model, values, field='slug'):
+    """
+    Get unique slugs for a list of values, in order.
+
+    Every existing slug sharing a base with one of the values
+    is fetched in a single query, then suffixes (-1, -2, ...)
+    are picked in memory. Values in the same batch won't collide
+    with each other either. Values that slugify to nothing, like
+    punctuation, are slugged by model name instead (person, person-1).
+    """
+    max_length = model._meta.get_field(field).max_length
+    bases = [slugify(unicode(value))[:max_length] or model._meta.model_name for value in values]
+    taken = existing_slugs(model, set(bases), field)
+
+    slugs = []
+    for base in bases:
+        slug, n = base, 0
+        while slug in taken:
+            n += 1
+            suffix = "-%i" % n
+            slug = base[:max_length - len(suffix)] + suffix
+
+        taken.add(slug)
+        slugs.append(slug)
+
+    return slugs
+
+
+def assign_slugs(objects, source, field='slug'):
+    """
+    Set unique slugs on unsaved objects that don't have one,
+    based on the `source` attribute. Useful before bulk_create.
+    """
+    objects = [obj for obj in objects if not getattr(obj, field)]
+    if not objects:
+        return
+
+    model = objects[0].__class__
+    values = [getattr(obj, source) for obj in objects]
+    for obj, slug in zip(objects, allocate_slugs(model, values, field)):
+        setattr(obj, field, slug)
+
+
+def existing_slugs(model, bases, field='slug'):
+    """
+    Lowercased slugs already in use that start with any of `bases`.
+    """
+    if not bases:
+        return set()
+
+    query = Q()
+    for base in bases:
+        query |= Q(**{field + '__istartswith': base})
+
+    slugs = model._default_manager.filter(query).values_list(field, flat=True)
+    return set(slug.lower() for slug in slugs)
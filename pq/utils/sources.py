@@ -0,0 +1,243 @@
+"""
+A local cache for loader inputs.
+
+Remote files are stored under settings.SOURCE_CACHE_DIR along with
+their ETag and Last-Modified headers, and revalidated with conditional
+requests. Local paths are read in place, so loaders can run offline.
+"""
+import cPickle as pickle
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import requests
+import yaml
+
+from django.conf import settings
+
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+CHUNK_SIZE = 64 * 1024
+
+log = logging.getLogger(__name__)
+
+
+class Source(object):
+    """
+    A fetched loader input.
+
+    `changed` is true when the content differs from the last
+    version a loader marked as loaded.
+    """
+    def __init__(self, location, path, meta):
+        self.location = location
+        self.path = path
+        self.meta = meta
+
+    def __repr__(self):
+        return '<Source: %s>' % self.location
+
+    @property
+    def digest(self):
+        return self.meta['digest']
+
+    @property
+    def changed(self):
+        return self.meta.get('loaded') != self.digest
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def mark_loaded(self):
+        "Record that this version has been loaded."
+        self.meta['loaded'] = self.digest
+        write_meta(self.location, self.meta)
+
+
+def fetch(location, timeout=60):
+    """
+    Get a Source for a URL or local file path.
+
+    URLs are revalidated with If-None-Match/If-Modified-Since
+    and only downloaded again when the server has a new version.
+    """
+    meta = read_meta(location)
+
+    if os.path.exists(location):
+        digest = file_digest(location)
+        if digest != meta.get('digest'):
+            meta = {'digest': digest, 'loaded': meta.get('loaded')}
+            write_meta(location, meta)
+
+        return Source(location, location, meta)
+
+    path = cache_path(location)
+    headers = {}
+    if os.path.exists(path):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    resp = requests.get(location, headers=headers, stream=True, timeout=timeout)
+    if resp.status_code == 304:
+        log.debug('Not modified: %s', location)
+        return Source(location, path, meta)
+
+    resp.raise_for_status()
+    digest = download(resp, path)
+
+    meta.update({
+        'digest': digest,
+        'etag': resp.headers.get('etag'),
+        'last_modified': resp.headers.get('last-modified'),
+    })
+    write_meta(location, meta)
+    log.debug('Fetched %s', location)
+
+    return Source(location, path, meta)
+
+
+def load_yaml(source):
+    """
+    Parse a YAML source, using libyaml when it's installed.
+
+    The parsed result is pickled next to the cached file, so repeat
+    runs against the same content skip YAML parsing entirely.
+    """
+    if not isinstance(source, Source):
+        source = fetch(source)
+
+    snapshot = cache_path(source.location) + '.pickle'
+    if os.path.exists(snapshot):
+        with open(snapshot, 'rb') as f:
+            digest, data = pickle.load(f)
+        if digest == source.digest:
+            return data
+
+    with source.open() as f:
+        data = yaml.load(f, Loader=YAMLLoader)
+
+    with atomic_write(snapshot) as f:
+        pickle.dump((source.digest, data), f, pickle.HIGHEST_PROTOCOL)
+
+    return data
+
+
+def iter_yaml_list(source):
+    """
+    Stream a YAML document whose top level is a list, yielding
+    one parsed item at a time.
+
+    Items are split on unindented "- " lines, so only one item's
+    text and objects are in memory at once, however big the file is.
+    """
+    if not isinstance(source, Source):
+        source = fetch(source)
+
+    with source.open() as f:
+        lines = []
+        for line in f:
+            if line.startswith('-') and line[1:2] in (' ', '\n', '\r'):
+                if lines:
+                    yield parse_item(lines)
+                lines = [line]
+            elif lines:
+                lines.append(line)
+
+        if lines:
+            yield parse_item(lines)
+
+
+def count_items(source):
+    """
+    Count the items in a YAML list source, the way iter_yaml_list
+    splits them, without parsing anything.
+    """
+    if not isinstance(source, Source):
+        source = fetch(source)
+
+    with source.open() as f:
+        return sum(1 for line in f
+            if line.startswith('-') and line[1:2] in (' ', '\n', '\r'))
+
+
+def parse_item(lines):
+    "Parse one top-level list item"
+    return yaml.load(''.join(lines), Loader=YAMLLoader)[0]
+
+
+def download(resp, path):
+    """
+    Stream a response to path in chunks, returning its sha1 digest.
+    """
+    sha = hashlib.sha1()
+    with atomic_write(path) as f:
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            sha.update(chunk)
+            f.write(chunk)
+
+    return sha.hexdigest()
+
+
+def file_digest(path):
+    "sha1 digest of a file, read in chunks"
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def cache_path(location):
+    """
+    Where a location is cached, namespaced by a hash of the full location
+    so files with the same name don't collide.
+    """
+    key = hashlib.sha1(location).hexdigest()[:12]
+    name = os.path.basename(location.rstrip('/')) or 'index'
+    return os.path.join(settings.SOURCE_CACHE_DIR, '%s-%s' % (key, name))
+
+
+def read_meta(location):
+    try:
+        with open(cache_path(location) + '.json') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_meta(location, meta):
+    with atomic_write(cache_path(location) + '.json') as f:
+        json.dump(meta, f)
+
+
+class atomic_write(object):
+    """
+    Write to a temporary file, then move it into place,
+    so readers never see half a file.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        self.file = tempfile.NamedTemporaryFile(dir=dirname, delete=False)
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.file.close()
+        if exc_type is None:
+            shutil.move(self.file.name, self.path)
+        else:
+            os.remove(self.file.name)